@@ -2,6 +2,7 @@ from dotenv import load_dotenv  # Importar primero
 load_dotenv()  # Cargar .env antes de cualquier import que use os.getenv
 
 import os
+import hmac
 import logging
 import sys
 import asyncio
@@ -11,7 +12,7 @@ from aiohttp import ClientTimeout, TCPConnector
 import aiohttp
 from pymongo import MongoClient
 from collections import Counter
-from flask import Flask
+from flask import Flask, jsonify, request
 from threading import Thread
 
 # Importar el sistema de base de datos híbrido
@@ -94,6 +95,7 @@ class BeethovenBot(commands.AutoShardedBot):
         """Hook de configuración que se ejecuta al iniciar el bot"""
         try:
             self.db = await init_db(self)
+            self.cache["blacklist"] = self.db.blacklist  # Mismo conjunto que mantiene la base de datos
             self.logger.info("✅ Sistema de base de datos inicializado")
         except Exception as e:
             self.logger.error(f"❌ Error inicializando sistema de base de datos: {e}")
@@ -191,6 +193,12 @@ class BeethovenBot(commands.AutoShardedBot):
                 except Exception as e:
                     self.logger.error(f"❌ Error inicializando sesión HTTP: {e}")
 
+    async def close(self):
+        """Vuelca escrituras pendientes y cierra la base de datos antes de apagar"""
+        if self.db:
+            await self.db.close()
+        await super().close()
+
 # Crear el objeto bot antes de los comandos decorados
 bot = BeethovenBot()
 
@@ -271,6 +279,41 @@ async def status(ctx):
     else:
         db_status.append("Sistema Híbrido: ❌")
     embed.add_field(name="💾 Bases de Datos", value=" | ".join(db_status), inline=False)
+    if bot.db and bot.db.initialized:
+        pool_stats = bot.db.pool.stats()
+        embed.add_field(
+            name="🗄️ Pool SQLite",
+            value=f"Lectores libres: {pool_stats['readers_idle']}/{pool_stats['readers']}\n"
+                  f"Espera lectura: {pool_stats['read']['avg_wait_ms']}ms (máx {pool_stats['read']['max_wait_ms']}ms)\n"
+                  f"Espera escritura: {pool_stats['write']['avg_wait_ms']}ms (máx {pool_stats['write']['max_wait_ms']}ms)"
+                  + "".join(
+                      f"\nShard {index}: escritura {stats['write']['avg_wait_ms']}ms (máx {stats['write']['max_wait_ms']}ms)"
+                      for index, stats in enumerate(shard.pool.stats() for shard in bot.db.sqlite_manager.shards)
+                  ),
+            inline=False
+        )
+        if bot.db.replicator:
+            lag = await bot.db.replicator.lag()
+            embed.add_field(
+                name="🔁 Réplica MongoDB",
+                value=f"Pendientes: {lag['pending']} | Retraso: {lag['lag_seconds']}s | Errores: {bot.db.replicator.stats['errors']} | Descartadas: {lag['dead']}",
+                inline=False
+            )
+        entity_caches = bot.db.cache_stats()
+        embed.add_field(
+            name="🧠 Caché de entidades",
+            value="\n".join(
+                f"{name}: {stats['size']}/{stats['max_size']} | Hit ratio: {stats['hit_ratio']:.1%} | Invalidaciones: {stats['invalidations']}"
+                for name, stats in entity_caches.items()
+            ),
+            inline=False
+        )
+        cooldown_stats = bot.db.cooldowns.snapshot()
+        embed.add_field(
+            name="⏰ Cooldowns",
+            value=f"Activos: {cooldown_stats['active']}/{cooldown_stats['max_entries']} | Bloqueos: {cooldown_stats['blocked']} | Desalojados: {cooldown_stats['evicted']}",
+            inline=False
+        )
     cache_stats = f"Entradas: {len(cache_manager.cache)} | Hits: {sum(item['hits'] for item in cache_manager.cache.values())}"
     embed.add_field(name="🔄 Caché", value=cache_stats, inline=True)
     await safe_send_message(ctx.channel, embed=embed)
@@ -337,7 +380,7 @@ async def debug_commands(ctx):
 @primary_shard_only()
 async def db_cleanup(ctx, days: int = 7):
     try:
-        await bot.db.cleanup_old_cache(days)
+        counts = await bot.db.cleanup_old_cache(days)
         cache_manager.clear()
         embed = discord.Embed(
             title="🧹 Limpieza de Base de Datos",
@@ -346,10 +389,61 @@ async def db_cleanup(ctx, days: int = 7):
         )
         embed.add_field(name="Caché limpiado", value="✅", inline=True)
         embed.add_field(name="Días conservados", value=f"{days} días", inline=True)
+        embed.add_field(
+            name="Filas eliminadas",
+            value="\n".join(f"{table}: {count}" for table, count in counts.items()) or "Ninguna",
+            inline=False
+        )
         await safe_send_message(ctx.channel, embed=embed)
     except Exception as e:
         await safe_send_message(ctx.channel, f"❌ Error en limpieza: {e}")
 
+@bot.command()
+@commands.is_owner()
+@primary_shard_only()
+async def db_queries(ctx, top: int = 10, reset: str = None):
+    """Muestra las sentencias más lentas (p95) del registro de consultas"""
+    if not (bot.db and bot.db.initialized):
+        await safe_send_message(ctx.channel, "❌ La base de datos no está inicializada.")
+        return
+    if reset == "reset":
+        bot.db.queries.reset()
+        await safe_send_message(ctx.channel, "🧹 Métricas de consultas reiniciadas.")
+        return
+
+    snapshot = bot.db.queries.snapshot()
+    embed = discord.Embed(title="⏱️ Latencia por sentencia", color=discord.Color.blue())
+    for name, stats in list(snapshot["queries"].items())[:max(1, min(top, 25))]:
+        execution, wait = stats["exec"], stats["wait"]
+        embed.add_field(
+            name=f"`{name}` ({stats['calls']} llamadas)",
+            value=f"Ejecución p50/p95/p99: {execution['p50_ms']}/{execution['p95_ms']}/{execution['p99_ms']}ms\n"
+                  f"Espera p95: {wait['p95_ms']}ms | Filas: {stats['rows']} | Errores: {stats['errors']}",
+            inline=False
+        )
+    if not snapshot["queries"]:
+        embed.description = "Sin consultas registradas todavía."
+    await safe_send_message(ctx.channel, embed=embed)
+
+@bot.command()
+@commands.is_owner()
+@primary_shard_only()
+async def db_backup(ctx):
+    """Crea un snapshot comprimido de SQLite en caliente"""
+    if not (bot.db and bot.db.initialized):
+        await safe_send_message(ctx.channel, "❌ La base de datos no está inicializada.")
+        return
+    result = await bot.db.backups.run()
+    if result is None:
+        await safe_send_message(ctx.channel, "❌ Error creando el backup, revisa los logs.")
+        return
+    await safe_send_message(
+        ctx.channel,
+        f"✅ Backup `{os.path.basename(result['path'])}`: {result['raw_bytes'] // 1024} KiB → "
+        f"{result['compressed_bytes'] // 1024} KiB en {result['total_seconds']}s ({result['steps']} pasos, {result['rotated']} rotados)"
+        + (f" + {len(result['shards'])} shards" if result.get("shards") else "")
+    )
+
 # ====== MANEJO DE ERRORES GLOBALES ======
 @bot.event
 async def on_command_error(ctx, error):
@@ -378,6 +472,19 @@ app = Flask("")
 def home():
     return "BeethovenBot activo en Render 🚀"
 
+@app.route("/stats/queries")
+def query_stats():
+    # Solo existe con STATS_TOKEN definido (Flask escucha en 0.0.0.0): ?token=... o cabecera X-Stats-Token
+    stats_token = os.getenv("STATS_TOKEN")
+    if not stats_token:
+        return jsonify({"error": "not found"}), 404
+    supplied = request.headers.get("X-Stats-Token") or request.args.get("token") or ""
+    if not hmac.compare_digest(supplied.encode("utf-8"), stats_token.encode("utf-8")):
+        return jsonify({"error": "unauthorized"}), 401
+    if not (bot.db and bot.db.initialized):
+        return jsonify({"error": "database not initialized"}), 503
+    return jsonify(bot.db.queries.snapshot(request.args.get("sort", "p95_ms")))
+
 def run_flask():
     port = int(os.environ.get("PORT", 5000))
     app.run(host="0.0.0.0", port=port)
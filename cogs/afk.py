@@ -10,7 +10,7 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 from utils.rate_limiter import safe_interaction_response, safe_send_message
-from utils.database import set_afk, remove_afk, get_afk_user, db, logger
+from utils.database import set_afk, remove_afk, get_afk_user, get_many_afk, db, logger
 
 class AFK(commands.Cog):
     def __init__(self, bot):
@@ -189,18 +189,17 @@ class AFK(commands.Cog):
 
             # Si mencionaron a alguien AFK, notificar
             if message.mentions:
+                # Buscar en una sola consulta los mencionados que no están en cache local
+                uncached = [user.id for user in message.mentions if not user.bot and user.id not in self.afk_cache]
+                if uncached:
+                    for afk_id, afk_data in (await get_many_afk(uncached)).items():
+                        self.afk_cache[int(afk_id)] = afk_data["reason"]
+
                 for mentioned_user in message.mentions:
                     if mentioned_user.bot:
                         continue
                         
-                    # Buscar en cache local primero
                     reason = self.afk_cache.get(mentioned_user.id)
-                    if reason is None:
-                        # Si no está en cache, buscar en base de datos
-                        reason = await get_afk_user(mentioned_user.id)
-                        if reason:
-                            # Guardar en cache para futuras consultas
-                            self.afk_cache[mentioned_user.id] = reason
                     
                     if reason is not None:
                         embed = discord.Embed(
@@ -5,6 +5,7 @@ from discord.ext import commands
 import aiohttp
 import asyncio
 import random
+from utils.cooldowns import check_cooldown
 
 class AnimeNSFW(commands.Cog):
     def __init__(self, bot: commands.Bot):
@@ -46,7 +47,6 @@ class AnimeNSFW(commands.Cog):
                 continue
         return None
 
-    @commands.cooldown(1, 5, commands.BucketType.user)
     @app_commands.command(name="nsfw_interact", description="Interactúa NSFW (solo canales permitidos)")
     @app_commands.describe(action="Selecciona la acción NSFW", user="Menciona a alguien (opcional)")
     async def nsfw_interact(self, interaction: discord.Interaction, action: str, user: discord.Member = None):
@@ -54,6 +54,8 @@ class AnimeNSFW(commands.Cog):
             embed = discord.Embed(title="Canal no permitido", description="Este comando solo puede usarse en canales marcados como NSFW.", color=discord.Color.red())
             await interaction.response.send_message(embed=embed, ephemeral=True)
             return
+        if not await check_cooldown(interaction, "emote.nsfw", 5):
+            return
             
         await interaction.response.defer()
         
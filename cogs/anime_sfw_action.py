@@ -5,6 +5,7 @@ from discord.ext import commands
 import aiohttp
 import asyncio
 import random
+from utils.cooldowns import check_cooldown
 
 class AnimeSFWAction(commands.Cog):
     def __init__(self, bot):
@@ -49,6 +50,8 @@ class AnimeSFWAction(commands.Cog):
         return None
 
     async def send(self, i, a, u):
+        if not await check_cooldown(i, "emote.action", 5):
+            return
         await i.response.defer()
         url = await self.fetch(self.actions[a])
         if not url:
@@ -69,7 +72,6 @@ class AnimeSFWAction(commands.Cog):
 
     action_group = app_commands.Group(name="action", description="Comandos de acciones físicas")
     
-    @commands.cooldown(1, 5, commands.BucketType.user)
     @action_group.command(name="emote")
     @app_commands.describe(
         action="Elige la acción física que quieres realizar",
@@ -5,6 +5,7 @@ from discord.ext import commands
 import aiohttp
 import asyncio
 import random
+from utils.cooldowns import check_cooldown
 
 class AnimeSFWAngry(commands.Cog):
     def __init__(self, bot):
@@ -49,6 +50,8 @@ class AnimeSFWAngry(commands.Cog):
         return None
 
     async def send(self, i, a, u):
+        if not await check_cooldown(i, "emote.angry", 5):
+            return
         await i.response.defer()
         url = await self.fetch(self.actions[a])
         if not url:
@@ -69,7 +72,6 @@ class AnimeSFWAngry(commands.Cog):
 
     angry_group = app_commands.Group(name="angry", description="Comandos de enojo y confrontación")
     
-    @commands.cooldown(1, 5, commands.BucketType.user)
     @angry_group.command(name="emote")
     @app_commands.describe(
         emotion="Elige la emoción o acción de enojo que quieres expresar",
@@ -5,6 +5,7 @@ from discord.ext import commands
 import aiohttp
 import asyncio
 import random
+from utils.cooldowns import check_cooldown
 
 class AnimeSFWExtreme(commands.Cog):
     def __init__(self, bot):
@@ -42,6 +43,8 @@ class AnimeSFWExtreme(commands.Cog):
         return None
 
     async def send(self, i, a, u):
+        if not await check_cooldown(i, "emote.extreme", 5):
+            return
         await i.response.defer()
         url = await self.fetch(self.actions[a])
         if not url:
@@ -62,7 +65,6 @@ class AnimeSFWExtreme(commands.Cog):
 
     extreme_group = app_commands.Group(name="extreme", description="Comandos de acciones extremas")
     
-    @commands.cooldown(1, 5, commands.BucketType.user)
     @extreme_group.command(name="emote")
     @app_commands.describe(
         action="Elige la acción extrema que quieres realizar",
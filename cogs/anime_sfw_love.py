@@ -5,6 +5,7 @@ from discord.ext import commands
 import aiohttp
 import asyncio
 import random
+from utils.cooldowns import check_cooldown
 
 class AnimeSFWLove(commands.Cog):
     def __init__(self, bot):
@@ -49,6 +50,8 @@ class AnimeSFWLove(commands.Cog):
         return None
 
     async def send(self, i, a, u):
+        if not await check_cooldown(i, "emote.love", 5):
+            return
         await i.response.defer()
         url = await self.fetch(self.actions[a])
         if not url:
@@ -69,7 +72,6 @@ class AnimeSFWLove(commands.Cog):
 
     love_group = app_commands.Group(name="love", description="Comandos de amor y afecto")
     
-    @commands.cooldown(1, 5, commands.BucketType.user)
     @love_group.command(name="emote")
     @app_commands.describe(
         emotion="Elige la expresión de amor o afecto que quieres mostrar",
@@ -5,6 +5,7 @@ from discord.ext import commands
 import aiohttp
 import asyncio
 import random
+from utils.cooldowns import check_cooldown
 
 class AnimeSFWSad(commands.Cog):
     def __init__(self, bot):
@@ -49,6 +50,8 @@ class AnimeSFWSad(commands.Cog):
         return None
 
     async def send(self, i, a, u):
+        if not await check_cooldown(i, "emote.sad", 5):
+            return
         await i.response.defer()
         url = await self.fetch(self.actions[a])
         if not url:
@@ -69,7 +72,6 @@ class AnimeSFWSad(commands.Cog):
 
     sad_group = app_commands.Group(name="sad", description="Comandos de emociones tristes y estados de ánimo")
     
-    @commands.cooldown(1, 5, commands.BucketType.user)
     @sad_group.command(name="emote")
     @app_commands.describe(
         emotion="Elige la emoción o estado de ánimo que quieres expresar",
@@ -5,7 +5,7 @@ from typing import Dict, Any
 from utils.database import get_user_pets, save_user_pets, update_mission_progress, is_blacklisted, get_afk_user, get_guild, update_guild
 from utils.constants import PET_CLASSES
 import utils.database as database
-from utils.database import is_blacklisted, update_mission_progress, get_afk_user, get_guild, update_guild, get_user_pets
+from utils.database import in_blacklist, update_mission_progress, get_afk_user, get_guild, update_guild, get_user_pets, record_guild_activity
 import os
 
 logger = logging.getLogger(__name__)
@@ -35,8 +35,8 @@ class Events(commands.Cog):
             return
 
 
-        # Comprobar si el usuario está en blacklist
-        if await is_blacklisted(message.author.id):
+        # Comprobar si el usuario está en blacklist (en memoria, sin consultar SQLite)
+        if in_blacklist(message.author.id):
             return
 
         user_id = str(message.author.id)
@@ -56,19 +56,9 @@ class Events(commands.Cog):
         # Actualizar progreso de misiones
         await update_mission_progress(user_id, "diarias.send_message", 1)
 
-        # Actualizar datos de gremio si aplica
+        # Actividad de gremio: se acumula en memoria y se vuelca en lote (subidas de nivel incluidas)
         if user_data.get("guild_id"):
-            guild_data = await get_guild(user_data["guild_id"])
-            if guild_data:
-                guild_data["bank"] = guild_data.get("bank", 0) + 1
-                guild_data["xp"] = guild_data.get("xp", 0) + 5
-                guild_data["last_update"] = str(discord.utils.utcnow())
-                await update_guild(user_data["guild_id"], guild_data)
-                if guild_data["xp"] >= guild_data["level"] * 1000:
-                    guild_data["level"] += 1
-                    guild_data["xp"] = 0
-                    await update_guild(user_data["guild_id"], guild_data)
-                    await message.channel.send(f"🎉 ¡El gremio **{guild_data['name']}** ha subido al nivel {guild_data['level']}!")
+            record_guild_activity(user_data["guild_id"], bank=1, xp=5, channel=message.channel)
         
         await self.bot.process_commands(message)
 
@@ -21,7 +21,7 @@ class Moderation(commands.Cog):
         """Carga datos de moderación al iniciar el cog"""
         try:
             logger.info("🔄 Inicializando sistema de moderación con BD híbrida...")
-            # El sistema de blacklist se carga automáticamente en el bot.cache
+            # La lista negra se carga al iniciar la BD y bot.cache["blacklist"] es ese mismo conjunto
             logger.info("✅ Sistema de moderación inicializado")
         except Exception as e:
             logger.error(f"❌ Error inicializando sistema de moderación: {e}")
@@ -180,9 +180,6 @@ class Moderation(commands.Cog):
             success = await add_blacklist(user_id_int)
             
             if success:
-                # Actualizar cache del bot
-                self.bot.cache["blacklist"].add(str(user_id_int))
-                
                 embed = discord.Embed(
                     title="🚫 Usuario Añadido a Lista Negra",
                     description=f"El usuario ha sido añadido a la lista negra global",
@@ -229,9 +226,6 @@ class Moderation(commands.Cog):
             success = await remove_blacklist(user_id_int)
             
             if success:
-                # Actualizar cache del bot
-                self.bot.cache["blacklist"].discard(str(user_id_int))
-                
                 embed = discord.Embed(
                     title="✅ Usuario Removido de Lista Negra",
                     description=f"El usuario ha sido removido de la lista negra global",
@@ -5,8 +5,10 @@ import random
 import logging
 from datetime import datetime, timedelta
 from typing import Dict, Any, Optional
-from utils.database import get_user_pets, save_user_pets, update_user_coins, update_user_achievements, use_item, update_mission_progress
+from utils.database import unit_of_work, get_mission_progress
 from utils.constants import PET_NAMES_BY_RARITY, PET_CLASSES, PET_TYPES, PET_ELEMENTS, PET_SHOP_ITEMS, RARE_ITEMS
+from utils.pet_decay import materialize_pet, ANCHOR_KEY, INTERACTION_COOLDOWN
+from utils.cooldowns import cooldowns
 
 # Configuración de logging
 logger = logging.getLogger(__name__)
@@ -16,7 +18,6 @@ class PetSystem(commands.Cog):
     
     def __init__(self, bot):
         self.bot = bot
-        self.rare_pet_tickets = {}  # Cache para tickets raros (user_id: expiration_time)
 
     # ===== COMANDOS DE MASCOTAS =====
     
@@ -26,27 +27,31 @@ class PetSystem(commands.Cog):
         """Comando principal para gestionar mascotas"""
         await interaction.response.defer()
         user_id = str(interaction.user.id)
-        user_data = get_user_pets(user_id)
+        replies = []
         
         try:
-            if action == "view":
-                await self.handle_view(interaction, user_id, user_data, pet_name)
-            elif action == "adopt":
-                await self.handle_adopt(interaction, user_id, user_data, pet_name)
-            elif action == "interact":
-                await self.handle_interact(interaction, user_id, user_data, pet_name)
-            elif action == "rename":
-                await self.handle_rename(interaction, user_id, user_data, pet_name)
-            elif action == "release":
-                await self.handle_release(interaction, user_id, user_data, pet_name)
-            else:
-                await interaction.followup.send("❌ Acción no válida. Usa: view, adopt, interact, rename, release")
+            # Una sola carga del usuario y una sola confirmación por comando; se responde tras confirmar
+            async with unit_of_work(user_id) as uow:
+                if action == "view":
+                    await self.handle_view(replies, user_id, uow.user_data, pet_name)
+                elif action == "adopt":
+                    await self.handle_adopt(replies, uow, pet_name)
+                elif action == "interact":
+                    await self.handle_interact(replies, uow, pet_name)
+                elif action == "rename":
+                    await self.handle_rename(replies, user_id, uow.user_data, pet_name)
+                elif action == "release":
+                    await self.handle_release(replies, uow, pet_name)
+                else:
+                    replies.append({"content": "❌ Acción no válida. Usa: view, adopt, interact, rename, release"})
                 
         except Exception as e:
             logger.error(f"Error en comando /pet: {e}")
             await interaction.followup.send("❌ Error al procesar el comando. Intenta de nuevo.")
+            return
+        await self.send_replies(interaction, replies)
 
-    async def handle_view(self, interaction: discord.Interaction, user_id: str, user_data: dict, pet_name: str = None):
+    async def handle_view(self, replies: list, user_id: str, user_data: dict, pet_name: str = None):
         """Maneja la acción de ver mascotas"""
         if not user_data["mascotas"]:
             embed = discord.Embed(
@@ -54,7 +59,7 @@ class PetSystem(commands.Cog):
                 description="¡No tienes mascotas! Usa `/pet adopt` para adoptar una.",
                 color=0xFF6B6B
             )
-            await interaction.followup.send(embed=embed)
+            replies.append({"embed": embed})
             return
 
         if pet_name and pet_name in user_data["mascotas"]:
@@ -72,7 +77,7 @@ class PetSystem(commands.Cog):
             embed.add_field(name="Salud", value=f"{pet['salud']}/{pet['max_salud']}", inline=True)
             embed.add_field(name="Estado", value=pet["estado"].capitalize(), inline=True)
             embed.add_field(name="Inventario", value=", ".join([f"{item['emoji']} {item['name']}" for item in pet.get("inventario", [])]) or "Vacío", inline=False)
-            await interaction.followup.send(embed=embed)
+            replies.append({"embed": embed})
         else:
             embed = discord.Embed(title="Tus Mascotas", color=0x9B59B6)
             for name, pet in user_data["mascotas"].items():
@@ -82,16 +87,17 @@ class PetSystem(commands.Cog):
                     inline=False
                 )
             embed.set_footer(text=f"Monedas: {user_data.get('coins', 0)} 💰")
-            await interaction.followup.send(embed=embed)
+            replies.append({"embed": embed})
 
-    async def handle_adopt(self, interaction: discord.Interaction, user_id: str, user_data: dict, pet_name: str = None):
+    async def handle_adopt(self, replies: list, uow, pet_name: str = None):
         """Maneja la adopción de una nueva mascota"""
+        user_id, user_data = uow.user_id, uow.user_data
         if len(user_data["mascotas"]) >= 10:
-            await interaction.followup.send("❌ No puedes tener más de 10 mascotas.")
+            replies.append({"content": "❌ No puedes tener más de 10 mascotas."})
             return
 
-        # Verificar si el usuario tiene un ticket raro activo
-        ticket_active = self.rare_pet_tickets.get(user_id, datetime.min) > datetime.now()
+        # Verificar si el usuario tiene un ticket raro activo (lo activa el item "Ticket Raro")
+        ticket_active = cooldowns.remaining(f"ticket:{user_id}") > 0
         probabilities = {
             cls: data["probability"] * (2.0 if ticket_active and cls in ["Raro", "Épico", "Legendario", "Mítico", "Universal"] else 1.0)
             for cls, data in PET_CLASSES.items()
@@ -124,6 +130,7 @@ class PetSystem(commands.Cog):
             "salud": int(pet_type_data["base_stats"]["salud"] * stat_multiplier),
             "estado": "activo",
             "última_interacción": str(datetime.now()),
+            ANCHOR_KEY: str(datetime.now()),
             "max_energía": int(pet_type_data["base_stats"]["energía"] * stat_multiplier),
             "max_salud": int(pet_type_data["base_stats"]["salud"] * stat_multiplier),
             "habilidades": [],
@@ -131,36 +138,41 @@ class PetSystem(commands.Cog):
         }
 
         user_data["mascotas"][selected_name] = new_pet
-        save_user_pets(user_id, user_data)
+        uow.save_pets()
         
         # Verificar logros
-        await self.check_achievements(interaction, user_id, user_data)
+        announcements = self.check_achievements(uow)
         
         # Actualizar misión de adopción
-        await update_mission_progress(user_id, "diarias.adopt_pet", 1)
+        uow.mission("diarias.adopt_pet", 1)
         
         embed = discord.Embed(
             title="🎉 ¡Mascota Adoptada!",
             description=f"Has adoptado a **{selected_name}**, un {pet_type} ({selected_class}) {pet_type_data['emoji']}",
             color=PET_CLASSES[selected_class]["color"]
         )
-        await interaction.followup.send(embed=embed)
+        replies.append({"embed": embed})
+        replies.extend({"content": announcement} for announcement in announcements)
 
-    async def handle_interact(self, interaction: discord.Interaction, user_id: str, user_data: dict, pet_name: str):
+    async def handle_interact(self, replies: list, uow, pet_name: str):
         """Maneja la interacción con una mascota"""
+        user_data = uow.user_data
         if not pet_name or pet_name not in user_data["mascotas"]:
-            await interaction.followup.send("❌ Mascota no encontrada. Usa `/pet view` para ver tus mascotas.")
+            replies.append({"content": "❌ Mascota no encontrada. Usa `/pet view` para ver tus mascotas."})
             return
 
-        pet = user_data["mascotas"][pet_name]
+        now = datetime.now()
+        state = materialize_pet(user_data["mascotas"][pet_name], now)
+        pet = user_data["mascotas"][pet_name] = state.pet
         if pet["estado"] == "durmiendo":
-            await interaction.followup.send(f"😴 {pet_name} está durmiendo. Espera a que despierte.")
+            replies.append({"content": f"😴 {pet_name} está durmiendo. Espera a que despierte."})
             return
 
-        now = datetime.now()
-        last_interaction = datetime.fromisoformat(pet["última_interacción"]) if pet.get("última_interacción") else now - timedelta(hours=1)
-        if (now - last_interaction).total_seconds() < 300:
-            await interaction.followup.send(f"⏳ {pet_name} necesita descansar. Intenta de nuevo más tarde.")
+        # El servicio de cooldowns manda; la última interacción guardada cubre un reinicio sin persistencia
+        cooldown_key = f"interact:{uow.user_id}:{pet_name}"
+        remaining = max(cooldowns.remaining(cooldown_key), state.cooldown_remaining)
+        if remaining > 0:
+            replies.append({"content": f"⏳ {pet_name} necesita descansar. Intenta de nuevo en {int(remaining)}s."})
             return
 
         interaction_types = ["jugar", "alimentar", "acariciar"]
@@ -172,204 +184,205 @@ class PetSystem(commands.Cog):
             updates["energía"] = -10
             updates["experiencia"] = 20
             message = f"🎾 ¡Has jugado con {pet_name}! Felicidad +10, Energía -10, XP +20"
-            await update_mission_progress(user_id, "diarias.play_pet", 1)
+            uow.mission("diarias.play_pet", 1)
         elif interaction_type == "alimentar":
             updates["hambre"] = -15
             updates["felicidad"] = 5
             message = f"🍽️ ¡Has alimentado a {pet_name}! Hambre -15, Felicidad +5"
-            await update_mission_progress(user_id, "diarias.feed_pet", 1)
+            uow.mission("diarias.feed_pet", 1)
         elif interaction_type == "acariciar":
             updates["felicidad"] = 15
             updates["experiencia"] = 10
             message = f"🤗 ¡Has acariciado a {pet_name}! Felicidad +15, XP +10"
-            await update_mission_progress(user_id, "diarias.pet_pet", 1)
+            uow.mission("diarias.pet_pet", 1)
 
         updates["última_interacción"] = str(now)
-        from utils.database import update_pet_stats
-        update_pet_stats(user_id, pet_name, updates)
+        uow.update_pet(pet_name, updates)
+        uow.on_commit(lambda: cooldowns.set(cooldown_key, INTERACTION_COOLDOWN))
         
         # Verificar si la mascota debe dormir
-        if pet["energía"] + updates.get("energía", 0) <= 20:
+        if pet["energía"] <= 20:
             pet["estado"] = "durmiendo"
-            pet["última_interacción"] = str(now)
-            save_user_pets(user_id, user_data)
+            pet[ANCHOR_KEY] = str(now)  # La recuperación de energía empieza al dormirse
             message += f"\n😴 {pet_name} está cansado y se fue a dormir."
 
-        await self.check_achievements(interaction, user_id, user_data)
+        announcements = self.check_achievements(uow)
         
         embed = discord.Embed(title="Interacción con Mascota", description=message, color=0x9B59B6)
-        await interaction.followup.send(embed=embed)
+        replies.append({"embed": embed})
+        replies.extend({"content": announcement} for announcement in announcements)
 
-    async def handle_rename(self, interaction: discord.Interaction, user_id: str, user_data: dict, pet_name: str):
+    async def handle_rename(self, replies: list, user_id: str, user_data: dict, pet_name: str):
         """Maneja el cambio de nombre de una mascota"""
-        await interaction.followup.send("🔄 Funcionalidad de cambio de nombre en desarrollo...")
+        replies.append({"content": "🔄 Funcionalidad de cambio de nombre en desarrollo..."})
         # Implementar si es necesario
 
-    async def handle_release(self, interaction: discord.Interaction, user_id: str, user_data: dict, pet_name: str):
+    async def handle_release(self, replies: list, uow, pet_name: str):
         """Maneja la liberación de una mascota"""
-        if not pet_name or pet_name not in user_data["mascotas"]:
-            await interaction.followup.send("❌ Mascota no encontrada. Usa `/pet view` para ver tus mascotas.")
+        if not pet_name or pet_name not in uow.pets:
+            replies.append({"content": "❌ Mascota no encontrada. Usa `/pet view` para ver tus mascotas."})
             return
 
-        del user_data["mascotas"][pet_name]
-        save_user_pets(user_id, user_data)
+        del uow.pets[pet_name]
+        uow.save_pets()
         embed = discord.Embed(
             title="🕊️ Mascota Liberada",
             description=f"Has liberado a **{pet_name}**. ¡Adiós, pequeño amigo!",
             color=0x9B59B6
         )
-        await interaction.followup.send(embed=embed)
+        replies.append({"embed": embed})
 
     # ===== TIENDA DE MASCOTAS =====
     
     @app_commands.command(name="pet_shop", description="Accede a la tienda de mascotas")
-    @app_commands.describe(action="Acción: view, buy, use", item="Nombre del item", quantity="Cantidad a comprar", pet_name="Nombre de la mascota (para usar)")
+    @app_commands.describe(action="Acción: view, buy, use", item="Nombre del item", quantity="Cantidad a comprar o usar", pet_name="Nombre de la mascota (para usar)")
     async def pet_shop(self, interaction: discord.Interaction, action: str = "view", item: str = None, quantity: int = 1, pet_name: str = None):
         """Comando para la tienda de mascotas"""
         await interaction.response.defer()
         user_id = str(interaction.user.id)
-        user_data = get_user_pets(user_id)
+        replies = []
         
         try:
-            await self.handle_shop(interaction, user_id, user_data, action, item, quantity, pet_name)
+            async with unit_of_work(user_id) as uow:
+                await self.handle_shop(replies, uow, action, item, quantity, pet_name)
         except Exception as e:
             logger.error(f"Error en comando /pet_shop: {e}")
             await interaction.followup.send("❌ Error al procesar el comando de la tienda. Intenta de nuevo.")
+            return
+        await self.send_replies(interaction, replies)
 
-    async def handle_shop(self, interaction: discord.Interaction, user_id: str, user_data: dict, action: str, item: str, quantity: int, pet_name: str):
+    async def handle_shop(self, replies: list, uow, action: str, item: str, quantity: int, pet_name: str):
         """Maneja el comando /pet shop"""
-        try:
-            if action == "view":
-                embed = discord.Embed(
-                    title="🛍️ Tienda de Mascotas",
-                    description="Compra items para tus mascotas",
-                    color=0x9B59B6
+        user_id, user_data = uow.user_id, uow.user_data
+        if action == "view":
+            embed = discord.Embed(
+                title="🛍️ Tienda de Mascotas",
+                description="Compra items para tus mascotas",
+                color=0x9B59B6
+            )
+            
+            for item_name, item_data in PET_SHOP_ITEMS.items():
+                embed.add_field(
+                    name=f"{item_data['emoji']} {item_name} - 💰 {item_data['cost']}",
+                    value=item_data['effect'],
+                    inline=False
+                )
+            for item_name, item_data in RARE_ITEMS.items():
+                embed.add_field(
+                    name=f"{item_data['emoji']} {item_name} - 💰 {item_data['cost']} (Raro)",
+                    value=item_data['effect'],
+                    inline=False
                 )
-                
-                for item_name, item_data in PET_SHOP_ITEMS.items():
-                    embed.add_field(
-                        name=f"{item_data['emoji']} {item_name} - 💰 {item_data['cost']}",
-                        value=item_data['effect'],
-                        inline=False
-                    )
-                for item_name, item_data in RARE_ITEMS.items():
-                    embed.add_field(
-                        name=f"{item_data['emoji']} {item_name} - 💰 {item_data['cost']} (Raro)",
-                        value=item_data['effect'],
-                        inline=False
-                    )
-                
-                embed.set_footer(text=f"Monedas: {user_data.get('coins', 0)} 💰 | Usa /pet shop buy [item] [cantidad] o /pet shop use [item] [pet_name]")
-                await interaction.followup.send(embed=embed)
             
-            elif action == "buy" and item:
-                if item not in PET_SHOP_ITEMS and item not in RARE_ITEMS:
-                    await interaction.followup.send(f"❌ El item **{item}** no está disponible en la tienda.")
-                    return
-                
-                item_data = PET_SHOP_ITEMS.get(item, RARE_ITEMS.get(item))
-                total_cost = item_data["cost"] * quantity
-                
-                if quantity < 1:
-                    await interaction.followup.send("❌ La cantidad debe ser mayor que 0.")
-                    return
-                
-                if user_data.get("coins", 0) < total_cost:
-                    await interaction.followup.send(f"❌ No tienes suficientes monedas. Necesitas {total_cost} 💰.")
-                    return
-                
-                # Actualizar monedas
-                user_data["coins"] = user_data.get("coins", 0) - total_cost
-                update_user_coins(user_id, user_data["coins"])
-                
-                # Agregar items al inventario de la mascota (o al usuario si no se especifica mascota)
-                target_inventory = user_data.setdefault("inventario_global", [])
-                for _ in range(quantity):
-                    target_inventory.append({
-                        "name": item,
-                        "emoji": item_data["emoji"],
-                        "effect": item_data["effect"],
-                        "type": item_data["type"]
-                    })
-                
-                save_user_pets(user_id, user_data)
-                await update_mission_progress(user_id, "diarias.buy_item", quantity)
-                await self.check_achievements(interaction, user_id, user_data)
-                
+            embed.set_footer(text=f"Monedas: {user_data.get('coins', 0)} 💰 | Usa /pet shop buy [item] [cantidad] o /pet shop use [item] [pet_name]")
+            replies.append({"embed": embed})
+        
+        elif action == "buy" and item:
+            if item not in PET_SHOP_ITEMS and item not in RARE_ITEMS:
+                replies.append({"content": f"❌ El item **{item}** no está disponible en la tienda."})
+                return
+            
+            item_data = PET_SHOP_ITEMS.get(item, RARE_ITEMS.get(item))
+            total_cost = item_data["cost"] * quantity
+            
+            if quantity < 1:
+                replies.append({"content": "❌ La cantidad debe ser mayor que 0."})
+                return
+            
+            # El cargo se confirma con la compra; la transacción vuelve a comprobar el saldo
+            if not uow.add_coins(-total_cost, f"tienda:{item}"):
+                replies.append({"content": f"❌ No tienes suficientes monedas. Necesitas {total_cost} 💰."})
+                return
+            
+            # Agregar items al inventario global; se guarda en la misma transacción que el cargo
+            target_inventory = user_data.setdefault("inventario_global", [])
+            for _ in range(quantity):
+                target_inventory.append({
+                    "name": item,
+                    "emoji": item_data["emoji"],
+                    "effect": item_data["effect"],
+                    "type": item_data["type"]
+                })
+            
+            uow.mission("diarias.buy_item", quantity)
+            announcements = self.check_achievements(uow)
+            
+            embed = discord.Embed(
+                title="🛒 Compra Exitosa",
+                description=f"Has comprado {quantity} x **{item}** {item_data['emoji']} por {total_cost} 💰.",
+                color=0x9B59B6
+            )
+            embed.set_footer(text=f"Monedas restantes: {uow.coins} 💰")
+            replies.append({"embed": embed})
+            replies.extend({"content": announcement} for announcement in announcements)
+        
+        elif action == "use" and item and pet_name:
+            if pet_name not in user_data["mascotas"]:
+                replies.append({"content": f"❌ No tienes una mascota llamada **{pet_name}**."})
+                return
+            
+            # Una mutación validada; se escribe con la misión y los logros al salir del comando
+            result = uow.use_item(pet_name, item, quantity)
+            announcements = []
+            if result["success"]:
                 embed = discord.Embed(
-                    title="🛒 Compra Exitosa",
-                    description=f"Has comprado {quantity} x **{item}** {item_data['emoji']} por {total_cost} 💰.",
+                    title="🎁 Item Usado",
+                    description=f"¡Has usado {quantity} x **{item}** en **{pet_name}** con éxito!\n{result['message']}",
                     color=0x9B59B6
                 )
-                embed.set_footer(text=f"Monedas restantes: {user_data['coins']} 💰")
-                await interaction.followup.send(embed=embed)
-            
-            elif action == "use" and item and pet_name:
-                if pet_name not in user_data["mascotas"]:
-                    await interaction.followup.send(f"❌ No tienes una mascota llamada **{pet_name}**.")
-                    return
-                
-                result = use_item(user_id, pet_name, item)
-                if result["success"]:
-                    embed = discord.Embed(
-                        title="🎁 Item Usado",
-                        description=f"¡Has usado **{item}** en **{pet_name}** con éxito!\n{result['message']}",
-                        color=0x9B59B6
-                    )
-                    await update_mission_progress(user_id, "diarias.use_item", 1)
-                    await self.check_achievements(interaction, user_id, user_data)
-                else:
-                    embed = discord.Embed(
-                        title="❌ Error",
-                        description=result["message"],
-                        color=0xFF6B6B
-                    )
-                await interaction.followup.send(embed=embed)
-            
+                uow.mission("diarias.use_item", quantity)
+                announcements = self.check_achievements(uow)
             else:
-                await interaction.followup.send("❌ Parámetros incorrectos. Usa: `/pet shop view`, `/pet shop buy [item] [cantidad]`, o `/pet shop use [item] [pet_name]`")
-                
-        except Exception as e:
-            logger.error(f"❌ Error en tienda de mascotas: {e}")
-            await interaction.followup.send("❌ Error en la tienda de mascotas.")
+                embed = discord.Embed(
+                    title="❌ Error",
+                    description=result["error"],
+                    color=0xFF6B6B
+                )
+            replies.append({"embed": embed})
+            replies.extend({"content": announcement} for announcement in announcements)
+        
+        else:
+            replies.append({"content": "❌ Parámetros incorrectos. Usa: `/pet shop view`, `/pet shop buy [item] [cantidad]`, o `/pet shop use [item] [pet_name]`"})
+            
 
     # ===== SISTEMA DE LOGROS =====
     
-    async def check_achievements(self, interaction: discord.Interaction, user_id: str, user_data: dict):
-        """Verifica y actualiza los logros del usuario"""
-        achievements = get_user_achievements(user_id)
+    def check_achievements(self, uow) -> list:
+        """Registra en la unidad de trabajo los logros nuevos y sus recompensas; devuelve los anuncios"""
+        user_data = uow.user_data
+        announcements = []
         
         # Primer mascota
-        if not achievements.get("primer_mascota") and user_data["mascotas"]:
-            await update_user_achievements(user_id, "primer_mascota")
-            user_data["coins"] = user_data.get("coins", 0) + 50
-            save_user_pets(user_id, user_data)
-            await interaction.followup.send("🏆 **Logro Desbloqueado: Primer Mascota** - ¡+50 monedas!")
+        if user_data["mascotas"] and uow.unlock_achievement("primer_mascota"):
+            uow.add_coins(50, "logros")
+            announcements.append("🏆 **Logro Desbloqueado: Primer Mascota** - ¡+50 monedas!")
         
         # Coleccionista novato (3 o más mascotas)
-        if not achievements.get("coleccionista_novato") and len(user_data["mascotas"]) >= 3:
-            await update_user_achievements(user_id, "coleccionista_novato")
-            user_data["coins"] = user_data.get("coins", 0) + 100
-            save_user_pets(user_id, user_data)
-            await interaction.followup.send("🏆 **Logro Desbloqueado: Coleccionista Novato** - ¡+100 monedas!")
+        if len(user_data["mascotas"]) >= 3 and uow.unlock_achievement("coleccionista_novato"):
+            uow.add_coins(100, "logros")
+            announcements.append("🏆 **Logro Desbloqueado: Coleccionista Novato** - ¡+100 monedas!")
         
         # Primer raro (mascota rara o superior)
-        if not achievements.get("primer_raro"):
-            for pet in user_data["mascotas"].values():
-                if pet["clase"] in ["Raro", "Épico", "Legendario", "Mítico", "Universal"]:
-                    await update_user_achievements(user_id, "primer_raro")
-                    user_data["coins"] = user_data.get("coins", 0) + 80
-                    save_user_pets(user_id, user_data)
-                    await interaction.followup.send("🏆 **Logro Desbloqueado: Primer Raro** - ¡+80 monedas!")
-                    break
+        if any(pet["clase"] in ["Raro", "Épico", "Legendario", "Mítico", "Universal"] for pet in user_data["mascotas"].values()):
+            if uow.unlock_achievement("primer_raro"):
+                uow.add_coins(80, "logros")
+                announcements.append("🏆 **Logro Desbloqueado: Primer Raro** - ¡+80 monedas!")
         
         # Explorador de items (comprar o usar 5 items)
         total_items = sum(len(pet.get("inventario", [])) for pet in user_data["mascotas"].values()) + len(user_data.get("inventario_global", []))
-        if not achievements.get("explorador_items") and total_items >= 5:
-            await update_user_achievements(user_id, "explorador_items")
-            user_data["coins"] = user_data.get("coins", 0) + 60
-            save_user_pets(user_id, user_data)
-            await interaction.followup.send("🏆 **Logro Desbloqueado: Explorador de Items** - ¡+60 monedas!")
+        if total_items >= 5 and uow.unlock_achievement("explorador_items"):
+            uow.add_coins(60, "logros")
+            announcements.append("🏆 **Logro Desbloqueado: Explorador de Items** - ¡+60 monedas!")
+        
+        return announcements
+
+    async def send_replies(self, interaction: discord.Interaction, replies: list):
+        """Envía las respuestas preparadas dentro de la unidad de trabajo, ya confirmada"""
+        for reply in replies:
+            try:
+                await interaction.followup.send(**reply)
+            except discord.HTTPException as e:
+                logger.error(f"❌ Error enviando respuesta a {interaction.user.id}: {e}")
 
     # ===== SISTEMA DE MISIONES =====
     
@@ -394,15 +407,17 @@ class PetSystem(commands.Cog):
         """Muestra las misiones del usuario y su progreso"""
         await interaction.response.defer()
         user_id = str(interaction.user.id)
-        user_data = get_user_pets(user_id)
+        replies = []
         
         try:
+            missions = await get_mission_progress(user_id)
             embed = discord.Embed(title="📋 Tus Misiones", color=0x9B59B6)
+            claimable = []
             
             # Misiones diarias
             embed.add_field(name="Misiones Diarias", value="Resetean cada 24 horas", inline=False)
             for mission_key, mission_data in self.MISSIONS["diarias"].items():
-                progress = user_data.get("misiones", {}).get("diarias", {}).get(mission_key, {}).get("progreso", 0)
+                progress = missions["diarias"].get(mission_key, {}).get("progreso", 0)
                 completed = progress >= mission_data["goal"]
                 status = "✅ Completada" if completed else f"{progress}/{mission_data['goal']}"
                 embed.add_field(
@@ -410,14 +425,13 @@ class PetSystem(commands.Cog):
                     value=f"Progreso: {status}\nRecompensa: {mission_data['reward']['coins']} 💰, {mission_data['reward']['xp']} XP",
                     inline=False
                 )
-                if completed and not user_data["misiones"]["diarias"].get(mission_key, {}).get("claimed", False):
-                    await self.claim_mission_reward(user_id, user_data, "diarias", mission_key, mission_data["reward"])
-                    await interaction.followup.send(f"🎉 ¡Has completado la misión diaria '{mission_data['description']}'! Recompensa: {mission_data['reward']['coins']} 💰, {mission_data['reward']['xp']} XP")
+                if completed and not missions["diarias"].get(mission_key, {}).get("claimed", False):
+                    claimable.append(("diarias", mission_key, mission_data))
             
             # Misiones semanales
             embed.add_field(name="Misiones Semanales", value="Resetean cada 7 días", inline=False)
             for mission_key, mission_data in self.MISSIONS["semanales"].items():
-                progress = user_data.get("misiones", {}).get("semanales", {}).get(mission_key, {}).get("progreso", 0)
+                progress = missions["semanales"].get(mission_key, {}).get("progreso", 0)
                 completed = progress >= mission_data["goal"]
                 status = "✅ Completada" if completed else f"{progress}/{mission_data['goal']}"
                 embed.add_field(
@@ -425,28 +439,37 @@ class PetSystem(commands.Cog):
                     value=f"Progreso: {status}\nRecompensa: {mission_data['reward']['coins']} 💰, {mission_data['reward']['xp']} XP",
                     inline=False
                 )
-                if completed and not user_data["misiones"]["semanales"].get(mission_key, {}).get("claimed", False):
-                    await self.claim_mission_reward(user_id, user_data, "semanales", mission_key, mission_data["reward"])
-                    await interaction.followup.send(f"🎉 ¡Has completado la misión semanal '{mission_data['description']}'! Recompensa: {mission_data['reward']['coins']} 💰, {mission_data['reward']['xp']} XP")
+                if completed and not missions["semanales"].get(mission_key, {}).get("claimed", False):
+                    claimable.append(("semanales", mission_key, mission_data))
+            
+            # Cada reclamo va en su propia unidad de trabajo: si uno falla, los demás se abonan igual
+            for mission_type, mission_key, mission_data in claimable:
+                replies.append(await self.claim_mission_reward(user_id, mission_type, mission_key, mission_data))
             
             embed.set_footer(text="Las recompensas se reclaman automáticamente al completar las misiones.")
-            await interaction.followup.send(embed=embed)
+            replies.append({"embed": embed})
             
         except Exception as e:
             logger.error(f"Error en comando /pet_missions: {e}")
             await interaction.followup.send("❌ Error al mostrar las misiones.")
+            return
+        await self.send_replies(interaction, replies)
 
-    async def claim_mission_reward(self, user_id: str, user_data: dict, mission_type: str, mission_key: str, reward: dict):
-        """Reclama la recompensa de una misión completada"""
-        user_data["coins"] = user_data.get("coins", 0) + reward["coins"]
-        for pet_name in user_data["mascotas"]:
-            from utils.database import update_pet_stats
-            update_pet_stats(user_id, pet_name, {"experiencia": reward["xp"]})
-        user_data.setdefault("misiones", {}).setdefault(mission_type, {})[mission_key] = {
-            "progreso": user_data["misiones"].get(mission_type, {}).get(mission_key, {}).get("progreso", 0),
-            "claimed": True
-        }
-        save_user_pets(user_id, user_data)
+    async def claim_mission_reward(self, user_id: str, mission_type: str, mission_key: str, mission_data: dict) -> dict:
+        """Reclama una misión y abona su recompensa juntos (una vez por periodo). Devuelve la respuesta para el usuario"""
+        label = "diaria" if mission_type == "diarias" else "semanal"
+        reward = mission_data["reward"]
+        try:
+            async with unit_of_work(user_id) as uow:
+                uow.claim_mission(f"{mission_type}.{mission_key}", mission_data["goal"])
+                uow.add_coins(reward["coins"], f"mision:{mission_type}.{mission_key}")
+                for pet_name in uow.pets:
+                    uow.update_pet(pet_name, {"experiencia": reward["xp"]})
+        except ValueError as e:
+            # Ya reclamada o el periodo cambió entre la lectura y la confirmación
+            logger.warning(f"⚠️ Reclamo de misión omitido: {e}")
+            return {"content": f"⚠️ No se pudo reclamar la misión {label} '{mission_data['description']}'. Vuelve a consultar tus misiones."}
+        return {"content": f"🎉 ¡Has completado la misión {label} '{mission_data['description']}'! Recompensa: {reward['coins']} 💰, {reward['xp']} XP"}
 
 async def setup(bot):
     await bot.add_cog(PetSystem(bot))
\ No newline at end of file
@@ -0,0 +1,63 @@
+"""Microbenchmark: JSON actual vs codecs binarios para pet_data y guild_data.
+
+Uso: python tests/bench_codec.py [iteraciones]
+"""
+import json
+import sys
+import timeit
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root))
+
+from utils import codec
+from utils.pet_schema import PROMOTED_FIELDS, LIST_FIELDS
+
+def sample_pet():
+    return {
+        "tipo": "Perro", "clase": "Raro", "elemento": "Fuego", "emoji": "🐶",
+        "nivel": 12, "experiencia": 340, "hambre": 45, "energía": 60, "felicidad": 80, "salud": 95,
+        "estado": "activo", "max_energía": 120, "max_salud": 150,
+        "última_interacción": "2025-01-01 12:00:00.000000",
+        "ancla_decaimiento": "2025-01-01 12:00:00.000000",
+        "habilidades": [{"name": "Mordisco", "power": 10}],
+        "inventario": [{"name": "Poción de energía", "effect": "Restaura 50 de energía", "cost": 50}] * 5,
+    }
+
+def sample_guild(members):
+    return {
+        "guild_id": "123456", "name": "Los Sinfónicos", "owner_id": "100000000000000000",
+        "members": [str(100000000000000000 + i) for i in range(members)],
+        "created_at": "2025-01-01 12:00:00.000000", "last_update": "2025-01-01 12:00:00.000000",
+        "last_updated": "2025-01-01 12:00:00.000000", "level": 4, "xp": 1200, "bank": 5000,
+        "activity_points": 42,
+    }
+
+def pet_extra(pet):
+    """Parte de la mascota que sigue guardándose en pet_data tras la normalización."""
+    return {key: value for key, value in pet.items() if key not in PROMOTED_FIELDS and key not in LIST_FIELDS}
+
+def bench(label, doc, iterations):
+    print(f"\n{label}")
+    encoders = [("heredado", lambda d: json.dumps(d), json.loads)]
+    for name in ("json", "tagged", "msgpack"):
+        if name == "msgpack" and codec.msgpack is None:
+            print("  (msgpack no instalado, se omite)")
+            continue
+        selected = codec.CODECS_BY_NAME[name]
+        encoders.append((name, selected.encode, codec.decode))
+    print(f"  {'codec':<10}{'bytes':>8}{'encode µs':>12}{'decode µs':>12}")
+    for name, encode, decode in encoders:
+        raw = encode(doc)
+        assert decode(raw) == doc, f"round-trip fallido con {name}"
+        size = len(raw.encode("utf-8")) if isinstance(raw, str) else len(raw)
+        encode_us = timeit.timeit(lambda: encode(doc), number=iterations) / iterations * 1e6
+        decode_us = timeit.timeit(lambda: decode(raw), number=iterations) / iterations * 1e6
+        print(f"  {name:<10}{size:>8}{encode_us:>12.2f}{decode_us:>12.2f}")
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    bench("pet_data (tras normalizar)", pet_extra(sample_pet()), iterations)
+    bench("mascota completa (JSON heredado)", sample_pet(), iterations)
+    bench("guild_data (10 miembros)", sample_guild(10), iterations)
+    bench("guild_data (200 miembros, zlib)", sample_guild(200), iterations // 10)
@@ -0,0 +1,97 @@
+"""Microbenchmark: backends de STORAGE_STRATEGY con la misma carga de mascotas y gremios.
+
+Uso: python tests/bench_storage.py [usuarios] [estrategia ...]
+Estrategias: sql_only (por defecto), memory, sqlalchemy (si está instalado), mongo_only (si hay MongoDB).
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root))
+
+from utils import storage_backends
+from utils.database import HybridDatabase, DatabaseManager
+
+def sample_pets(index):
+    return {
+        "Rex": {"tipo": "Perro", "nivel": index % 50, "hambre": 40, "energía": 60, "felicidad": 70, "salud": 90,
+                "inventario": [{"name": "Hueso", "effect": "Restaura 10 de hambre", "cost": 5}] * 3, "habilidades": []},
+        "Mishi": {"tipo": "Gato", "nivel": 3, "hambre": 10, "energía": 20, "felicidad": 30, "salud": 40,
+                  "inventario": [], "habilidades": [{"name": "Arañazo", "power": 5}]},
+    }
+
+async def bench(strategy, users, workdir):
+    db = HybridDatabase()
+    db.strategy = strategy
+    db.sqlite_manager = DatabaseManager(os.path.join(workdir, f"{strategy}.db"))
+    db.queries = db.sqlite_manager.queries
+    await db.sqlite_manager.init_db()
+    db.pool = db.sqlite_manager.pool
+    try:
+        if strategy == "mongo_only":
+            from motor.motor_asyncio import AsyncIOMotorClient
+            db.mongo_client = AsyncIOMotorClient(os.getenv("MONGO_URI", "mongodb://127.0.0.1:27017"), serverSelectionTimeoutMS=2000)
+            db.mongo_db = db.mongo_client["beethoven_bench"]
+            await db.mongo_db.command("ping")
+        db.storage = storage_backends.create_backend(strategy, db, f"sqlite+aiosqlite:///{workdir}/alchemy.db")
+        await db.storage.open()
+        return await run_workload(db, users)
+    finally:
+        if db.storage:
+            await db.storage.close()
+        await db.sqlite_manager.close()
+        if db.mongo_client:
+            db.mongo_client.close()
+
+async def run_workload(db, users):
+    user_ids = [str(100000 + i) for i in range(users)]
+    timings = {}
+    started = time.perf_counter()
+    for index, user_id in enumerate(user_ids):
+        await db.save_user_pets(user_id, {"mascotas": sample_pets(index)})
+    await db.write_behind.flush()
+    timings["flush"] = time.perf_counter() - started
+
+    db.pet_cache.clear()
+    started = time.perf_counter()
+    for user_id in user_ids:
+        await db.get_user_pets(user_id)
+    timings["get x1"] = time.perf_counter() - started
+
+    db.pet_cache.clear()
+    started = time.perf_counter()
+    await db.get_many_user_pets(user_ids)
+    timings["get_many"] = time.perf_counter() - started
+
+    for index in range(users // 10 or 1):
+        await db.create_guild(f"g{index}", {"name": f"Gremio {index}", "members": user_ids[:10]})
+    started = time.perf_counter()
+    for index in range(users // 10 or 1):
+        db.guild_activity.record(f"g{index}", bank=1, xp=1500)
+    await db.guild_activity.flush()
+    timings["guild flush"] = time.perf_counter() - started
+
+    if db.mongo_db is not None:
+        await db.mongo_db.user_pets.drop()
+        await db.mongo_db.guilds.drop()
+    return timings
+
+async def main(users, strategies):
+    with tempfile.TemporaryDirectory() as workdir:
+        print(f"{'backend':<12}" + "".join(f"{label:>14}" for label in ("flush", "get x1", "get_many", "guild flush")))
+        for strategy in strategies:
+            try:
+                timings = await bench(strategy, users, workdir)
+            except Exception as e:
+                print(f"{strategy:<12}  (omitido: {str(e).splitlines()[0][:80]})")
+                continue
+            print(f"{strategy:<12}" + "".join(f"{value * 1000:>12.1f}ms" for value in timings.values()))
+
+if __name__ == "__main__":
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    strategies = sys.argv[2:] or ["memory", "sql_only", "sqlalchemy"]
+    asyncio.run(main(users, strategies))
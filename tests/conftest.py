@@ -0,0 +1,41 @@
+import sys
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+import pytest
+
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root))
+
+from utils import database as database_module
+from utils.cooldowns import cooldowns
+from utils.database import HybridDatabase, DatabaseManager
+from utils.storage_backends import create_backend
+
+@pytest.fixture
+def open_database(tmp_path):
+    """Fábrica `async with open_database(shards=0) as db:` sobre un SQLite temporal (sql_only).
+
+    Abrirla dos veces con el mismo nombre simula un reinicio: la segunda lee lo persistido.
+    """
+    @asynccontextmanager
+    async def factory(shards: int = 0, name: str = "bot.db"):
+        db = HybridDatabase()
+        db.strategy = "sql_only"
+        db.sqlite_manager = DatabaseManager(str(tmp_path / name), shards=shards)
+        db.queries = db.sqlite_manager.queries
+        await db.sqlite_manager.init_db()
+        db.sqlite_conn = db.sqlite_manager.sqlite_conn
+        db.pool = db.sqlite_manager.pool
+        db.storage = create_backend("sql_only", db, "")
+        await db.storage.open()
+        previous, database_module.db = database_module.db, db
+        cooldowns.clear()
+        try:
+            yield db
+        finally:
+            await db.write_behind.flush()
+            await db.missions.flush()
+            await db.sqlite_manager.close()
+            database_module.db = previous
+    return factory
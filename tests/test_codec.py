@@ -0,0 +1,18 @@
+from utils import codec
+
+def test_default_codec_is_plain_json():
+    doc = {"estado": "activo", "emoji": "🐶"}
+    encoded = codec.get_codec("json").encode(doc)
+    assert isinstance(encoded, str)
+    assert codec.decode(encoded) == doc
+    assert codec.get_codec("desconocido").name == "json"
+
+def test_large_guilds_opt_in_to_tagged_zlib():
+    small = {"guild_id": "1", "members": ["1"]}
+    large = {"guild_id": "1", "members": [str(100000000000000000 + i) for i in range(200)]}
+    tiered = codec.get_guild_codec("json", "tagged", 4096)
+    assert isinstance(tiered.encode(small), str)
+    encoded = tiered.encode(large)
+    assert encoded[0] == codec.MAGIC and encoded[2] & codec.FLAG_ZLIB
+    assert codec.decode(encoded) == large
+    assert codec.get_guild_codec("json", "", 4096) is codec.get_codec("json")
@@ -0,0 +1,36 @@
+import asyncio
+import time
+
+USER = "909"
+
+async def ledger_rows(db):
+    async with db.user_pool(USER).reader("test.ledger") as conn:
+        async with conn.execute("SELECT id, delta, reason FROM coin_ledger WHERE user_id = ? ORDER BY id", (USER,)) as cursor:
+            return [tuple(row) for row in await cursor.fetchall()]
+
+def test_insufficient_funds_changes_nothing(open_database):
+    async def scenario():
+        async with open_database() as db:
+            assert await db.add_coins(USER, 100, "premio") == 100
+            assert await db.add_coins(USER, -150, "compra") is None
+            assert await db.get_user_coins(USER) == 100
+            assert [row[1:] for row in await ledger_rows(db)] == [(100, "premio")]
+    asyncio.run(scenario())
+
+def test_compaction_keeps_balance_and_is_stable(open_database):
+    """Compactar conserva la suma y una segunda pasada no reescribe el resumen."""
+    async def scenario():
+        async with open_database() as db:
+            for delta in (100, -30, 45):
+                assert await db.add_coins(USER, delta, "juego") is not None
+            async with db.user_pool(USER).transaction("test.backdate") as conn:
+                await conn.execute("UPDATE coin_ledger SET created_at = ?", (time.time() - 30 * 86400,))
+            assert await db.add_coins(USER, 5, "reciente") == 120
+
+            assert await db.compact_coin_ledger(days=7) == 3
+            rows = await ledger_rows(db)
+            assert [row[1:] for row in rows] == [(5, "reciente"), (115, "compactado")]
+            assert await db.compact_coin_ledger(days=7) == 0
+            assert await ledger_rows(db) == rows
+            assert await db.get_user_coins(USER) == sum(row[1] for row in rows)
+    asyncio.run(scenario())
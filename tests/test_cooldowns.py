@@ -0,0 +1,38 @@
+from utils.cooldowns import CooldownManager
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def test_hit_blocks_until_expiry():
+    clock = FakeClock()
+    manager = CooldownManager(clock=clock)
+    assert manager.hit("emote:1", 30) == 0
+    assert manager.hit("emote:1", 30) == 30
+    clock.now += 30
+    assert manager.hit("emote:1", 30) == 0
+    assert manager.stats["blocked"] == 1
+
+def test_cap_evicts_soonest_to_expire():
+    """Con el tope alcanzado se desaloja la clave que antes iba a caducar."""
+    clock = FakeClock()
+    manager = CooldownManager(max_entries=3, clock=clock)
+    for key, seconds in (("a", 50), ("b", 10), ("c", 30), ("d", 40)):
+        manager.set(key, seconds)
+    assert sorted(manager.expiry) == ["a", "c", "d"]
+    assert manager.stats["evicted"] == 1
+
+def test_expired_and_stale_entries_are_dropped():
+    clock = FakeClock()
+    manager = CooldownManager(max_entries=2, clock=clock)
+    manager.set("a", 10)
+    manager.set("a", 100)  # La entrada anterior queda obsoleta en el montículo
+    manager.set("b", 5)
+    clock.now += 20
+    manager.set("c", 50)
+    assert sorted(manager.expiry) == ["a", "c"]
+    assert manager.stats["evicted"] == 0
+    assert manager.remaining("a") == 80
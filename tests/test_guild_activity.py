@@ -0,0 +1,20 @@
+import asyncio
+
+GUILD = "g-77"
+
+def test_saving_a_stale_document_keeps_flushed_counters(open_database):
+    """Un documento leído antes de un volcado de actividad no pisa bank/xp/level al guardarse."""
+    async def scenario():
+        async with open_database() as db:
+            assert await db.create_guild(GUILD, {"name": "Gremio", "members": ["1"], "bank": 0, "xp": 0, "level": 1})
+            stale = await db.get_guild(GUILD)
+            db.guild_activity.record(GUILD, bank=40, xp=1200)
+            assert await db.guild_activity.flush() == 1
+
+            stale["members"].append("2")
+            assert await db.update_guild(GUILD, stale)
+            db.guild_cache.invalidate(GUILD)
+            guild = await db.get_guild(GUILD)
+            assert (guild["bank"], guild["xp"], guild["level"]) == (40, 200, 2)
+            assert guild["members"] == ["1", "2"]
+    asyncio.run(scenario())
@@ -0,0 +1,51 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from utils.cooldowns import cooldowns
+
+USER = "404"
+
+def sample_pet(**overrides):
+    pet = {"tipo": "perro", "clase": "Común", "elemento": "tierra", "emoji": "🐶", "nivel": 1, "experiencia": 0,
+           "hambre": 50, "energía": 80, "felicidad": 90, "salud": 100, "estado": "activo",
+           "max_energía": 100, "max_salud": 100, "habilidades": [], "inventario": [],
+           "ancla_decaimiento": str(datetime.now())}
+    pet.update(overrides)
+    return pet
+
+async def seed(db, pets, items):
+    async with db.unit_of_work(USER) as uow:
+        uow.pets.update(pets)
+        uow.save_pets()
+        uow.user_data["inventario_global"].extend({"name": name} for name in items)
+
+def test_stat_items_cap_like_apply_updates(open_database):
+    """Un item no sube un stat por encima de su tope, pero tampoco recorta el que ya lo superaba."""
+    async def scenario():
+        async with open_database() as db:
+            await seed(db, {"Rex": sample_pet(), "Atlas": sample_pet(felicidad=140)}, ["Juguete Mágico"] * 2)
+            async with db.unit_of_work(USER) as uow:
+                assert uow.use_item("Rex", "Juguete Mágico")["updates"] == {"felicidad": 100}
+                assert uow.use_item("Atlas", "Juguete Mágico")["updates"] == {"felicidad": 140}
+    asyncio.run(scenario())
+
+def test_cooldown_and_ticket_only_after_commit(open_database):
+    """Si la unidad de trabajo se deshace, el item vuelve al inventario sin cooldown ni ticket."""
+    async def scenario():
+        async with open_database() as db:
+            await seed(db, {"Rex": sample_pet()}, ["Ticket Raro"])
+            with pytest.raises(ValueError):
+                async with db.unit_of_work(USER) as uow:
+                    assert uow.use_item("Rex", "Ticket Raro")["success"]
+                    uow.claim_mission("diarias.use_item", 99)
+            assert cooldowns.remaining(f"item:{USER}:Rex:Ticket Raro") == 0
+            assert cooldowns.remaining(f"ticket:{USER}") == 0
+            assert [item["name"] for item in await db.get_global_inventory(USER)] == ["Ticket Raro"]
+
+            result = await db.use_item(USER, "Rex", "Ticket Raro")
+            assert result["success"]
+            assert cooldowns.remaining(f"item:{USER}:Rex:Ticket Raro") > 0
+            assert cooldowns.remaining(f"ticket:{USER}") > 0
+    asyncio.run(scenario())
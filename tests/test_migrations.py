@@ -0,0 +1,50 @@
+import asyncio
+import json
+import sqlite3
+
+LEGACY_SCHEMA = [
+    """CREATE TABLE users (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT UNIQUE NOT NULL, username TEXT,
+                          coins INTEGER DEFAULT 0, last_login TIMESTAMP DEFAULT CURRENT_TIMESTAMP)""",
+    "CREATE TABLE pets (user_id TEXT NOT NULL, pet_name TEXT NOT NULL, pet_data TEXT NOT NULL, PRIMARY KEY (user_id, pet_name))",
+    "CREATE TABLE guilds (guild_id TEXT PRIMARY KEY, guild_data TEXT NOT NULL, last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP)",
+]
+
+def legacy_pet(level: int):
+    return {"tipo": "perro", "clase": "Común", "nivel": level, "experiencia": 10, "hambre": 40, "energía": 50,
+            "felicidad": 60, "salud": 90, "estado": "activo", "max_energía": 100, "max_salud": 100,
+            "habilidades": ["Mordida"], "inventario": [{"name": "Poción de Energía"}]}
+
+def create_legacy_database(path, users):
+    """Base de la versión original (user_version 0): documentos JSON sin columnas tipadas."""
+    conn = sqlite3.connect(path)
+    for statement in LEGACY_SCHEMA:
+        conn.execute(statement)
+    for index, user_id in enumerate(users):
+        conn.execute("INSERT INTO users (user_id, username, coins) VALUES (?, 'legado', ?)", (user_id, 40 + index))
+        conn.execute("INSERT INTO pets VALUES (?, 'Rex', ?)", (user_id, json.dumps(legacy_pet(index + 1))))
+    conn.execute("INSERT INTO guilds (guild_id, guild_data) VALUES ('g1', ?)", (json.dumps({"name": "Gremio", "bank": 300, "xp": 20, "level": 2}),))
+    conn.commit()
+    conn.close()
+
+def test_legacy_database_upgrades_to_latest_schema(open_database, tmp_path):
+    """v0 -> última versión: datos conservados, columnas rellenas y un segundo arranque sin migraciones."""
+    create_legacy_database(tmp_path / "legacy.db", ["1", "2"])
+    async def scenario():
+        async with open_database(name="legacy.db") as db:
+            manager = db.sqlite_manager
+            assert await manager.schema_version() == manager.schema_migrations()[-1][0]
+            pet = (await db.get_user_pets("2"))["mascotas"]["Rex"]
+            assert (pet["nivel"], pet["habilidades"], pet["inventario"]) == (2, ["Mordida"], [{"name": "Poción de Energía"}])
+            assert await db.get_user_coins("1") == 40
+            assert (await db.get_guild("g1"))["bank"] == 300
+            async with db.pool.reader("test.columns") as conn:
+                async with conn.execute("SELECT user_id, nivel FROM pets ORDER BY user_id") as cursor:
+                    assert [tuple(row) for row in await cursor.fetchall()] == [("1", 1), ("2", 2)]
+                async with conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'") as cursor:
+                    tables = {row[0] for row in await cursor.fetchall()}
+            assert {"user_inventory", "mongo_outbox_dead", "cooldowns", "mission_progress", "coin_ledger"} <= tables
+        async with open_database(name="legacy.db") as db:
+            migrations = db.sqlite_manager.schema_migrations()
+            assert await db.sqlite_manager.schema_version() == migrations[-1][0]
+            assert (await db.get_user_pets("1"))["mascotas"]["Rex"]["nivel"] == 1
+    asyncio.run(scenario())
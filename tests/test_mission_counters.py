@@ -0,0 +1,55 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+from utils import mission_counters
+
+USER = "808"
+
+def test_flush_mirrors_more_keys_than_one_select_chunk(open_database):
+    """El volcado replica todas las filas aunque superen SELECT_CHUNK_SIZE claves."""
+    async def scenario():
+        async with open_database() as db:
+            keys = mission_counters.SELECT_CHUNK_SIZE * 2 + 7
+            for i in range(keys):
+                db.missions.increment(USER, f"contador_{i}", i + 1)
+            db.replicator = object()
+            try:
+                assert await db.missions.flush() == keys
+            finally:
+                db.replicator = None
+            async with db.user_pool(USER).reader("test.outbox") as conn:
+                async with conn.execute("SELECT filter, doc FROM mongo_outbox WHERE collection = 'mission_progress'") as cursor:
+                    mirrored = {json.loads(row[0])["mission"]: json.loads(row[1])["$set"]["progress"] for row in await cursor.fetchall()}
+            assert mirrored == {f"general.contador_{i}": i + 1 for i in range(keys)}
+            async with db.user_pool(USER).reader("test.select") as conn:
+                rows = await db.missions._select(conn, [(USER, "total", f"general.contador_{i}") for i in range(20)], chunk_size=7)
+            assert sorted(row["progress"] for row in rows) == list(range(1, 21))
+    asyncio.run(scenario())
+
+def test_claim_once_per_period(open_database):
+    """Una misión diaria se reclama una sola vez por día; el día siguiente empieza de cero."""
+    async def scenario():
+        async with open_database() as db:
+            today = datetime(2026, 3, 2, 12, 0)
+            tomorrow = today + timedelta(days=1)
+            db.missions.increment(USER, "diarias.play_pet", 3, now=today)
+            assert not await db.missions.claim(USER, "diarias.play_pet", 5, now=today)
+            db.missions.increment(USER, "diarias.play_pet", 2, now=today)
+            assert await db.missions.claim(USER, "diarias.play_pet", 5, now=today)
+            assert not await db.missions.claim(USER, "diarias.play_pet", 5, now=today)
+
+            assert not await db.missions.claim(USER, "diarias.play_pet", 5, now=tomorrow)
+            db.missions.increment(USER, "diarias.play_pet", 5, now=tomorrow)
+            assert await db.missions.claim(USER, "diarias.play_pet", 5, now=tomorrow)
+            progress = await db.missions.get_progress(USER, now=tomorrow)
+            assert progress["diarias"]["play_pet"] == {"progreso": 5, "claimed": True}
+    asyncio.run(scenario())
+
+def test_periods_follow_local_midnight(monkeypatch):
+    """El día cambia a la medianoche local (más DAILY_RESET_HOUR), como el reinicio original."""
+    assert mission_counters.period_key("diarias", datetime(2026, 3, 2, 23, 59)) == "2026-03-02"
+    assert mission_counters.period_key("diarias", datetime(2026, 3, 3, 0, 1)) == "2026-03-03"
+    assert mission_counters.period_key("semanales", datetime(2026, 3, 2, 0, 1)) == "2026-W10"
+    monkeypatch.setattr(mission_counters, "DAILY_RESET_HOUR", 6)
+    assert mission_counters.period_key("diarias", datetime(2026, 3, 3, 5, 59)) == "2026-03-02"
@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+from pymongo.errors import AutoReconnect, WriteError
+
+from utils import mongo_outbox
+from utils.mongo_outbox import MongoReplicator
+
+class FakeCollection:
+    def __init__(self, mongo, name):
+        self.mongo = mongo
+        self.name = name
+
+    async def bulk_write(self, operations, ordered=True):
+        if self.mongo.offline:
+            self.mongo.offline -= 1
+            raise AutoReconnect("sin conexión")
+        for operation in operations:
+            if operation._filter.get("poison"):
+                raise WriteError("documento rechazado", 2)
+            self.mongo.written.append(operation._filter["user_id"])
+            self.mongo.log.append((self.name, operation._filter["user_id"]))
+
+class FakeMongo:
+    def __init__(self, offline: int = 0):
+        self.offline = offline
+        self.written = []
+        self.log = []
+
+    def __getitem__(self, name):
+        return FakeCollection(self, name)
+
+async def enqueue(pool, filters):
+    async with pool.transaction("test.enqueue") as conn:
+        await mongo_outbox.enqueue_many(conn, [("user_pets", "update", filter_doc, {"$set": {"x": 1}}) for filter_doc in filters])
+
+async def outbox_rows(pool, table="mongo_outbox"):
+    async with pool.reader("test.outbox") as conn:
+        async with conn.execute(f"SELECT filter, attempts FROM {table} ORDER BY id") as cursor:
+            return [(row[0], row[1]) for row in await cursor.fetchall()]
+
+def test_connection_errors_retry_without_counting_attempts(open_database):
+    async def scenario():
+        async with open_database() as db:
+            await enqueue(db.pool, [{"user_id": "1"}, {"user_id": "2"}])
+            mongo = FakeMongo(offline=1)
+            replicator = MongoReplicator(db.pool, mongo)
+            with pytest.raises(AutoReconnect):
+                await replicator.drain_once()
+            assert [attempts for _, attempts in await outbox_rows(db.pool)] == [0, 0]
+            assert await replicator.drain_once() == 2
+            assert mongo.written == ["1", "2"]
+            assert await outbox_rows(db.pool) == []
+    asyncio.run(scenario())
+
+def test_poison_operation_is_isolated_and_dead_lettered(open_database):
+    async def scenario():
+        async with open_database() as db:
+            await enqueue(db.pool, [{"user_id": "1"}, {"user_id": "2", "poison": True}, {"user_id": "3"}])
+            mongo = FakeMongo()
+            replicator = MongoReplicator(db.pool, mongo, max_attempts=2)
+            # Se aplica lo anterior a la operación rechazada (al partir el lote puede repetirse: son idempotentes)
+            # y esta suma un intento
+            with pytest.raises(WriteError):
+                await replicator.drain_once()
+            assert list(dict.fromkeys(mongo.written)) == ["1"]
+            assert [attempts for _, attempts in await outbox_rows(db.pool)] == [1, 0]
+            # Segundo rechazo: sale al dead-letter y el resto continúa en orden
+            assert await replicator.drain_once() == 1
+            assert await replicator.drain_once() == 1
+            assert list(dict.fromkeys(mongo.written)) == ["1", "3"]
+            assert await outbox_rows(db.pool) == []
+            assert [attempts for _, attempts in await outbox_rows(db.pool, "mongo_outbox_dead")] == [2]
+            assert (await replicator.lag())["dead"] == 1
+    asyncio.run(scenario())
+
+def test_batches_keep_outbox_order_across_collections(open_database):
+    """Las operaciones de colecciones distintas se replican en el orden del outbox, no agrupadas."""
+    async def scenario():
+        async with open_database() as db:
+            async with db.pool.transaction("test.enqueue") as conn:
+                await mongo_outbox.enqueue_many(conn, [
+                    ("user_pets", "update", {"user_id": "1"}, {"$set": {"x": 1}}),
+                    ("user_pets", "update", {"user_id": "2"}, {"$set": {"x": 1}}),
+                    ("user_profiles", "update", {"user_id": "3"}, {"$set": {"coins": 1}}),
+                    ("user_pets", "update", {"user_id": "4"}, {"$set": {"x": 1}}),
+                ])
+            mongo = FakeMongo()
+            assert await MongoReplicator(db.pool, mongo).drain_once() == 4
+            assert mongo.log == [("user_pets", "1"), ("user_pets", "2"), ("user_profiles", "3"), ("user_pets", "4")]
+    asyncio.run(scenario())
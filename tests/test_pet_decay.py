@@ -0,0 +1,25 @@
+from datetime import datetime, timedelta
+
+from utils.pet_decay import ANCHOR_KEY, materialize_pet
+
+START = datetime(2026, 1, 1, 12, 0, 0)
+
+def sample_pet(**overrides):
+    pet = {"hambre": 80, "energía": 60, "felicidad": 90, "max_energía": 100, "estado": "activo", ANCHOR_KEY: str(START)}
+    pet.update(overrides)
+    return pet
+
+def test_materialize_is_idempotent_and_composes():
+    """Materializar en pasos da lo mismo que de una vez, y repetirlo no cambia nada."""
+    for pet in (sample_pet(), sample_pet(estado="durmiendo", energía=70)):
+        later = START + timedelta(hours=5, minutes=30)
+        once = materialize_pet(pet, later).pet
+        stepped = materialize_pet(materialize_pet(pet, START + timedelta(hours=2, minutes=45)).pet, later).pet
+        assert stepped == once
+        assert materialize_pet(once, later).pet == once
+        assert once[ANCHOR_KEY] == str(START + timedelta(hours=5))
+
+def test_materialize_without_full_hour_returns_stored_document():
+    pet = sample_pet()
+    assert materialize_pet(pet, START + timedelta(minutes=59)).pet == pet
+    assert materialize_pet(pet, START + timedelta(hours=3)).pet["hambre"] == 65
@@ -0,0 +1,59 @@
+import asyncio
+import json
+from datetime import datetime
+
+from utils import pet_schema
+
+USER = "707"
+
+def sample_pet(**overrides):
+    pet = {"tipo": "gato", "clase": "Común", "elemento": "agua", "emoji": "🐱", "nivel": 1, "experiencia": 0,
+           "hambre": 95, "energía": 70, "felicidad": 90, "salud": 100, "estado": "activo",
+           "max_energía": 80, "max_salud": 100, "habilidades": [], "inventario": [],
+           "ancla_decaimiento": str(datetime.now())}
+    pet.update(overrides)
+    return pet
+
+async def seed(db, pets):
+    await db.save_user_pets(USER, {"mascotas": pets})
+    await db.write_behind.flush()
+
+async def outbox_docs(db):
+    async with db.user_pool(USER).reader("test.outbox") as conn:
+        async with conn.execute("SELECT doc FROM mongo_outbox WHERE collection = 'user_pets' AND op = 'update'") as cursor:
+            return [json.loads(row[0]) for row in await cursor.fetchall()]
+
+def test_apply_updates_clamps_to_caps():
+    pet = pet_schema.apply_updates(sample_pet(), {"hambre": 20, "felicidad": 30, "energía": 50, "salud": -150})
+    assert (pet["hambre"], pet["felicidad"], pet["energía"], pet["salud"]) == (100, 100, 80, 0)
+    # Un valor que ya superaba el tope no sube, pero tampoco se recorta
+    pet = pet_schema.apply_updates(sample_pet(felicidad=140), {"felicidad": 10})
+    assert pet["felicidad"] == 140
+    assert pet_schema.apply_updates(sample_pet(felicidad=140), {"felicidad": -10})["felicidad"] == 130
+
+def test_fast_path_clamps_like_documents(open_database):
+    """El UPDATE directo aplica los mismos topes que el camino de documento."""
+    async def scenario():
+        async with open_database() as db:
+            await seed(db, {"Mishi": sample_pet()})
+            assert await db.storage.update_pet_fields(USER, "Mishi", {"hambre": 20, "felicidad": 30, "energía": 50})
+            pet = (await db.get_user_pets(USER))["mascotas"]["Mishi"]
+            assert (pet["hambre"], pet["felicidad"], pet["energía"]) == (100, 100, 80)
+    asyncio.run(scenario())
+
+def test_fast_path_mirrors_unsafe_names_whole(open_database):
+    """Nombres con '.' o '$' no sirven como ruta de $set: se replica todo `mascotas`."""
+    async def scenario():
+        async with open_database() as db:
+            await seed(db, {"Sr. Bigotes": sample_pet(), "Rex": sample_pet()})
+            db.replicator = object()
+            try:
+                assert await db.storage.update_pet_fields(USER, "Sr. Bigotes", {"felicidad": 5})
+                assert await db.storage.update_pet_fields(USER, "Rex", {"felicidad": -5})
+            finally:
+                db.replicator = None
+            whole, targeted = await outbox_docs(db)
+            assert set(whole["$set"]) == {"mascotas"}
+            assert whole["$set"]["mascotas"]["Sr. Bigotes"]["felicidad"] == 95
+            assert targeted == {"$set": {"mascotas.Rex.felicidad": 85}}
+    asyncio.run(scenario())
@@ -0,0 +1,32 @@
+import asyncio
+import sqlite3
+
+from utils.database import SHARDED_TABLES, shard_of, shard_path
+from tests.test_migrations import create_legacy_database
+
+USERS = [str(user_id) for user_id in range(1, 13)]
+
+def count_rows(path, table):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    finally:
+        conn.close()
+
+def test_enabling_shards_drains_user_rows(open_database, tmp_path):
+    """Al activar SQLITE_SHARDS las filas por usuario pasan a su shard y el principal queda vacío."""
+    path = tmp_path / "drain.db"
+    create_legacy_database(path, USERS)
+    async def scenario():
+        async with open_database(shards=3, name="drain.db") as db:
+            for user_id in USERS:
+                assert db.user_pool(user_id) is db.sqlite_manager.shards[shard_of(user_id, 3)].pool
+                assert (await db.get_user_pets(user_id))["mascotas"]["Rex"]["nivel"] == int(user_id)
+                assert await db.get_user_coins(user_id) == 39 + int(user_id)
+        # Un segundo arranque no encuentra nada que repartir ni duplica filas
+        async with open_database(shards=3, name="drain.db") as db:
+            assert await db.get_user_coins(USERS[0]) == 40
+    asyncio.run(scenario())
+    assert all(count_rows(str(path), table) == 0 for table in SHARDED_TABLES)
+    per_shard = [count_rows(shard_path(str(path), index), "pets") for index in range(3)]
+    assert sum(per_shard) == len(USERS)
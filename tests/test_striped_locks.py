@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+from utils.striped_locks import StripedLocks
+
+def test_nested_hold_of_same_key_raises():
+    """Volver a pedir una clave ya retenida fallaría en silencio al confirmar: es un error."""
+    async def scenario():
+        locks = StripedLocks(stripes=8)
+        async with locks.hold("user:1"):
+            with pytest.raises(RuntimeError):
+                async with locks.hold("user:1"):
+                    pass
+            with pytest.raises(RuntimeError):
+                async with locks.hold("guild:9", "user:1"):
+                    pass
+            assert locks.snapshot()["held"] == 1
+        assert locks.snapshot()["held"] == 0
+    asyncio.run(scenario())
+
+def test_other_keys_share_a_held_stripe_and_other_tasks_wait():
+    async def scenario():
+        locks = StripedLocks(stripes=1)
+        order = []
+
+        async def other():
+            async with locks.hold("user:1"):
+                order.append("other")
+
+        async with locks.hold("user:1"):
+            async with locks.hold("guild:9"):
+                waiter = asyncio.create_task(other())
+                await asyncio.sleep(0)
+                order.append("owner")
+            assert locks.snapshot()["held"] == 1 and locks.stats["shared"] == 1
+            await asyncio.sleep(0)
+            assert order == ["owner"]
+        await asyncio.wait_for(waiter, 1)
+        assert order == ["owner", "other"]
+        assert locks.snapshot()["held"] == 0
+    asyncio.run(scenario())
+
+def test_multi_key_holds_do_not_deadlock():
+    """Dos tareas que piden las mismas claves en orden inverso terminan (se adquieren por franja)."""
+    async def scenario():
+        locks = StripedLocks(stripes=64)
+
+        async def worker(keys):
+            for _ in range(20):
+                async with locks.hold(*keys):
+                    await asyncio.sleep(0)
+
+        await asyncio.wait_for(asyncio.gather(worker(["user:1", "user:2"]), worker(["user:2", "user:1"])), 2)
+        assert locks.snapshot()["held"] == 0
+    asyncio.run(scenario())
@@ -0,0 +1,171 @@
+import asyncio
+
+import pytest
+
+from cogs import pet_system
+from cogs.pet_system import PetSystem
+from utils.cooldowns import cooldowns
+
+USER = "555"
+
+class FakeFollowup:
+    def __init__(self, database):
+        self.database = database
+        self.sent = []
+        self.locks_held = []
+
+    async def send(self, content=None, embed=None, **kwargs):
+        self.locks_held.append(self.database.locks.snapshot()["held"])
+        self.sent.append(content if content is not None else embed.title)
+
+class FakeResponse:
+    async def defer(self):
+        pass
+
+class FakeUser:
+    id = int(USER)
+
+class FakeInteraction:
+    def __init__(self, database):
+        self.followup = FakeFollowup(database)
+        self.response = FakeResponse()
+        self.user = FakeUser()
+
+def sample_pet():
+    return {"tipo": "perro", "clase": "Común", "elemento": "tierra", "emoji": "🐶", "nivel": 1, "experiencia": 0,
+            "hambre": 50, "energía": 80, "felicidad": 60, "salud": 100, "estado": "activo",
+            "max_energía": 100, "max_salud": 100, "habilidades": [], "inventario": []}
+
+def test_buy_persists_global_inventory(open_database):
+    """Compra -> volcado -> reinicio sin caché: el item y el cargo siguen ahí."""
+    async def scenario():
+        async with open_database() as db:
+            await db.add_coins(USER, 500, "test")
+            interaction = FakeInteraction(db)
+            cog = PetSystem(None)
+            await cog.pet_shop.callback(cog, interaction, "buy", "Juguete Mágico", 2)
+            assert interaction.followup.sent == ["🛒 Compra Exitosa"]
+        async with open_database() as db:
+            inventory = await db.get_global_inventory(USER)
+            assert [item["name"] for item in inventory] == ["Juguete Mágico", "Juguete Mágico"]
+            assert await db.get_user_coins(USER) == 440
+            async with db.unit_of_work(USER) as uow:
+                assert len(uow.user_data["inventario_global"]) == 2
+    asyncio.run(scenario())
+
+def test_commit_writes_pets_in_same_transaction(open_database):
+    """Las mascotas se escriben al confirmar (no quedan en el write-behind) y actualizan huellas."""
+    async def scenario():
+        async with open_database(shards=2) as db:
+            async with db.unit_of_work(USER) as uow:
+                uow.pets["Rex"] = sample_pet()
+                uow.save_pets()
+                uow.add_coins(50, "test")
+                uow.mission("diarias.adopt_pet")
+            assert USER not in db.write_behind.dirty
+            assert set(db.write_behind.fingerprints[USER]) == {"Rex"}
+            assert (await db.storage.load_pets([USER]))[USER]["Rex"]["nivel"] == 1
+            assert db.missions.pending == {}
+            progress = await db.get_mission_progress(USER)
+            assert progress["diarias"]["adopt_pet"]["progreso"] == 1
+    asyncio.run(scenario())
+
+def test_rollback_applies_nothing(open_database):
+    """Un reclamo que no se cumple deshace monedas, mascotas e inventario y devuelve las misiones pendientes."""
+    async def scenario():
+        async with open_database() as db:
+            await db.update_mission_progress(USER, "diarias.play_pet", 1)
+            with pytest.raises(ValueError):
+                async with db.unit_of_work(USER) as uow:
+                    uow.pets["Rex"] = sample_pet()
+                    uow.save_pets()
+                    uow.user_data["inventario_global"].append({"name": "Juguete Mágico"})
+                    uow.add_coins(100, "test")
+                    uow.claim_mission("diarias.play_pet", 2)
+            assert await db.get_user_coins(USER) == 0
+            assert await db.get_global_inventory(USER) == []
+            assert (await db.storage.load_pets([USER]))[USER] == {}
+            assert sum(db.missions.pending[USER].values()) == 1
+    asyncio.run(scenario())
+
+def test_claim_and_reward_once(open_database):
+    """/pet_missions reclama y abona en la misma confirmación, una sola vez por periodo."""
+    async def scenario():
+        async with open_database() as db:
+            await db.update_mission_progress(USER, "diarias.buy_item", 1)
+            cog = PetSystem(None)
+            first = FakeInteraction(db)
+            await cog.pet_missions.callback(cog, first)
+            assert any("Compra un item" in str(message) for message in first.followup.sent)
+            assert await db.get_user_coins(USER) == 10
+            second = FakeInteraction(db)
+            await cog.pet_missions.callback(cog, second)
+            assert await db.get_user_coins(USER) == 10
+            assert not any("Compra un item" in str(message) for message in second.followup.sent)
+    asyncio.run(scenario())
+
+def test_failed_claim_is_reported_without_aborting(open_database, monkeypatch):
+    """Un reclamo que ya no se cumple al confirmar se avisa; el resto del comando sigue."""
+    async def scenario():
+        async with open_database() as db:
+            await db.update_mission_progress(USER, "diarias.buy_item", 1)
+            await db.update_mission_progress(USER, "diarias.use_item", 1)
+            assert await db.claim_mission(USER, "diarias.buy_item", 1)
+            stale = await db.get_mission_progress(USER)
+            stale["diarias"]["buy_item"]["claimed"] = False
+
+            async def stale_progress(user_id):
+                return stale
+            monkeypatch.setattr(pet_system, "get_mission_progress", stale_progress)
+            interaction = FakeInteraction(db)
+            cog = PetSystem(None)
+            await cog.pet_missions.callback(cog, interaction)
+            sent = [str(message) for message in interaction.followup.sent]
+            assert any("No se pudo reclamar" in message and "Compra un item" in message for message in sent)
+            assert any("Usa un item" in message for message in sent)
+            assert sent[-1] == "📋 Tus Misiones"
+            assert await db.get_user_coins(USER) == 15
+    asyncio.run(scenario())
+
+def test_cooldown_only_after_commit(open_database):
+    """Si la confirmación falla, la interacción no deja a la mascota en cooldown."""
+    async def scenario():
+        async with open_database() as db:
+            async with db.unit_of_work(USER) as uow:
+                uow.pets["Rex"] = sample_pet()
+                uow.save_pets()
+            await db.write_behind.flush()
+            with pytest.raises(ValueError):
+                async with db.unit_of_work(USER) as uow:
+                    await PetSystem(None).handle_interact([], uow, "Rex")
+                    uow.claim_mission("diarias.play_pet", 99)
+            assert cooldowns.remaining(f"interact:{USER}:Rex") == 0
+            async with db.unit_of_work(USER) as uow:
+                await PetSystem(None).handle_interact([], uow, "Rex")
+            assert cooldowns.remaining(f"interact:{USER}:Rex") > 0
+    asyncio.run(scenario())
+
+def test_replies_sent_after_commit(open_database):
+    """Las respuestas salen con el lock del usuario ya liberado."""
+    async def scenario():
+        async with open_database() as db:
+            interaction = FakeInteraction(db)
+            cog = PetSystem(None)
+            await cog.pet.callback(cog, interaction, "adopt")
+            assert interaction.followup.sent and set(interaction.followup.locks_held) == {0}
+            assert await db.get_user_coins(USER) in (50, 130)  # "primer_mascota" (+ "primer_raro" si sale rara)
+    asyncio.run(scenario())
+
+def test_shop_use_does_not_nest_the_user_lock(open_database):
+    """/pet_shop use aplica el item dentro de la unidad de trabajo del comando: sin lock anidado y con la misión registrada."""
+    async def scenario():
+        async with open_database() as db:
+            pet = dict(sample_pet(), inventario=[{"name": "Poción de Energía"}])
+            await db.save_user_pets(USER, {"mascotas": {"Rex": pet}})
+            interaction = FakeInteraction(db)
+            cog = PetSystem(None)
+            await cog.pet_shop.callback(cog, interaction, "use", "Poción de Energía", 1, "Rex")
+            assert interaction.followup.sent[0] == "🎁 Item Usado"
+            assert (await db.get_user_pets(USER))["mascotas"]["Rex"]["inventario"] == []
+            assert (await db.get_mission_progress(USER))["diarias"]["use_item"]["progreso"] == 1
+    asyncio.run(scenario())
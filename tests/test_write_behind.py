@@ -0,0 +1,71 @@
+import asyncio
+from datetime import datetime
+
+USER = "111"
+
+def sample_pet(**overrides):
+    pet = {"tipo": "perro", "clase": "Común", "elemento": "tierra", "emoji": "🐶", "nivel": 1, "experiencia": 0,
+           "hambre": 50, "energía": 80, "felicidad": 60, "salud": 100, "estado": "activo",
+           "max_energía": 100, "max_salud": 100, "habilidades": [], "inventario": [],
+           "ancla_decaimiento": str(datetime.now())}
+    pet.update(overrides)
+    return pet
+
+def test_repeated_saves_coalesce_into_one_flush(open_database):
+    """Varias escrituras seguidas de un usuario se fusionan y se vuelca solo la última."""
+    async def scenario():
+        async with open_database(name="coalesce.db") as db:
+            for level in (1, 2, 3):
+                await db.save_user_pets(USER, {"mascotas": {"Rex": sample_pet(nivel=level)}})
+            assert db.write_behind.stats["merged"] == 2
+            assert (await db.get_user_pets(USER))["mascotas"]["Rex"]["nivel"] == 3
+            assert await db.write_behind.flush() == 1
+            assert db.write_behind.stats["flushes"] == 1
+            assert await db.write_behind.flush() == 0
+        async with open_database(name="coalesce.db") as db:
+            assert (await db.get_user_pets(USER))["mascotas"]["Rex"]["nivel"] == 3
+    asyncio.run(scenario())
+
+def test_flush_writes_only_changed_pets(open_database):
+    """El volcado compara huellas: solo escribe las mascotas cambiadas y borra las que faltan."""
+    async def scenario():
+        async with open_database() as db:
+            stats = db.write_behind.stats
+            pets = {"Rex": sample_pet(), "Luna": sample_pet(tipo="gato"), "Kiwi": sample_pet(tipo="ave")}
+            await db.save_user_pets(USER, {"mascotas": pets})
+            await db.write_behind.flush()
+            assert stats["rows_upserted"] == 3
+
+            pets["Rex"]["nivel"] = 2
+            del pets["Kiwi"]
+            await db.save_user_pets(USER, {"mascotas": pets})
+            await db.write_behind.flush()
+            assert (stats["rows_upserted"], stats["rows_deleted"], stats["rows_skipped"]) == (4, 1, 1)
+
+            commits = stats["commits"]
+            await db.save_user_pets(USER, {"mascotas": pets})
+            await db.write_behind.flush()
+            assert stats["commits"] == commits and stats["rows_upserted"] == 4
+
+            db.pet_cache.invalidate(USER)
+            stored = (await db.get_user_pets(USER))["mascotas"]
+            assert sorted(stored) == ["Luna", "Rex"] and stored["Rex"]["nivel"] == 2
+    asyncio.run(scenario())
+
+def test_get_user_pets_always_reports_coins(open_database):
+    """El saldo persistido viene en el resultado con mascotas pendientes, en caché, en SQLite o sin mascotas."""
+    async def scenario():
+        async with open_database() as db:
+            await db.update_user_coins(USER, 40)
+            await db.save_user_pets(USER, {"mascotas": {"Rex": sample_pet()}, "coins": 0})
+            assert (await db.get_user_pets(USER))["coins"] == 40
+            await db.write_behind.flush()
+            assert (await db.get_user_pets(USER))["coins"] == 40
+            assert db.pet_cache.get(USER) is not None
+            assert (await db.get_user_pets(USER))["coins"] == 40
+            db.pet_cache.invalidate(USER)
+            assert (await db.get_user_pets(USER))["coins"] == 40
+            assert await db.get_user_pets("222") == {"mascotas": {}, "coins": 0}
+            many = await db.get_many_user_pets([USER, "222"])
+            assert (many[USER]["coins"], many["222"]["coins"]) == (40, 0)
+    asyncio.run(scenario())
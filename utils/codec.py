@@ -0,0 +1,176 @@
+import json
+import zlib
+from typing import Dict, Any, Union
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Cabecera de los documentos binarios: MAGIC + versión + flags
+MAGIC = 0xBE
+FLAG_ZLIB = 0x01
+COMPRESS_THRESHOLD = 512  # Bytes a partir de los cuales se intenta comprimir
+TAG_PREFIX = "~"
+
+# Etiquetas cortas para las claves de primer nivel más frecuentes (no reordenar: forman parte del formato)
+FIELD_TAGS = {
+    # Mascotas (claves que quedan en pet_data tras normalizar)
+    "estado": "~a",
+    "max_energía": "~b",
+    "max_salud": "~c",
+    "emoji": "~d",
+    "ticket_raro": "~e",
+    # Gremios
+    "guild_id": "~f",
+    "name": "~g",
+    "owner_id": "~h",
+    "members": "~i",
+    "created_at": "~j",
+    "last_update": "~k",
+    "last_updated": "~l",
+    "level": "~m",
+    "xp": "~n",
+    "bank": "~o",
+    "discord_guild_id": "~p",
+    "activity_points": "~q",
+}
+TAG_FIELDS = {tag: field for field, tag in FIELD_TAGS.items()}
+
+def _tag_keys(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Sustituye claves conocidas por su etiqueta; las que ya empiezan por '~' se escapan."""
+    tagged = {}
+    for key, value in doc.items():
+        tag = FIELD_TAGS.get(key)
+        if tag is None:
+            tag = TAG_PREFIX + key if key.startswith(TAG_PREFIX) else key
+        tagged[tag] = value
+    return tagged
+
+def _untag_keys(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Operación inversa de `_tag_keys`."""
+    untagged = {}
+    for key, value in doc.items():
+        if key.startswith(TAG_PREFIX):
+            key = key[1:] if key.startswith(TAG_PREFIX * 2) else TAG_FIELDS.get(key, key)
+        untagged[key] = value
+    return untagged
+
+class DocumentCodec:
+    """Formato binario versionado para documentos guardados en columnas TEXT/BLOB."""
+
+    version = 0
+    name = "base"
+
+    def dumps(self, doc: Dict[str, Any]) -> bytes:
+        raise NotImplementedError
+
+    def loads(self, payload: bytes) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def encode(self, doc: Dict[str, Any]) -> bytes:
+        """Serializa con cabecera y comprime con zlib si el documento es grande y compensa."""
+        payload = self.dumps(doc)
+        flags = 0
+        if len(payload) >= COMPRESS_THRESHOLD:
+            compressed = zlib.compress(payload, 6)
+            if len(compressed) < len(payload):
+                payload, flags = compressed, FLAG_ZLIB
+        return bytes((MAGIC, self.version, flags)) + payload
+
+class JSONCodec(DocumentCodec):
+    """JSON en texto, sin cabecera ni compresión: el formato heredado y el más rápido de leer y escribir."""
+
+    name = "json"
+
+    def dumps(self, doc: Dict[str, Any]) -> bytes:
+        return json.dumps(doc, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def loads(self, payload: bytes) -> Dict[str, Any]:
+        return json.loads(payload)
+
+    def encode(self, doc: Dict[str, Any]) -> str:
+        return json.dumps(doc, ensure_ascii=False, separators=(",", ":"))
+
+class SizeTieredCodec(DocumentCodec):
+    """Codec rápido para documentos pequeños y uno compacto a partir de `threshold` bytes.
+
+    Pensado para gremios con muchos miembros, donde etiquetar y comprimir sí compensa.
+    """
+
+    def __init__(self, small: DocumentCodec, large: DocumentCodec, threshold: int):
+        self.small = small
+        self.large = large
+        self.threshold = threshold
+        self.name = f"{small.name}+{large.name}"
+
+    def encode(self, doc: Dict[str, Any]) -> Union[str, bytes]:
+        encoded = self.small.encode(doc)
+        if len(encoded) >= self.threshold:
+            return self.large.encode(doc)
+        return encoded
+
+class TaggedJSONCodec(DocumentCodec):
+    """v1: JSON compacto UTF-8 con claves etiquetadas (sin dependencias)."""
+
+    version = 1
+    name = "tagged"
+
+    def dumps(self, doc: Dict[str, Any]) -> bytes:
+        return json.dumps(_tag_keys(doc), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def loads(self, payload: bytes) -> Dict[str, Any]:
+        return _untag_keys(json.loads(payload))
+
+class MsgpackCodec(DocumentCodec):
+    """v2: msgpack con claves etiquetadas (requiere el paquete opcional `msgpack`)."""
+
+    version = 2
+    name = "msgpack"
+
+    def dumps(self, doc: Dict[str, Any]) -> bytes:
+        return msgpack.packb(_tag_keys(doc), use_bin_type=True, default=str)
+
+    def loads(self, payload: bytes) -> Dict[str, Any]:
+        return _untag_keys(msgpack.unpackb(payload, raw=False))
+
+# Codecs binarios por versión de cabecera; "json" no lleva cabecera y se reconoce por ser texto
+CODECS = {codec.version: codec for codec in (TaggedJSONCodec(), MsgpackCodec())}
+CODECS_BY_NAME = {codec.name: codec for codec in (JSONCodec(),) + tuple(CODECS.values())}
+DEFAULT_CODEC = CODECS_BY_NAME["json"]
+
+def get_codec(name: str) -> DocumentCodec:
+    """Devuelve el codec configurado; `msgpack` sin el paquete instalado cae a `json`."""
+    if name == "msgpack" and msgpack is None:
+        logger.warning("⚠️ msgpack no está instalado. Usando codec 'json'.")
+        name = "json"
+    if name not in CODECS_BY_NAME:
+        logger.warning(f"⚠️ Codec desconocido '{name}'. Usando codec 'json'.")
+        name = "json"
+    return CODECS_BY_NAME[name]
+
+def get_guild_codec(name: str, large_name: str, threshold: int) -> DocumentCodec:
+    """Codec de gremios: `name`, o `large_name` (p. ej. tagged, con zlib) para los de `threshold` bytes o más."""
+    codec = get_codec(name)
+    if not large_name or threshold <= 0:
+        return codec
+    return SizeTieredCodec(codec, get_codec(large_name), threshold)
+
+def decode(raw: Union[str, bytes, None]) -> Dict[str, Any]:
+    """Lee un documento en cualquier formato: JSON heredado (texto) o binario versionado."""
+    if raw is None:
+        return {}
+    if isinstance(raw, str):
+        return json.loads(raw) if raw else {}
+    if raw[0] != MAGIC:
+        return json.loads(raw)
+    codec = CODECS.get(raw[1])
+    if codec is None:
+        raise ValueError(f"Versión de codec desconocida: {raw[1]}")
+    payload = raw[3:]
+    if raw[2] & FLAG_ZLIB:
+        payload = zlib.decompress(payload)
+    return codec.loads(payload)
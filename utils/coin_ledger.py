@@ -0,0 +1,98 @@
+import time
+from typing import Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Libro mayor de monedas: cada cambio de saldo deja un movimiento; users.coins es el saldo materializado
+LEDGER_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS coin_ledger (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT NOT NULL,
+        delta INTEGER NOT NULL,
+        reason TEXT,
+        created_at REAL NOT NULL
+    )
+"""
+LEDGER_COLUMNS = ["id", "user_id", "delta", "reason", "created_at"]
+LEDGER_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_coin_ledger_created_at ON coin_ledger (created_at)",
+]
+COMPACTED_REASON = "compactado"
+
+async def _ensure_users(conn, user_ids: List[str]):
+    await conn.executemany(
+        "INSERT INTO users (user_id, username, coins) VALUES (?, '', 0) ON CONFLICT(user_id) DO NOTHING",
+        [(user_id,) for user_id in user_ids]
+    )
+
+async def balances(conn, user_ids: List[str]) -> Dict[str, int]:
+    """Saldos actuales de varios usuarios."""
+    placeholders = ", ".join("?" for _ in user_ids)
+    async with conn.execute(f"SELECT user_id, coins FROM users WHERE user_id IN ({placeholders})", user_ids) as cursor:
+        return {row["user_id"]: row["coins"] for row in await cursor.fetchall()}
+
+async def apply_delta(conn, user_id: str, delta: int, reason: Optional[str] = None) -> Optional[int]:
+    """Suma `delta` al saldo dentro de la transacción abierta en `conn`.
+
+    Devuelve el nuevo saldo, o None si el saldo quedaría negativo (no se modifica nada).
+    """
+    if delta >= 0:
+        await _ensure_users(conn, [user_id])
+    cursor = await conn.execute(
+        "UPDATE users SET coins = coins + ? WHERE user_id = ? AND coins + ? >= 0",
+        (delta, user_id, delta)
+    )
+    if cursor.rowcount != 1:
+        return None
+    await conn.execute(
+        "INSERT INTO coin_ledger (user_id, delta, reason, created_at) VALUES (?, ?, ?, ?)",
+        (user_id, delta, reason, time.time())
+    )
+    return (await balances(conn, [user_id]))[user_id]
+
+async def apply_credits(conn, credits: List[Tuple[str, int]], reason: Optional[str] = None) -> Dict[str, int]:
+    """Abona varios créditos positivos en la transacción abierta. Devuelve los saldos resultantes."""
+    totals: Dict[str, int] = {}
+    for user_id, delta in credits:
+        if delta <= 0:
+            logger.warning(f"⚠️ Crédito no positivo ignorado para {user_id}: {delta}")
+            continue
+        totals[user_id] = totals.get(user_id, 0) + delta
+    if not totals:
+        return {}
+
+    now = time.time()
+    await _ensure_users(conn, list(totals))
+    await conn.executemany(
+        "UPDATE users SET coins = coins + ? WHERE user_id = ?",
+        [(delta, user_id) for user_id, delta in totals.items()]
+    )
+    await conn.executemany(
+        "INSERT INTO coin_ledger (user_id, delta, reason, created_at) VALUES (?, ?, ?, ?)",
+        [(user_id, delta, reason, now) for user_id, delta in totals.items()]
+    )
+    return await balances(conn, list(totals))
+
+async def compact(conn, older_than: float) -> int:
+    """Funde los movimientos anteriores a `older_than` (epoch) en uno por usuario.
+
+    La suma por usuario se conserva, así que el libro sigue cuadrando con users.coins.
+    Los usuarios con un solo movimiento en la ventana (p. ej. el resumen de una pasada
+    anterior) no se tocan, así que repetir la compactación no reescribe nada.
+    Devuelve cuántos movimientos se eliminaron.
+    """
+    async with conn.execute("SELECT MAX(id) FROM coin_ledger WHERE created_at < ?", (older_than,)) as cursor:
+        max_id = (await cursor.fetchone())[0]
+    if max_id is None:
+        return 0
+    window = "FROM coin_ledger WHERE id <= ? AND created_at < ? GROUP BY user_id HAVING COUNT(*) > 1"
+    await conn.execute(f"""
+        INSERT INTO coin_ledger (user_id, delta, reason, created_at)
+        SELECT user_id, SUM(delta), ?, MAX(created_at) {window}
+    """, (COMPACTED_REASON, max_id, older_than))
+    cursor = await conn.execute(
+        f"DELETE FROM coin_ledger WHERE id <= ? AND created_at < ? AND user_id IN (SELECT user_id {window})",
+        (max_id, older_than, max_id, older_than)
+    )
+    return cursor.rowcount
@@ -43,16 +43,25 @@ PET_ELEMENTS = {
     "universal": {"emoji": "🌈", "color": 0xFF00FF, "weakness": None, "strength": None}
 }
 
+# "effect" es el texto que se muestra; "action" es el efecto tipado que compila utils/item_engine.py
 PET_SHOP_ITEMS = {
-    "Poción de Energía": {"cost": 50, "emoji": "⚗️", "effect": "Restaura 50 de energía", "type": "consumable"},
-    "Juguete Mágico": {"cost": 30, "emoji": "🧸", "effect": "Aumenta felicidad en 20", "type": "consumable"},
-    "Medicina Especial": {"cost": 60, "emoji": "💊", "effect": "Restaura 50 de salud", "type": "consumable"},
-    "Impulso de XP": {"cost": 80, "emoji": "📈", "effect": "Aumenta experiencia en 100", "type": "consumable"},
-    "Moneda Dorada": {"cost": 100, "emoji": "💰", "effect": "Otorga 50 monedas", "type": "consumable"}
+    "Poción de Energía": {"cost": 50, "emoji": "⚗️", "effect": "Restaura 50 de energía", "type": "consumable",
+                          "action": {"kind": "stat", "stat": "energía", "amount": 50, "cap": "max_energía"}},
+    "Juguete Mágico": {"cost": 30, "emoji": "🧸", "effect": "Aumenta felicidad en 20", "type": "consumable",
+                       "action": {"kind": "stat", "stat": "felicidad", "amount": 20, "cap": 100}},
+    "Medicina Especial": {"cost": 60, "emoji": "💊", "effect": "Restaura 50 de salud", "type": "consumable",
+                          "action": {"kind": "stat", "stat": "salud", "amount": 50, "cap": "max_salud"}},
+    "Impulso de XP": {"cost": 80, "emoji": "📈", "effect": "Aumenta experiencia en 100", "type": "consumable",
+                      "action": {"kind": "stat", "stat": "experiencia", "amount": 100}},
+    "Moneda Dorada": {"cost": 100, "emoji": "💰", "effect": "Otorga 50 monedas", "type": "consumable",
+                      "action": {"kind": "coins", "amount": 50}}
 }
 
 RARE_ITEMS = {
-    "Caja Misteriosa": {"cost": 200, "emoji": "🎁", "effect": "Otorga una mascota rara aleatoria", "type": "special"},
-    "Piedra Elemental": {"cost": 150, "emoji": "💎", "effect": "Cambia el elemento de la mascota", "type": "special"},
-    "Ticket Raro": {"cost": 120, "emoji": "🎟️", "effect": "Aumenta la probabilidad de obtener una mascota rara", "type": "special"}
+    "Caja Misteriosa": {"cost": 200, "emoji": "🎁", "effect": "Otorga una mascota rara aleatoria", "type": "special",
+                        "action": {"kind": "spawn_pet", "classes": ["Raro", "Épico"]}},
+    "Piedra Elemental": {"cost": 150, "emoji": "💎", "effect": "Cambia el elemento de la mascota", "type": "special",
+                         "action": {"kind": "reroll", "field": "elemento"}},
+    "Ticket Raro": {"cost": 120, "emoji": "🎟️", "effect": "Aumenta la probabilidad de obtener una mascota rara", "type": "special",
+                    "action": {"kind": "rare_ticket", "hours": 1}}
 }
\ No newline at end of file
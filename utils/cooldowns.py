@@ -0,0 +1,187 @@
+import asyncio
+import heapq
+import time
+from typing import Dict, Any, List, Optional, Tuple
+import logging
+from config.database_config import db_config
+
+logger = logging.getLogger(__name__)
+
+MAX_ENTRIES = db_config.COOLDOWN_MAX_ENTRIES  # Tope duro de cooldowns vivos en memoria
+
+# Tabla de persistencia (migración v4); solo se usa con COOLDOWN_PERSIST
+COOLDOWN_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS cooldowns (key TEXT PRIMARY KEY, expires_at REAL NOT NULL)",
+]
+
+class CooldownManager:
+    """Cooldowns con caducidad compartidos por todos los cogs.
+
+    Cada clave ("item:123:Fluffy:Poción", "emote.action:123") guarda en un dict el instante
+    (epoch) en que caduca, así que comprobar es O(1). Un montículo mínimo ordena las
+    caducidades: las vencidas se retiran de su cima al insertar, sin barridos periódicos.
+    Al volver a fijar una clave su entrada anterior queda obsoleta en el montículo y se
+    descarta al salir; si las obsoletas crecen demasiado se reconstruye.
+
+    `max_entries` es un tope duro: si se alcanza con todo vigente se desalojan las claves
+    que antes iban a caducar, que son las que menos protegen.
+    """
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, clock=time.time):
+        self.max_entries = max(1, max_entries)
+        self.clock = clock
+        self.expiry: Dict[str, float] = {}
+        self.heap: List[Tuple[float, str]] = []
+        self.dirty = False
+        self.task = None
+        self.pool = None
+        self.stats = {"hits": 0, "blocked": 0, "expired": 0, "evicted": 0, "saved": 0, "loaded": 0}
+
+    def remaining(self, key: str) -> float:
+        """Segundos que le quedan a `key` (0 si no está en cooldown)."""
+        expires_at = self.expiry.get(key)
+        if expires_at is None:
+            return 0.0
+        left = expires_at - self.clock()
+        if left <= 0:
+            del self.expiry[key]  # Su entrada del montículo se descarta al salir
+            self.stats["expired"] += 1
+            return 0.0
+        return left
+
+    def hit(self, key: str, seconds: float) -> float:
+        """Comprueba y fija en un paso: 0 si estaba libre (y arranca el cooldown), o los segundos restantes."""
+        left = self.remaining(key)
+        if left:
+            self.stats["blocked"] += 1
+            return left
+        self.stats["hits"] += 1
+        self.set(key, seconds)
+        return 0.0
+
+    def set(self, key: str, seconds: Optional[float] = None, until: Optional[float] = None):
+        """Fija `key` durante `seconds` o hasta el epoch `until` (sustituye el valor anterior)."""
+        now = self.clock()
+        expires_at = until if until is not None else now + (seconds or 0)
+        if expires_at <= now:
+            self.reset(key)
+            return
+        self.expiry[key] = expires_at
+        heapq.heappush(self.heap, (expires_at, key))
+        self.dirty = True
+        self._expire(now)
+        while len(self.expiry) > self.max_entries:
+            self._evict()
+        if len(self.heap) > 2 * len(self.expiry) + 1024:
+            self._compact()
+
+    def reset(self, key: str):
+        if self.expiry.pop(key, None) is not None:
+            self.dirty = True
+
+    def _pop(self) -> Optional[Tuple[float, str]]:
+        """Saca la cima vigente del montículo (descartando entradas obsoletas)."""
+        while self.heap:
+            expires_at, key = heapq.heappop(self.heap)
+            if self.expiry.get(key) == expires_at:
+                return expires_at, key
+        return None
+
+    def _expire(self, now: float) -> int:
+        """Retira las claves vencidas de la cima del montículo."""
+        removed = 0
+        while self.heap and self.heap[0][0] <= now:
+            expires_at, key = heapq.heappop(self.heap)
+            if self.expiry.get(key) == expires_at:
+                del self.expiry[key]
+                removed += 1
+        self.stats["expired"] += removed
+        return removed
+
+    def _evict(self):
+        entry = self._pop()
+        if entry is not None:
+            del self.expiry[entry[1]]
+            self.stats["evicted"] += 1
+
+    def _compact(self):
+        self.heap = [(expires_at, key) for key, expires_at in self.expiry.items()]
+        heapq.heapify(self.heap)
+
+    def clear(self):
+        self.expiry.clear()
+        self.heap.clear()
+        self.dirty = True
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"active": len(self.expiry), "heap": len(self.heap), "max_entries": self.max_entries, **self.stats}
+
+    async def load(self, pool):
+        """Restaura los cooldowns vigentes guardados en SQLite."""
+        now = self.clock()
+        async with pool.reader("cooldowns.load") as conn:
+            async with conn.execute("SELECT key, expires_at FROM cooldowns WHERE expires_at > ?", (now,)) as cursor:
+                rows = await cursor.fetchall()
+        for key, expires_at in rows:
+            self.set(key, until=expires_at)
+        self.dirty = False
+        self.stats["loaded"] += len(rows)
+        logger.info(f"✅ {len(rows)} cooldowns restaurados")
+
+    async def save(self, pool) -> int:
+        """Sustituye la tabla por los cooldowns vigentes. Devuelve las filas guardadas."""
+        self._expire(self.clock())
+        rows = list(self.expiry.items())
+        self.dirty = False
+        async with pool.transaction("cooldowns.save") as conn:
+            await conn.execute("DELETE FROM cooldowns")
+            await conn.executemany("INSERT INTO cooldowns (key, expires_at) VALUES (?, ?)", rows)
+        self.stats["saved"] += len(rows)
+        return len(rows)
+
+    async def start(self, pool, interval: float):
+        """Carga lo guardado y guarda periódicamente (solo si hubo cambios) mientras el bot corre."""
+        self.pool = pool
+        try:
+            await self.load(pool)
+        except Exception as e:
+            logger.error(f"❌ Error restaurando cooldowns: {e}")
+        if self.task is None and interval > 0:
+            self.task = asyncio.create_task(self._loop(interval))
+
+    async def stop(self):
+        """Detiene el bucle y hace el último guardado."""
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        if self.pool is not None:
+            try:
+                await self.save(self.pool)
+            except Exception as e:
+                logger.error(f"❌ Error guardando cooldowns: {e}")
+            self.pool = None
+
+    async def _loop(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            if self.dirty:
+                try:
+                    await self.save(self.pool)
+                except Exception as e:
+                    self.dirty = True
+                    logger.error(f"❌ Error guardando cooldowns: {e}")
+
+# Instancia compartida: la base de datos la persiste y los cogs la consultan directamente
+cooldowns = CooldownManager()
+
+async def check_cooldown(interaction, bucket: str, seconds: float) -> bool:
+    """True si el usuario puede usar el comando; si no, responde en efímero con la espera."""
+    left = cooldowns.hit(f"{bucket}:{interaction.user.id}", seconds)
+    if left:
+        await interaction.response.send_message(f"⏰ Este comando está en enfriamiento. Intenta de nuevo en {left:.1f}s.", ephemeral=True)
+        return False
+    return True
@@ -1,32 +1,212 @@
 import json
 import os
+import time
+import copy
+import hashlib
 import asyncio
-import random
+import zlib
 from datetime import datetime, timedelta
-import aiosqlite
 from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo.errors import ConnectionFailure
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Set
 import logging
+from contextlib import asynccontextmanager
+from utils.sqlite_pool import SQLitePool, shard_path
+from utils.query_stats import QueryRegistry
+from utils import mongo_outbox
+from utils.mongo_outbox import MongoReplicator, OUTBOX_TABLE_SQL, OUTBOX_COLUMNS, OUTBOX_DEAD_TABLE_SQL, OUTBOX_DEAD_COLUMNS
+from utils.pet_decay import materialize_pet, ANCHOR_KEY
+from utils import pet_schema
+from utils import codec as document_codec
+from utils import coin_ledger
+from utils import guild_activity
+from utils.guild_activity import GuildActivity
+from utils.entity_cache import EntityCache
+from utils.sqlite_backup import BackupService
+from utils.storage_backends import create_backend, STORAGE_STRATEGIES
+from utils import retention
+from utils.mission_counters import MissionCounters, MISSION_TABLE_SQL, MISSION_COLUMNS, MISSION_INDEXES
+from config.database_config import db_config
+from utils.unit_of_work import UnitOfWork
+from utils import item_engine
+from utils.striped_locks import StripedLocks
+from utils import cooldowns as cooldown_service
 
 # Configuración de logging
 logger = logging.getLogger("utils.database")
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
-class DatabaseConfig:
-    def __init__(self):
-        self.MONGO_URI = os.getenv("MONGO_URI", "mongodb://127.0.0.1:27017")
-        self.MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "beethoven_bot")
-        self.SQLITE_PATH = os.getenv("SQLITE_PATH", "./data/beethoven_bot.db")
-        os.makedirs(os.path.dirname(self.SQLITE_PATH), exist_ok=True)
-        os.makedirs("./data/backup", exist_ok=True)
-
-db_config = DatabaseConfig()
+db_config.ensure_directories()
+
+BULK_CHUNK_SIZE = 500  # Máximo de parámetros por IN (...) en las cargas masivas
+
+def _chunks(ids: List[str], size: int = BULK_CHUNK_SIZE):
+    for i in range(0, len(ids), size):
+        yield ids[i:i + size]
+
+# Recompensas registradas con cada logro (se replican a MongoDB con el desbloqueo)
+ACHIEVEMENT_REWARDS = {
+    "primer_mascota": {"coins": 50, "xp": 100},
+    "coleccionista_novato": {"coins": 100, "xp": 200},
+    "primer_raro": {"coins": 80, "xp": 150},
+    "explorador_items": {"coins": 60, "xp": 120}
+}
+
+# Tablas con clave user_id que se reparten entre shards. Todo lo que escribe una unidad de trabajo
+# (monedas, ledger, logros, mascotas, inventario global y misiones) vive en el mismo fichero
+SHARDED_TABLES = ("users", "coin_ledger", "achievements", "afk_users", "pets", "pet_inventory", "pet_skills",
+                  "user_inventory", "mission_progress")
+
+def shard_of(user_id, shard_count: int) -> int:
+    """Shard de un usuario: CRC32 de su id, estable entre procesos (a diferencia de hash())."""
+    return zlib.crc32(str(user_id).encode()) % shard_count
+
+# Tablas SQLite: la migración v1 las crea o reconstruye si les faltan columnas
+SQLITE_TABLES = {
+    "achievements": {
+        "sql": """
+            CREATE TABLE IF NOT EXISTS achievements (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT NOT NULL,
+                achievement_name TEXT NOT NULL,
+                unlocked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE(user_id, achievement_name)
+            )
+        """,
+        "columns": ["id", "user_id", "achievement_name", "unlocked_at"]
+    },
+    "users": {
+        "sql": """
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT UNIQUE NOT NULL,
+                username TEXT,
+                coins INTEGER DEFAULT 0,
+                last_login TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """,
+        "columns": ["id", "user_id", "username", "coins", "last_login"]
+    },
+    "pets": {
+        "sql": pet_schema.PETS_TABLE_SQL,
+        "columns": pet_schema.PETS_TABLE_COLUMNS
+    },
+    "pet_inventory": {
+        "sql": pet_schema.PET_INVENTORY_SQL,
+        "columns": pet_schema.PET_INVENTORY_COLUMNS
+    },
+    "pet_skills": {
+        "sql": pet_schema.PET_SKILLS_SQL,
+        "columns": pet_schema.PET_SKILLS_COLUMNS
+    },
+    "user_inventory": {
+        "sql": pet_schema.USER_INVENTORY_SQL,
+        "columns": pet_schema.USER_INVENTORY_COLUMNS
+    },
+    "afk_users": {
+        "sql": """
+            CREATE TABLE IF NOT EXISTS afk_users (
+                user_id TEXT PRIMARY KEY,
+                reason TEXT,
+                afk_since TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """,
+        "columns": ["user_id", "reason", "afk_since"]
+    },
+    "blacklist": {
+        "sql": """
+            CREATE TABLE IF NOT EXISTS blacklist (
+                user_id TEXT PRIMARY KEY,
+                reason TEXT,
+                banned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """,
+        "columns": ["user_id", "reason", "banned_at"]
+    },
+    "guilds": {
+        "sql": """
+            CREATE TABLE IF NOT EXISTS guilds (
+                guild_id TEXT PRIMARY KEY,
+                guild_data TEXT NOT NULL,
+                bank INTEGER NOT NULL DEFAULT 0,
+                xp INTEGER NOT NULL DEFAULT 0,
+                level INTEGER NOT NULL DEFAULT 1,
+                last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """,
+        "columns": ["guild_id", "guild_data", "bank", "xp", "level", "last_updated"]
+    },
+    "mongo_outbox": {
+        "sql": OUTBOX_TABLE_SQL,
+        "columns": OUTBOX_COLUMNS
+    },
+    "mongo_outbox_dead": {
+        "sql": OUTBOX_DEAD_TABLE_SQL,
+        "columns": OUTBOX_DEAD_COLUMNS
+    },
+    "coin_ledger": {
+        "sql": coin_ledger.LEDGER_TABLE_SQL,
+        "columns": coin_ledger.LEDGER_COLUMNS
+    },
+    "mission_progress": {
+        "sql": MISSION_TABLE_SQL,
+        "columns": MISSION_COLUMNS
+    }
+}
 
 class DatabaseManager:
-    def __init__(self, sqlite_path: str):
+    def __init__(self, sqlite_path: str, shards: Optional[int] = None, queries: QueryRegistry = None):
         self.sqlite_path = sqlite_path
         self.sqlite_conn = None
+        self.queries = queries or QueryRegistry()
+        self.pool = SQLitePool(sqlite_path, db_config.SQLITE_READERS, registry=self.queries)
+        self.codec = document_codec.get_codec(db_config.DOCUMENT_CODEC)
+        self.guild_codec = document_codec.get_guild_codec(
+            db_config.DOCUMENT_CODEC, db_config.GUILD_LARGE_CODEC, db_config.GUILD_LARGE_THRESHOLD
+        )
+        # Modo shards: las tablas de SHARDED_TABLES viven en K ficheros, cada uno con su escritor
+        shard_count = db_config.SQLITE_SHARDS if shards is None else shards
+        self.shards: List["DatabaseManager"] = [
+            DatabaseManager(shard_path(sqlite_path, index), shards=0, queries=self.queries)
+            for index in range(shard_count)
+        ] if shard_count > 1 else []
+
+    @property
+    def sharded(self) -> bool:
+        return bool(self.shards)
+
+    def pool_for(self, user_id) -> SQLitePool:
+        """Pool del fichero que guarda las tablas por usuario de `user_id`."""
+        if not self.shards:
+            return self.pool
+        return self.shards[shard_of(user_id, len(self.shards))].pool
+
+    def user_pools(self) -> List[SQLitePool]:
+        """Pools con tablas por usuario (los shards, o el principal sin shards)."""
+        return [shard.pool for shard in self.shards] or [self.pool]
+
+    def all_pools(self) -> List[SQLitePool]:
+        return [self.pool] + [shard.pool for shard in self.shards]
+
+    def database_paths(self) -> List[str]:
+        return [self.sqlite_path] + [shard.sqlite_path for shard in self.shards]
+
+    def group_by_pool(self, user_ids: List[str]) -> List[tuple]:
+        """Agrupa ids por pool: [(pool, [ids])], conservando el orden dentro de cada grupo."""
+        groups: Dict[int, tuple] = {}
+        for user_id in user_ids:
+            pool = self.pool_for(user_id)
+            groups.setdefault(id(pool), (pool, []))[1].append(user_id)
+        return list(groups.values())
+
+    def encode_document(self, doc: Dict[str, Any]):
+        """Serializa un guild_data con el codec de gremios (JSON salvo opt-in para los grandes)."""
+        return self.guild_codec.encode(doc)
+
+    @staticmethod
+    def decode_document(raw) -> Dict[str, Any]:
+        """Lee un documento guardado; las filas JSON antiguas se leen tal cual y se migran al reescribirse."""
+        return document_codec.decode(raw)
 
     async def check_table_structure(self, table_name: str, expected_columns: List[str]) -> bool:
         """Verifica si la tabla tiene las columnas esperadas."""
@@ -83,161 +263,382 @@ class DatabaseManager:
             logger.error(f"❌ Error obteniendo columnas comunes: {e}")
             return []
 
-    async def init_db(self):
-        """Inicializa la base de datos SQLite y migra tablas si es necesario."""
-        try:
-            self.sqlite_conn = await aiosqlite.connect(self.sqlite_path, isolation_level=None)  # Autocommit
-            self.sqlite_conn.row_factory = aiosqlite.Row  # Filas como diccionarios
-            async with self.sqlite_conn.cursor() as cursor:
-                # Definir estructuras de tablas
-                tables = {
-                    "achievements": {
-                        "sql": """
-                            CREATE TABLE IF NOT EXISTS achievements (
-                                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                                user_id TEXT NOT NULL,
-                                achievement_name TEXT NOT NULL,
-                                unlocked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                                UNIQUE(user_id, achievement_name)
-                            )
-                        """,
-                        "columns": ["id", "user_id", "achievement_name", "unlocked_at"]
-                    },
-                    "users": {
-                        "sql": """
-                            CREATE TABLE IF NOT EXISTS users (
-                                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                                user_id TEXT UNIQUE NOT NULL,
-                                username TEXT,
-                                coins INTEGER DEFAULT 0,
-                                last_login TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                            )
-                        """,
-                        "columns": ["id", "user_id", "username", "coins", "last_login"]
-                    },
-                    "pets": {
-                        "sql": """
-                            CREATE TABLE IF NOT EXISTS pets (
-                                user_id TEXT NOT NULL,
-                                pet_name TEXT NOT NULL,
-                                pet_data TEXT NOT NULL,
-                                PRIMARY KEY (user_id, pet_name)
-                            )
-                        """,
-                        "columns": ["user_id", "pet_name", "pet_data"]
-                    },
-                    "afk_users": {
-                        "sql": """
-                            CREATE TABLE IF NOT EXISTS afk_users (
-                                user_id TEXT PRIMARY KEY,
-                                reason TEXT,
-                                afk_since TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                            )
-                        """,
-                        "columns": ["user_id", "reason", "afk_since"]
-                    },
-                    "blacklist": {
-                        "sql": """
-                            CREATE TABLE IF NOT EXISTS blacklist (
-                                user_id TEXT PRIMARY KEY,
-                                reason TEXT,
-                                banned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                            )
-                        """,
-                        "columns": ["user_id", "reason", "banned_at"]
-                    },
-                    "guilds": {
-                        "sql": """
-                            CREATE TABLE IF NOT EXISTS guilds (
-                                guild_id TEXT PRIMARY KEY,
-                                guild_data TEXT NOT NULL,
-                                last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                            )
-                        """,
-                        "columns": ["guild_id", "guild_data", "last_updated"]
-                    }
-                }
+    def schema_migrations(self):
+        """Migraciones ordenadas (versión, descripción, corrutina). Las nuevas se añaden al final."""
+        return [
+            (1, "tablas base, índices y backfill de columnas", self._migrate_base_schema),
+            (2, "índices de fecha para la retención", self._migrate_retention_indexes),
+            (3, "inventario global por usuario", self._migrate_user_inventory),
+            (4, "tabla de cooldowns persistentes", self._migrate_cooldowns),
+        ]
 
-                # Migrar o crear cada tabla
-                for table_name, table_info in tables.items():
-                    await self.migrate_table(table_name, table_info["sql"], table_info["columns"])
+    async def schema_version(self) -> int:
+        async with self.sqlite_conn.execute("PRAGMA user_version") as cursor:
+            return (await cursor.fetchone())[0]
 
-                # Crear índices
-                for table_name, table_info in tables.items():
-                    if "user_id" in table_info["columns"]:
-                        await cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table_name}_user_id ON {table_name} (user_id)")
-                    if table_name == "guilds":
-                        await cursor.execute("CREATE INDEX IF NOT EXISTS idx_guilds_guild_id ON guilds (guild_id)")
-            await self.sqlite_conn.commit()
-            logger.info("✅ Tablas SQLite creadas/migradas y optimizadas")
+    async def init_db(self):
+        """Inicializa el fichero principal y, en modo shards, cada shard y el reparto de filas existentes."""
+        await self._init_file()
+        for shard in self.shards:
+            await shard.init_db()
+        if self.shards:
+            await self._drain_to_shards()
+            logger.info(f"✅ SQLite en modo shards: {len(self.shards)} ficheros para {', '.join(SHARDED_TABLES)}")
+
+    async def _init_file(self):
+        """Inicializa SQLite y aplica solo las migraciones pendientes según PRAGMA user_version."""
+        try:
+            await self.pool.open()
+            self.sqlite_conn = self.pool.writer_conn  # Conexión de escritura para migraciones y mantenimiento
+            migrations = self.schema_migrations()
+            target = migrations[-1][0]
+            current = await self.schema_version()
+            if current == target:
+                logger.info(f"✅ Esquema SQLite al día (v{current}), sin migraciones")
+                return
+            if current > target:
+                logger.warning(f"⚠️ Esquema SQLite v{current} más nuevo que el código (v{target}); no se migra")
+                return
+
+            for version, description, migrate in migrations:
+                if version <= current:
+                    continue
+                started = time.perf_counter()
+                await migrate()
+                await self.sqlite_conn.execute(f"PRAGMA user_version = {int(version)}")
+                logger.info(f"✅ Migración SQLite v{version} ({description}) en {(time.perf_counter() - started) * 1000:.1f}ms")
+            logger.info(f"✅ Esquema SQLite migrado de v{current} a v{target}")
         except Exception as e:
             logger.error(f"❌ Error inicializando SQLite: {e}")
             raise
 
-    async def cleanup_old_cache(self, days: int = 30):
-        """Elimina datos antiguos para mantener la base ligera."""
+    async def _migrate_base_schema(self):
+        """v1: crea o migra todas las tablas, crea índices y pasa campos de los blobs a columnas.
+
+        Idempotente: es también el camino de las bases anteriores a user_version.
+        """
+        for table_name, table_info in SQLITE_TABLES.items():
+            await self.migrate_table(table_name, table_info["sql"], table_info["columns"])
+
+        async with self.sqlite_conn.cursor() as cursor:
+            for table_name, table_info in SQLITE_TABLES.items():
+                if "user_id" in table_info["columns"]:
+                    await cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table_name}_user_id ON {table_name} (user_id)")
+                if table_name == "guilds":
+                    await cursor.execute("CREATE INDEX IF NOT EXISTS idx_guilds_guild_id ON guilds (guild_id)")
+            for index_sql in pet_schema.PET_INDEXES + coin_ledger.LEDGER_INDEXES + MISSION_INDEXES:
+                await cursor.execute(index_sql)
+        await self.sqlite_conn.commit()
+
+        # Pasar los campos calientes del blob JSON a columnas tipadas
+        await self.sqlite_conn.execute("BEGIN TRANSACTION")
         try:
-            cutoff_date = datetime.now() - timedelta(days=days)
-            async with self.sqlite_conn.cursor() as cursor:
-                await cursor.execute(
-                    "DELETE FROM achievements WHERE unlocked_at < ?",
-                    (cutoff_date,)
-                )
-                await cursor.execute(
-                    "DELETE FROM afk_users WHERE afk_since < ?",
-                    (cutoff_date,)
-                )
-                await cursor.execute(
-                    "DELETE FROM blacklist WHERE banned_at < ?",
-                    (cutoff_date,)
-                )
-            await self.sqlite_conn.commit()
-            logger.info(f"🧹 Cache antiguo eliminado (antes de {days} días)")
+            await pet_schema.backfill(self.sqlite_conn)
+            await guild_activity.backfill(self.sqlite_conn, self.guild_codec)
+        except Exception:
+            await self.sqlite_conn.rollback()
+            raise
+        await self.sqlite_conn.commit()
+
+    async def _migrate_retention_indexes(self):
+        """v2: índices sobre las columnas de fecha que usa la retención."""
+        for index_sql in retention.RETENTION_INDEXES:
+            await self.sqlite_conn.execute(index_sql)
+
+    async def _migrate_user_inventory(self):
+        """v3: tabla del inventario global (items comprados sin mascota), antes solo en memoria."""
+        await self.migrate_table("user_inventory", pet_schema.USER_INVENTORY_SQL, pet_schema.USER_INVENTORY_COLUMNS)
+
+    async def _migrate_cooldowns(self):
+        """v4: tabla donde se guardan los cooldowns vigentes entre reinicios."""
+        for statement in cooldown_service.COOLDOWN_SCHEMA:
+            await self.sqlite_conn.execute(statement)
+
+    async def _drain_to_shards(self):
+        """Mueve a su shard las filas por usuario que sigan en el fichero principal.
+
+        Ocurre al activar SQLITE_SHARDS sobre una base existente (o al cambiar K desde 1).
+        Cada shard se rellena en su propia transacción con INSERT OR IGNORE y después se
+        borran sus filas del principal; si el proceso se corta, el siguiente arranque repite
+        el paso sin duplicar nada.
+        """
+        pending = []
+        for table in SHARDED_TABLES:
+            async with self.sqlite_conn.execute(f"SELECT COUNT(*) FROM {table}") as cursor:
+                if (await cursor.fetchone())[0]:
+                    pending.append(table)
+        if not pending:
+            return
+
+        started = time.perf_counter()
+        shard_count = len(self.shards)
+        await self.sqlite_conn.create_function("shard_of", 1, lambda user_id: shard_of(user_id, shard_count), deterministic=True)
+        moved = 0
+        for index, shard in enumerate(self.shards):
+            await self.sqlite_conn.execute("ATTACH DATABASE ? AS shard", (shard.sqlite_path,))
+            try:
+                await self.sqlite_conn.execute("BEGIN IMMEDIATE")
+                try:
+                    for table in pending:
+                        async with self.sqlite_conn.execute(f"PRAGMA main.table_info({table})") as cursor:
+                            columns = ", ".join(row["name"] for row in await cursor.fetchall())
+                        cursor = await self.sqlite_conn.execute(
+                            f"INSERT OR IGNORE INTO shard.{table} ({columns}) SELECT {columns} FROM main.{table} WHERE shard_of(user_id) = ?",
+                            (index,)
+                        )
+                        moved += max(cursor.rowcount, 0)
+                        await self.sqlite_conn.execute(f"DELETE FROM main.{table} WHERE shard_of(user_id) = ?", (index,))
+                except Exception:
+                    await self.sqlite_conn.rollback()
+                    raise
+                await self.sqlite_conn.commit()
+            finally:
+                await self.sqlite_conn.execute("DETACH DATABASE shard")
+        logger.info(f"✅ {moved} filas por usuario repartidas en {shard_count} shards en {(time.perf_counter() - started) * 1000:.1f}ms")
+
+    async def cleanup_old_cache(self, days: int = 30) -> Dict[str, int]:
+        """Elimina datos antiguos por bloques según las políticas de retención. Devuelve filas por tabla."""
+        try:
+            counts: Dict[str, int] = {}
+            for pool in self.all_pools():
+                for table, removed in (await retention.run_retention(pool, days)).items():
+                    counts[table] = counts.get(table, 0) + removed
+            logger.info(f"🧹 Cache antiguo eliminado (antes de {days} días): {sum(counts.values())} filas")
+            return counts
         except Exception as e:
             logger.error(f"❌ Error limpiando cache: {e}")
+            return {}
 
     async def close(self):
-        """Cierra la conexión a SQLite."""
+        """Cierra la conexión a SQLite (y la de cada shard)."""
+        for shard in self.shards:
+            await shard.close()
         if self.sqlite_conn:
-            await self.sqlite_conn.close()
+            await self.pool.close()
+            self.sqlite_conn = None
             logger.info("✅ Conexión SQLite cerrada")
 
+class PetWriteBehind:
+    """Capa write-behind para los documentos de mascotas de cada usuario.
+
+    Las escrituras se marcan como sucias en memoria y se fusionan por usuario;
+    un bucle las vuelca periódicamente (y al apagar) en una sola transacción.
+    """
+
+    def __init__(self, database: "HybridDatabase", flush_interval: float = 2.0):
+        self.database = database
+        self.flush_interval = flush_interval
+        self.dirty: Dict[str, Dict[str, Any]] = {}
+        self.inflight: Dict[str, Dict[str, Any]] = {}  # Lote que se está volcando
+        self.flush_task = None
+        self.flush_lock = asyncio.Lock()
+        self.fingerprints: Dict[str, Dict[str, str]] = {}  # user_id -> {pet_name: hash del último JSON persistido}
+        self.stats = {
+            "writes": 0, "merged": 0, "flushes": 0, "commits": 0,
+            "rows_upserted": 0, "rows_deleted": 0, "rows_skipped": 0, "bytes_written": 0
+        }
+
+    def mark_dirty(self, user_id: str, user_data: Dict[str, Any]):
+        """Guarda una copia del documento; escrituras repetidas se fusionan."""
+        if user_id in self.dirty:
+            self.stats["merged"] += 1
+        self.dirty[user_id] = copy.deepcopy(user_data)
+        self.stats["writes"] += 1
+
+    @staticmethod
+    def fingerprint(pet: Dict[str, Any]) -> str:
+        """Huella del documento persistido de una mascota."""
+        return hashlib.blake2b(pet_schema.canonical_json(pet).encode("utf-8"), digest_size=16).hexdigest()
+
+    def remember(self, user_id: str, persisted: Dict[str, Dict[str, Any]]):
+        """Registra las mascotas persistidas de un usuario leídas desde SQLite."""
+        if user_id not in self.dirty and user_id not in self.inflight:
+            self.fingerprints[user_id] = {name: self.fingerprint(pet) for name, pet in persisted.items()}
+
+    async def _load_fingerprints(self, user_ids: List[str]):
+        """Calcula huellas desde el almacén para usuarios sin huella conocida."""
+        if not user_ids:
+            return
+        for user_id, pets in (await self.database.storage.load_pets(user_ids)).items():
+            self.fingerprints[user_id] = {name: self.fingerprint(pet) for name, pet in pets.items()}
+
+    def _diff(self, batch: Dict[str, Dict[str, Any]]):
+        """Compara el lote con las huellas persistidas: devuelve upserts, borrados y huellas nuevas."""
+        upserts, deletes, new_fingerprints = [], [], {}
+        for user_id, user_data in batch.items():
+            previous = self.fingerprints.get(user_id, {})
+            current = {}
+            for pet_name, pet_data in user_data.get("mascotas", {}).items():
+                current[pet_name] = self.fingerprint(pet_data)
+                if previous.get(pet_name) != current[pet_name]:
+                    upserts.append((user_id, pet_name, pet_data))
+            deletes.extend((user_id, pet_name) for pet_name in previous if pet_name not in current)
+            new_fingerprints[user_id] = current
+        return upserts, deletes, new_fingerprints
+
+    async def write_in(self, conn, user_id: str, user_data: Dict[str, Any]) -> Dict[str, str]:
+        """Escribe el diff de un usuario en una transacción abierta sobre su fichero (unidad de trabajo).
+
+        Llamar con `flush_lock` tomado. Devuelve las huellas nuevas; se registran con
+        `committed` solo si la transacción confirma.
+        """
+        if user_id not in self.fingerprints:
+            persisted = (await pet_schema.load_pets(conn, [user_id]))[user_id]
+            self.fingerprints[user_id] = {name: self.fingerprint(pet) for name, pet in persisted.items()}
+        upserts, deletes, new_fingerprints = self._diff({user_id: user_data})
+        self.stats["bytes_written"] += await self.database.storage.write_pets_in(conn, {user_id: user_data}, upserts, deletes)
+        self.stats["rows_upserted"] += len(upserts)
+        self.stats["rows_deleted"] += len(deletes)
+        return new_fingerprints[user_id]
+
+    def committed(self, user_id: str, fingerprints: Dict[str, str]):
+        """Registra una escritura confirmada fuera del bucle: el documento pendiente queda obsoleto."""
+        self.fingerprints[user_id] = fingerprints
+        self.dirty.pop(user_id, None)
+        self.stats["commits"] += 1
+
+    def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Devuelve una copia del documento pendiente de volcar, si existe."""
+        user_data = self.dirty.get(user_id, self.inflight.get(user_id))
+        return copy.deepcopy(user_data) if user_data is not None else None
+
+    async def start(self):
+        """Inicia el bucle de volcado."""
+        if self.flush_task is None:
+            self.flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Detiene el bucle y vuelca lo pendiente."""
+        if self.flush_task:
+            self.flush_task.cancel()
+            try:
+                await self.flush_task
+            except asyncio.CancelledError:
+                pass
+            self.flush_task = None
+        await self.flush()
+
+    async def _flush_loop(self):
+        """Bucle de volcado periódico."""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"❌ Error en volcado write-behind: {e}")
+
+    async def flush(self) -> int:
+        """Vuelca todos los documentos sucios en una transacción. Devuelve usuarios volcados."""
+        async with self.flush_lock:
+            if not self.dirty:
+                return 0
+            batch, self.dirty = self.dirty, {}
+            self.inflight = batch
+            try:
+                await self._load_fingerprints([user_id for user_id in batch if user_id not in self.fingerprints])
+                upserts, deletes, new_fingerprints = self._diff(batch)
+                bytes_written = await self.database.storage.write_pets(batch, upserts, deletes)
+            except Exception as e:
+                # Reencolar sin pisar escrituras más recientes
+                for user_id, user_data in batch.items():
+                    self.dirty.setdefault(user_id, user_data)
+                    self.fingerprints.pop(user_id, None)
+                self.inflight = {}
+                logger.error(f"❌ Error volcando {len(batch)} usuarios ({self.database.storage.name}): {e}")
+                return 0
+
+            self.fingerprints.update(new_fingerprints)
+            self.inflight = {}
+            self.stats["flushes"] += 1
+            if upserts or deletes:
+                self.stats["commits"] += 1
+            self.stats["rows_upserted"] += len(upserts)
+            self.stats["rows_deleted"] += len(deletes)
+            self.stats["rows_skipped"] += sum(len(fp) for fp in new_fingerprints.values()) - len(upserts)
+            self.stats["bytes_written"] += bytes_written
+
+            logger.debug(f"✅ Write-behind: {len(batch)} usuarios, {len(upserts)} upserts, {len(deletes)} borrados")
+            return len(batch)
+
 class HybridDatabase:
     def __init__(self, bot=None):
         self.bot = bot
         self.mongo_client = None
         self.mongo_db = None
         self.sqlite_manager = DatabaseManager(db_config.SQLITE_PATH)
-        self.locks = {'mongo': asyncio.Lock(), 'sqlite': asyncio.Lock()}
+        self.queries = self.sqlite_manager.queries
+        # Locks por usuario/gremio para lectura-modificación-escritura; las conexiones las protege
+        # cada almacén (pool SQLite con escritor único, pool de conexiones de motor)
+        self.locks = StripedLocks(db_config.LOCK_STRIPES)
         self.initialized = False
-        self.item_cooldowns = {}
-        self.mission_resets = {}
+        self.cooldowns = cooldown_service.cooldowns  # Compartidos con los cogs
+        self.blacklist: Set[int] = set()  # IDs en lista negra: se cargan al iniciar y se mantienen al añadir/quitar
+        self.write_behind = PetWriteBehind(self, db_config.WRITE_BEHIND_INTERVAL)
+        self.guild_activity = GuildActivity(self, db_config.GUILD_ACTIVITY_INTERVAL)
+        self.missions = MissionCounters(self, db_config.MISSION_FLUSH_INTERVAL)
+        self.pet_cache = EntityCache("user_pets", db_config.ENTITY_CACHE_SIZE)
+        self.guild_cache = EntityCache("guilds", db_config.ENTITY_CACHE_SIZE)
+        self.backups = BackupService(
+            db_config.SQLITE_PATH, db_config.BACKUP_DIR, db_config.BACKUP_INTERVAL, db_config.BACKUP_KEEP,
+            extra_paths=self.sqlite_manager.database_paths()[1:]
+        )
+        self.strategy = db_config.STORAGE_STRATEGY
+        self.storage = None
+        self.replicator = None  # Réplica del fichero principal
+        self.replicators: List[MongoReplicator] = []  # Todas, incluida la de cada shard
 
     async def initialize(self):
-        """Inicializa MongoDB y SQLite."""
+        """Inicializa SQLite, MongoDB (según STORAGE_STRATEGY) y el backend de documentos."""
         try:
-            # Inicializar SQLite
+            if self.strategy not in STORAGE_STRATEGIES:
+                raise ValueError(f"STORAGE_STRATEGY desconocida: {self.strategy} (opciones: {', '.join(STORAGE_STRATEGIES)})")
+
+            # Inicializar SQLite (datos relacionales en todas las estrategias)
             await self.sqlite_manager.init_db()
             self.sqlite_conn = self.sqlite_manager.sqlite_conn
-
-            # Inicializar MongoDB
-            try:
-                self.mongo_client = AsyncIOMotorClient(
-                    db_config.MONGO_URI,
-                    maxPoolSize=10,
-                    minPoolSize=2,
-                    serverSelectionTimeoutMS=5000
-                )
-                self.mongo_db = self.mongo_client[db_config.MONGO_DB_NAME]
-                await self.mongo_db.command('ping')
-                logger.info("✅ Conexión MongoDB establecida")
-            except ConnectionFailure as e:
-                logger.warning(f"⚠️ No se pudo conectar a MongoDB: {e}. Usando solo SQLite.")
-                self.mongo_client = None
-                self.mongo_db = None
+            self.pool = self.sqlite_manager.pool
+            await self.load_blacklist()
+
+            # Inicializar MongoDB: réplica opcional en hybrid, almacén obligatorio en mongo_only
+            if self.strategy in ("hybrid", "mongo_only"):
+                try:
+                    self.mongo_client = AsyncIOMotorClient(
+                        db_config.MONGO_URI,
+                        maxPoolSize=10,
+                        minPoolSize=2,
+                        serverSelectionTimeoutMS=5000
+                    )
+                    self.mongo_db = self.mongo_client[db_config.MONGO_DB_NAME]
+                    await self.mongo_db.command('ping')
+                    logger.info("✅ Conexión MongoDB establecida")
+                except ConnectionFailure as e:
+                    if self.strategy == "mongo_only":
+                        raise
+                    logger.warning(f"⚠️ No se pudo conectar a MongoDB: {e}. Usando solo SQLite.")
+                    self.mongo_client = None
+                    self.mongo_db = None
+
+            self.storage = create_backend(self.strategy, self, db_config.SQLALCHEMY_URL)  # Derivada de POSTGRES_URI
+            await self.storage.open()
+            if self.strategy == "hybrid" and self.mongo_db is not None:
+                # Cada fichero tiene su outbox: una réplica por pool
+                self.replicators = [
+                    MongoReplicator(pool, self.mongo_db, max_attempts=db_config.OUTBOX_MAX_ATTEMPTS)
+                    for pool in self.sqlite_manager.all_pools()
+                ]
+                self.replicator = self.replicators[0]
+                for replicator in self.replicators:
+                    await replicator.start()
+
+            await self.write_behind.start()
+            await self.guild_activity.start()
+            await self.missions.start()
+            await self.backups.start()
+            if db_config.COOLDOWN_PERSIST:
+                await self.cooldowns.start(self.pool, db_config.COOLDOWN_SAVE_INTERVAL)
 
             self.initialized = True
-            logger.info("✅ Sistema de base de datos híbrido inicializado")
+            logger.info(f"✅ Sistema de base de datos inicializado (estrategia={self.strategy}, documentos={self.storage.name})")
         except Exception as e:
             logger.error(f"❌ Error inicializando bases de datos: {e}")
             raise
@@ -245,6 +646,15 @@ class HybridDatabase:
     async def close(self):
         """Cierra todas las conexiones."""
         try:
+            await self.backups.stop()
+            await self.cooldowns.stop()
+            await self.guild_activity.stop()
+            await self.missions.stop()
+            await self.write_behind.stop()
+            for replicator in self.replicators:
+                await replicator.stop()
+            if self.storage:
+                await self.storage.close()
             await self.sqlite_manager.close()
             if self.mongo_client:
                 self.mongo_client.close()
@@ -252,85 +662,169 @@ class HybridDatabase:
         except Exception as e:
             logger.error(f"❌ Error cerrando conexiones: {e}")
 
+    def user_lock(self, user_id: str):
+        """`async with db.user_lock(user_id):` serializa la lectura-modificación-escritura de un usuario."""
+        return self.locks.hold(f"user:{user_id}")
+
+    def guild_lock(self, guild_id: str):
+        return self.locks.hold(f"guild:{guild_id}")
+
+    def user_pool(self, user_id: str) -> SQLitePool:
+        """Pool con las tablas por usuario de `user_id` (su shard, o el principal sin shards)."""
+        return self.sqlite_manager.pool_for(user_id)
+
+    @property
+    def mirror_enabled(self) -> bool:
+        """Indica si las escrituras deben replicarse a MongoDB vía outbox."""
+        return self.replicator is not None
+
+    @staticmethod
+    def _materialize(user_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Aplica decaimiento y transiciones de sueño al leer (sin escribir)."""
+        now = datetime.now()
+        user_data["mascotas"] = {name: materialize_pet(pet, now).pet for name, pet in user_data.get("mascotas", {}).items()}
+        return user_data
+
+    def cache_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Estado de las cachés de entidades (tamaño, aciertos, hit ratio)."""
+        return {cache.name: cache.snapshot() for cache in (self.pet_cache, self.guild_cache)}
+
     async def get_user_pets(self, user_id: str) -> Dict[str, Any]:
-        """Obtiene las mascotas de un usuario desde SQLite."""
-        async with self.locks['sqlite']:
-            try:
-                async with self.sqlite_conn.execute(
-                    "SELECT pet_name, pet_data FROM pets WHERE user_id = ?",
-                    (user_id,)
-                ) as cursor:
-                    pets = await cursor.fetchall()
-                    result = {"mascotas": {pet["pet_name"]: json.loads(pet["pet_data"]) for pet in pets}}
-                    return result if pets else {"mascotas": {}, "coins": 0}
-            except Exception as e:
-                logger.error(f"❌ Error obteniendo mascotas para {user_id}: {e}")
-                return {"mascotas": {}, "coins": 0}
+        """Obtiene las mascotas de un usuario (write-behind, caché o almacén) con stats materializados.
+
+        Siempre incluye "coins" con el saldo persistido: la forma no depende de dónde salieron las mascotas.
+        """
+        user_data = await self._read_user_pets(user_id)
+        user_data["coins"] = await self.get_user_coins(user_id)
+        return user_data
+
+    async def _read_user_pets(self, user_id: str) -> Dict[str, Any]:
+        pending = self.write_behind.get(user_id)
+        if pending is not None:
+            return self._materialize(pending)
+        cached = self.pet_cache.get(user_id)
+        if cached is not None:
+            return self._materialize({"mascotas": cached})
+        version = self.pet_cache.version(user_id)
+        try:
+            pets = (await self.storage.load_pets([user_id]))[user_id]
+            self.write_behind.remember(user_id, pets)
+            self.pet_cache.put(user_id, pets, version)
+            return self._materialize({"mascotas": copy.deepcopy(pets)})
+        except Exception as e:
+            logger.error(f"❌ Error obteniendo mascotas para {user_id}: {e}")
+            return {"mascotas": {}}
+
+    async def get_many_user_pets(self, user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Obtiene las mascotas de varios usuarios con una sola lectura por bloques para los que no están en memoria."""
+        user_ids = list(dict.fromkeys(str(user_id) for user_id in user_ids))
+        result: Dict[str, Dict[str, Any]] = {}
+        missing = []
+        for user_id in user_ids:
+            pending = self.write_behind.get(user_id)
+            cached = self.pet_cache.get(user_id) if pending is None else None
+            if pending is not None:
+                result[user_id] = self._materialize(pending)
+            elif cached is not None:
+                result[user_id] = self._materialize({"mascotas": cached})
+            else:
+                missing.append(user_id)
+        if missing:
+            await self._load_many_user_pets(missing, result)
+        balances = await self.get_many_user_coins(user_ids)
+        for user_id, user_data in result.items():
+            user_data["coins"] = balances.get(user_id, 0)
+        return result
+
+    async def _load_many_user_pets(self, missing: List[str], result: Dict[str, Dict[str, Any]]):
+        versions = {user_id: self.pet_cache.version(user_id) for user_id in missing}
+        try:
+            loaded = await self.storage.load_pets(missing)
+        except Exception as e:
+            logger.error(f"❌ Error obteniendo mascotas de {len(missing)} usuarios: {e}")
+            loaded = {}
+        for user_id in missing:
+            pets = loaded.get(user_id)
+            if pets is None:
+                result[user_id] = {"mascotas": {}}
+                continue
+            self.write_behind.remember(user_id, pets)
+            self.pet_cache.put(user_id, pets, versions[user_id])
+            result[user_id] = self._materialize({"mascotas": copy.deepcopy(pets)})
 
     async def save_user_pets(self, user_id: str, user_data: Dict[str, Any]) -> bool:
-        """Guarda las mascotas de un usuario en SQLite y MongoDB."""
+        """Marca las mascotas de un usuario para guardarse en SQLite y MongoDB (write-behind)."""
         try:
             user_data["user_id"] = user_id
             user_data["last_update"] = str(datetime.now())
-
-            # Guardar en MongoDB si está disponible
-            if self.mongo_db is not None:
-                async with self.locks['mongo']:
-                    collection = self.mongo_db.user_pets
-                    await collection.replace_one(
-                        {"user_id": user_id},
-                        user_data,
-                        upsert=True
-                    )
-
-            # Guardar en SQLite con transacción
-            async with self.locks['sqlite']:
-                await self.sqlite_conn.execute("BEGIN TRANSACTION")
-                async with self.sqlite_conn.cursor() as cursor:
-                    await cursor.execute("DELETE FROM pets WHERE user_id = ?", (user_id,))
-                    for pet_name, pet_data in user_data.get("mascotas", {}).items():
-                        await cursor.execute(
-                            "INSERT OR REPLACE INTO pets (user_id, pet_name, pet_data) VALUES (?, ?, ?)",
-                            (user_id, pet_name, json.dumps(pet_data))
-                        )
-                await self.sqlite_conn.commit()
-
-            logger.debug(f"✅ Mascotas de usuario {user_id} guardadas")
+            self.write_behind.mark_dirty(user_id, user_data)
+            self.pet_cache.invalidate(user_id)
+            logger.debug(f"✅ Mascotas de usuario {user_id} encoladas para guardar")
             return True
         except Exception as e:
             logger.error(f"❌ Error guardando mascotas de usuario {user_id}: {e}")
-            await self.sqlite_conn.rollback()
             return False
 
+    async def get_global_inventory(self, user_id: str) -> List[Dict[str, Any]]:
+        """Obtiene el inventario global (items sin mascota) de un usuario desde SQLite.
+
+        Los errores se propagan: una unidad de trabajo que lo leyera vacío lo sobrescribiría al confirmar.
+        """
+        async with self.user_pool(user_id).reader("inventory.get") as conn:
+            return await pet_schema.load_global_inventory(conn, user_id)
+
+    async def cleanup_old_cache(self, days: int = 30) -> Dict[str, int]:
+        """Aplica la retención de datos antiguos en SQLite."""
+        counts = await self.sqlite_manager.cleanup_old_cache(days)
+        if counts.get("blacklist"):
+            await self.load_blacklist()  # La retención también caduca entradas de la lista negra
+        return counts
+
     async def get_user_profile(self, user_id: str) -> Optional[Dict[str, Any]]:
         """Obtiene el perfil de usuario desde MongoDB."""
-        if self.mongo_db is not None:
+        if self.mongo_db is None:
             logger.warning(f"⚠️ MongoDB no disponible para get_user_profile de {user_id}")
             return None
         try:
-            async with self.locks['mongo']:
-                collection = self.mongo_db.user_profiles
-                result = await collection.find_one({"user_id": user_id})
-                if result:
-                    return {
-                        "user_id": result["user_id"],
-                        "username": result.get("username", ""),
-                        "coins": result.get("coins", 0),
-                        "total_xp": result.get("total_xp", 0),
-                        "created_at": result.get("created_at", str(datetime.now())),
-                        "last_active": result.get("last_active", str(datetime.now()))
-                    }
-                return None
+            async with self.queries.track("mongo.user_profiles.find_one") as sample:
+                sample.acquired()
+                result = await self.mongo_db.user_profiles.find_one({"user_id": user_id})
+            if result:
+                return {
+                    "user_id": result["user_id"],
+                    "username": result.get("username", ""),
+                    "coins": result.get("coins", 0),
+                    "total_xp": result.get("total_xp", 0),
+                    "created_at": result.get("created_at", str(datetime.now())),
+                    "last_active": result.get("last_active", str(datetime.now()))
+                }
+            return None
         except Exception as e:
             logger.error(f"❌ Error obteniendo perfil de usuario {user_id}: {e}")
             return None
 
     async def update_user_coins(self, user_id: str, coins: int, username: str = None) -> bool:
-        """Actualiza las monedas del usuario en MongoDB y SQLite."""
+        """Fija el saldo absoluto del usuario (registrando la diferencia en el libro de monedas).
+
+        Para compras y recompensas usa `add_coins`/`credit_many`, que no pisan escrituras concurrentes.
+        """
         try:
-            if self.mongo_db is not None:
-                async with self.locks['mongo']:
-                    collection = self.mongo_db.user_profiles
+            async with self.user_pool(user_id).transaction("users.set_coins") as conn:
+                previous = (await coin_ledger.balances(conn, [user_id])).get(user_id, 0)
+                await conn.execute(
+                    """INSERT INTO users (user_id, username, coins, last_login) VALUES (?, ?, ?, ?)
+                       ON CONFLICT(user_id) DO UPDATE SET
+                           coins = excluded.coins,
+                           username = COALESCE(NULLIF(excluded.username, ''), users.username),
+                           last_login = excluded.last_login""",
+                    (user_id, username or "", coins, datetime.now())
+                )
+                if coins != previous:
+                    await conn.execute(
+                        "INSERT INTO coin_ledger (user_id, delta, reason, created_at) VALUES (?, ?, ?, ?)",
+                        (user_id, coins - previous, "ajuste", datetime.now().timestamp())
+                    )
+                if self.mirror_enabled:
                     update_data = {
                         "coins": coins,
                         "last_active": str(datetime.now())
@@ -338,19 +832,7 @@ class HybridDatabase:
                     if username:
                         update_data["username"] = username
                         update_data["created_at"] = str(datetime.now())
-                    await collection.update_one(
-                        {"user_id": user_id},
-                        {"$set": update_data},
-                        upsert=True
-                    )
-
-            async with self.locks['sqlite']:
-                async with self.sqlite_conn.cursor() as cursor:
-                    await cursor.execute(
-                        "INSERT OR REPLACE INTO users (user_id, username, coins, last_login) VALUES (?, ?, ?, ?)",
-                        (user_id, username or "", coins, datetime.now())
-                    )
-                await self.sqlite_conn.commit()
+                    await mongo_outbox.enqueue(conn, "user_profiles", "update", {"user_id": user_id}, {"$set": update_data})
 
             logger.info(f"✅ Monedas actualizadas para usuario {user_id}: {coins}")
             return True
@@ -358,11 +840,94 @@ class HybridDatabase:
             logger.error(f"❌ Error actualizando monedas de usuario {user_id}: {e}")
             return False
 
+    async def get_user_coins(self, user_id: str) -> int:
+        """Obtiene el saldo de monedas de un usuario desde SQLite."""
+        async with self.user_pool(user_id).reader("users.get_coins") as conn:
+            try:
+                return (await coin_ledger.balances(conn, [user_id])).get(user_id, 0)
+            except Exception as e:
+                logger.error(f"❌ Error obteniendo monedas de {user_id}: {e}")
+                return 0
+
+    async def get_many_user_coins(self, user_ids: List[str]) -> Dict[str, int]:
+        """Obtiene el saldo de varios usuarios con una lectura por bloques en cada shard."""
+        result: Dict[str, int] = {}
+        try:
+            for pool, group in self.sqlite_manager.group_by_pool(user_ids):
+                async with pool.reader("users.get_many_coins") as conn:
+                    for chunk in _chunks(group):
+                        result.update(await coin_ledger.balances(conn, chunk))
+        except Exception as e:
+            logger.error(f"❌ Error obteniendo monedas de {len(user_ids)} usuarios: {e}")
+        return result
+
+    async def add_coins(self, user_id: str, delta: int, reason: str = None) -> Optional[int]:
+        """Suma (o resta) monedas de forma atómica con `coins = coins + ?`.
+
+        Devuelve el nuevo saldo, o None si no hay saldo suficiente o falla la escritura.
+        """
+        try:
+            async with self.user_pool(user_id).transaction("coins.add") as conn:
+                balance = await self._apply_coin_delta(conn, user_id, delta, reason)
+            if balance is None:
+                logger.debug(f"⚠️ Saldo insuficiente para {user_id} (delta {delta})")
+            else:
+                logger.debug(f"✅ Monedas de {user_id}: {delta:+d} -> {balance}")
+            return balance
+        except Exception as e:
+            logger.error(f"❌ Error sumando monedas a {user_id}: {e}")
+            return None
+
+    async def _apply_coin_delta(self, conn, user_id: str, delta: int, reason: str = None) -> Optional[int]:
+        """Aplica un movimiento en la transacción abierta y lo replica. None si el saldo no alcanza."""
+        balance = await coin_ledger.apply_delta(conn, user_id, delta, reason)
+        if balance is not None and self.mirror_enabled:
+            await mongo_outbox.enqueue(
+                conn, "user_profiles", "update", {"user_id": user_id},
+                {"$set": {"coins": balance, "last_active": str(datetime.now())}}
+            )
+        return balance
+
+    async def credit_many(self, credits: List[tuple], reason: str = None) -> bool:
+        """Abona monedas a varios usuarios [(user_id, delta)] en una sola transacción (una por shard)."""
+        try:
+            new_balances = {}
+            for pool, user_ids in self.sqlite_manager.group_by_pool(list(dict.fromkeys(user_id for user_id, _ in credits))):
+                members = set(user_ids)
+                async with pool.transaction("coins.credit_many") as conn:
+                    balances = await coin_ledger.apply_credits(conn, [credit for credit in credits if credit[0] in members], reason)
+                    if balances and self.mirror_enabled:
+                        now = str(datetime.now())
+                        await mongo_outbox.enqueue_many(conn, [
+                            ("user_profiles", "update", {"user_id": user_id}, {"$set": {"coins": balance, "last_active": now}})
+                            for user_id, balance in balances.items()
+                        ])
+                new_balances.update(balances)
+            logger.debug(f"✅ {len(new_balances)} usuarios acreditados ({reason})")
+            return True
+        except Exception as e:
+            logger.error(f"❌ Error acreditando monedas en lote: {e}")
+            return False
+
+    async def compact_coin_ledger(self, days: int = 7) -> int:
+        """Compacta los movimientos del libro de monedas más antiguos que `days` días."""
+        try:
+            removed = 0
+            older_than = (datetime.now() - timedelta(days=days)).timestamp()
+            for pool in self.sqlite_manager.user_pools():
+                async with pool.transaction("coin_ledger.compact") as conn:
+                    removed += await coin_ledger.compact(conn, older_than)
+            logger.info(f"🧹 Libro de monedas compactado ({removed} movimientos fusionados)")
+            return removed
+        except Exception as e:
+            logger.error(f"❌ Error compactando libro de monedas: {e}")
+            return 0
+
     async def get_user_achievements(self, user_id: str) -> Dict[str, bool]:
         """Obtiene los logros de un usuario desde SQLite."""
-        async with self.locks['sqlite']:
+        async with self.user_pool(user_id).reader("achievements.get") as conn:
             try:
-                async with self.sqlite_conn.execute(
+                async with conn.execute(
                     "SELECT achievement_name FROM achievements WHERE user_id = ?",
                     (user_id,)
                 ) as cursor:
@@ -373,38 +938,10 @@ class HybridDatabase:
                 return {}
 
     async def update_user_achievements(self, user_id: str, achievement_key: str) -> bool:
-        """Actualiza los logros del usuario en MongoDB y SQLite."""
-        try:
-            achievement_rewards = {
-                "primer_mascota": {"coins": 50, "xp": 100},
-                "coleccionista_novato": {"coins": 100, "xp": 200},
-                "primer_raro": {"coins": 80, "xp": 150},
-                "explorador_items": {"coins": 60, "xp": 120}
-            }
-            reward = achievement_rewards.get(achievement_key, {"coins": 0, "xp": 0})
-
-            if self.mongo_db is not None:
-                async with self.locks['mongo']:
-                    collection = self.mongo_db.user_achievements
-                    await collection.update_one(
-                        {"user_id": user_id, "achievement_key": achievement_key},
-                        {"$set": {
-                            "user_id": user_id,
-                            "achievement_key": achievement_key,
-                            "reward_coins": reward["coins"],
-                            "reward_xp": reward["xp"],
-                            "unlocked_at": str(datetime.now())
-                        }},
-                        upsert=True
-                    )
-
-            async with self.locks['sqlite']:
-                async with self.sqlite_conn.cursor() as cursor:
-                    await cursor.execute(
-                        "INSERT OR IGNORE INTO achievements (user_id, achievement_name, unlocked_at) VALUES (?, ?, ?)",
-                        (user_id, achievement_key, datetime.now())
-                    )
-                await self.sqlite_conn.commit()
+        """Actualiza los logros del usuario en SQLite y los replica a MongoDB vía outbox."""
+        try:
+            async with self.user_pool(user_id).transaction("achievements.unlock") as conn:
+                await self._record_achievement(conn, user_id, achievement_key)
 
             logger.info(f"✅ Logro {achievement_key} actualizado para usuario {user_id}")
             return True
@@ -412,130 +949,144 @@ class HybridDatabase:
             logger.error(f"❌ Error actualizando logros de usuario {user_id}: {e}")
             return False
 
+    async def _record_achievement(self, conn, user_id: str, achievement_key: str):
+        """Inserta el logro en la transacción abierta y lo replica a MongoDB vía outbox."""
+        reward = ACHIEVEMENT_REWARDS.get(achievement_key, {"coins": 0, "xp": 0})
+        async with conn.cursor() as cursor:
+            await cursor.execute(
+                "INSERT OR IGNORE INTO achievements (user_id, achievement_name, unlocked_at) VALUES (?, ?, ?)",
+                (user_id, achievement_key, datetime.now())
+            )
+        if self.mirror_enabled:
+            await mongo_outbox.enqueue(
+                conn, "user_achievements", "update",
+                {"user_id": user_id, "achievement_key": achievement_key},
+                {"$set": {
+                    "user_id": user_id,
+                    "achievement_key": achievement_key,
+                    "reward_coins": reward["coins"],
+                    "reward_xp": reward["xp"],
+                    "unlocked_at": str(datetime.now())
+                }}
+            )
+
+    @asynccontextmanager
+    async def unit_of_work(self, user_id: str):
+        """Agrupa las escrituras de un comando sobre un usuario y las confirma juntas al salir.
+
+        Retiene el lock del usuario de la carga a la confirmación. Si el bloque lanza una
+        excepción no se aplica nada. Ver `UnitOfWork`.
+        """
+        async with self.user_lock(user_id):
+            uow = UnitOfWork(self, user_id)
+            await uow.load()
+            yield uow
+            await uow.commit()
+
     async def update_pet_stats(self, user_id: str, pet_name: str, updates: Dict[str, Any]) -> bool:
-        """Actualiza estadísticas de una mascota específica."""
-        try:
-            user_data = await self.get_user_pets(user_id)
-            if pet_name not in user_data["mascotas"]:
-                logger.error(f"❌ Mascota {pet_name} no encontrada para usuario {user_id}")
-                return False
+        """Actualiza estadísticas de una mascota específica.
 
-            pet = user_data["mascotas"][pet_name]
-            pet.update(updates)
-            await self.save_user_pets(user_id, user_data)
-            logger.debug(f"✅ Estadísticas actualizadas para mascota {pet_name} de usuario {user_id}")
-            return True
+        Las claves numéricas (nivel, experiencia, hambre, energía, felicidad, salud) son
+        incrementos; el resto se asigna tal cual. Si el usuario no tiene cambios pendientes
+        en el write-behind y todas las claves son columnas, se resuelve con un único UPDATE.
+        """
+        try:
+            async with self.user_lock(user_id):
+                if await self._update_pet_columns(user_id, pet_name, updates):
+                    logger.debug(f"✅ Estadísticas actualizadas en SQL para mascota {pet_name} de usuario {user_id}")
+                    return True
+
+                user_data = await self.get_user_pets(user_id)
+                if pet_name not in user_data["mascotas"]:
+                    logger.error(f"❌ Mascota {pet_name} no encontrada para usuario {user_id}")
+                    return False
+
+                pet_schema.apply_updates(user_data["mascotas"][pet_name], updates)
+                await self.save_user_pets(user_id, user_data)
+                logger.debug(f"✅ Estadísticas actualizadas para mascota {pet_name} de usuario {user_id}")
+                return True
         except Exception as e:
             logger.error(f"❌ Error actualizando estadísticas de mascota {pet_name} para {user_id}: {e}")
             return False
 
+    async def _update_pet_columns(self, user_id: str, pet_name: str, updates: Dict[str, Any]) -> bool:
+        """Intenta aplicar `updates` directamente en el almacén (en SQLite, un solo UPDATE).
+
+        Solo aplica si no hay documento pendiente en el write-behind y el backend lo admite
+        (en SQLite, si no ha pasado una hora desde el ancla de decaimiento).
+        """
+        if not updates or user_id in self.write_behind.dirty or user_id in self.write_behind.inflight:
+            return False
+        if not await self.storage.update_pet_fields(user_id, pet_name, updates):
+            return False
+        self.write_behind.fingerprints.pop(user_id, None)
+        self.pet_cache.invalidate(user_id)
+        return True
+
+    def apply_item(self, uow: UnitOfWork, pet_name: str, item_name: str, quantity: int = 1) -> Dict[str, Any]:
+        """Aplica un item sobre una unidad de trabajo abierta (se escribe al confirmarla).
+
+        El cooldown del item y el ticket raro se fijan solo si la unidad de trabajo confirma.
+        """
+        cooldown_key = f"item:{uow.user_id}:{pet_name}:{item_name}"
+        remaining = self.cooldowns.remaining(cooldown_key)
+        if remaining:
+            return {"success": False, "error": f"Item en cooldown por {remaining / 60:.1f} minutos"}
+
+        result = item_engine.apply_item(uow, pet_name, item_name, quantity)
+        if result["success"]:
+            if "ticket_until" in result:
+                ticket_until = result["ticket_until"].timestamp()
+                uow.on_commit(lambda: self.cooldowns.set(f"ticket:{uow.user_id}", until=ticket_until))
+            cooldown = item_engine.ITEMS[item_name].data.get("cooldown", 30) * 60
+            uow.on_commit(lambda: self.cooldowns.set(cooldown_key, cooldown))
+        return result
+
     async def use_item(self, user_id: str, pet_name: str, item_name: str, quantity: int = 1) -> Dict[str, Any]:
-        """Usa un item en una mascota específica y aplica sus efectos."""
-        try:
-            from utils.constants import PET_SHOP_ITEMS, RARE_ITEMS
-            item_data = PET_SHOP_ITEMS.get(item_name, RARE_ITEMS.get(item_name))
-            if not item_data:
-                return {"success": False, "error": "Item no encontrado"}
-
-            cooldown_key = f"{user_id}.{pet_name}.{item_name}"
-            if cooldown_key in self.item_cooldowns and self.item_cooldowns[cooldown_key] > datetime.now():
-                remaining = (self.item_cooldowns[cooldown_key] - datetime.now()).total_seconds() / 60
-                return {"success": False, "error": f"Item en cooldown por {remaining:.1f} minutos"}
-
-            user_data = await self.get_user_pets(user_id)
-            if pet_name not in user_data["mascotas"]:
-                return {"success": False, "error": "Mascota no encontrada"}
-
-            pet = user_data["mascotas"][pet_name]
-            inventory = pet.get("inventario", [])
-            item = next((i for i in inventory if i["name"] == item_name), None)
-            if not item:
-                return {"success": False, "error": "Item no encontrado en el inventario"}
-
-            updates = {}
-            if item_data["effect"] == "Restaura 50 de energía":
-                updates["energía"] = min(pet["max_energía"], pet["energía"] + 50)
-            elif item_data["effect"] == "Aumenta felicidad en 20":
-                updates["felicidad"] = min(100, pet["felicidad"] + 20)
-            elif item_data["effect"] == "Restaura 50 de salud":
-                updates["salud"] = min(pet["max_salud"], pet["salud"] + 50)
-            elif item_data["effect"] == "Aumenta experiencia en 100":
-                updates["experiencia"] = pet["experiencia"] + 100
-            elif item_data["effect"] == "Otorga 50 monedas":
-                user_data["coins"] = user_data.get("coins", 0) + 50
-            elif item_data["effect"] == "Aumenta la probabilidad de obtener una mascota rara":
-                self.item_cooldowns[user_id] = datetime.now() + timedelta(hours=1)
-                updates["ticket_raro"] = "activado"
-            elif item_data["effect"] == "Cambia el elemento de la mascota":
-                from utils.constants import PET_ELEMENTS
-                updates["elemento"] = random.choice(list(PET_ELEMENTS.keys()))
-            elif item_data["effect"] == "Otorga una mascota rara aleatoria":
-                from utils.constants import PET_NAMES_BY_RARITY, PET_TYPES, PET_ELEMENTS
-                rare_class = random.choice(["Raro", "Épico"])
-                rare_names = PET_NAMES_BY_RARITY[rare_class]
-                rare_name = random.choice(rare_names)
-                if rare_name in user_data["mascotas"]:
-                    rare_name = f"{rare_name}_{random.randint(1, 100)}"
-                rare_pet = {
-                    "tipo": random.choice(list(PET_TYPES.keys())),
-                    "clase": rare_class,
-                    "elemento": random.choice(list(PET_ELEMENTS.keys())),
-                    "emoji": PET_TYPES[random.choice(list(PET_TYPES.keys()))]["emoji"],
-                    "nivel": 1,
-                    "experiencia": 0,
-                    "hambre": 50,
-                    "energía": 80,
-                    "felicidad": 70,
-                    "salud": 100,
-                    "estado": "activo",
-                    "última_interacción": str(datetime.now()),
-                    "max_energía": 80,
-                    "max_salud": 100,
-                    "habilidades": [],
-                    "inventario": []
-                }
-                user_data["mascotas"][rare_name] = rare_pet
-                updates["mascota_rara"] = rare_name
-
-            inventory.remove(item)
-            pet["inventario"] = inventory
-            await self.update_pet_stats(user_id, pet_name, updates)
-            await self.save_user_pets(user_id, user_data)
-            self.item_cooldowns[cooldown_key] = datetime.now() + timedelta(minutes=item_data.get("cooldown", 30))
-            return {"success": True, "updates": updates}
+        """Usa `quantity` unidades de un item: una mutación validada y una sola escritura."""
+        try:
+            async with self.unit_of_work(user_id) as uow:
+                return self.apply_item(uow, pet_name, item_name, quantity)
         except Exception as e:
             logger.error(f"❌ Error al usar item {item_name} en mascota {pet_name} de usuario {user_id}: {e}")
             return {"success": False, "error": str(e)}
 
     async def update_mission_progress(self, user_id: str, mission_key: str, progress: int = 1) -> bool:
-        """Actualiza el progreso de una misión en MongoDB."""
-        if self.mongo_db is not None:
-            logger.warning(f"⚠️ MongoDB no disponible para actualizar misión de {user_id}")
-            return False
+        """Suma progreso a una misión (en memoria; se vuelca a SQLite en lote)."""
         try:
-            collection = self.mongo_db.pets
-            mission_type, mission_name = mission_key.split(".")
-            await collection.update_one(
-                {"user_id": user_id},
-                {"$inc": {f"misiones.{mission_type}.{mission_name}.progreso": progress}},
-                upsert=True
-            )
-            logger.info(f"✅ Progreso de misión {mission_key} actualizado para usuario {user_id}: +{progress}")
+            self.missions.increment(user_id, mission_key, progress)
+            logger.debug(f"✅ Progreso de misión {mission_key} actualizado para usuario {user_id}: +{progress}")
             return True
         except Exception as e:
             logger.error(f"❌ Error actualizando misión {mission_key} para {user_id}: {e}")
             return False
 
+    async def get_mission_progress(self, user_id: str) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """Obtiene el progreso de misiones del periodo activo (incluye incrementos sin volcar)."""
+        try:
+            return await self.missions.get_progress(user_id)
+        except Exception as e:
+            logger.error(f"❌ Error obteniendo misiones de {user_id}: {e}")
+            return {"diarias": {}, "semanales": {}, "general": {}}
+
+    async def claim_mission(self, user_id: str, mission_key: str, goal: int) -> bool:
+        """Marca una misión completada como reclamada; solo devuelve True una vez por periodo."""
+        try:
+            return await self.missions.claim(user_id, mission_key, goal)
+        except Exception as e:
+            logger.error(f"❌ Error reclamando misión {mission_key} para {user_id}: {e}")
+            return False
+
     async def set_afk(self, user_id: str, reason: str) -> bool:
         """Marca a un usuario como AFK en SQLite."""
-        async with self.locks['sqlite']:
+        async with self.user_pool(user_id).writer("afk.set") as conn:
             try:
-                async with self.sqlite_conn.cursor() as cursor:
+                async with conn.cursor() as cursor:
                     await cursor.execute(
                         "INSERT OR REPLACE INTO afk_users (user_id, reason, afk_since) VALUES (?, ?, ?)",
                         (user_id, reason, datetime.now())
                     )
-                await self.sqlite_conn.commit()
+                await conn.commit()
                 logger.info(f"✅ Usuario {user_id} marcado como AFK: {reason}")
                 return True
             except Exception as e:
@@ -544,14 +1095,14 @@ class HybridDatabase:
 
     async def remove_afk(self, user_id: str) -> bool:
         """Elimina el estado AFK de un usuario."""
-        async with self.locks['sqlite']:
+        async with self.user_pool(user_id).writer("afk.remove") as conn:
             try:
-                async with self.sqlite_conn.cursor() as cursor:
+                async with conn.cursor() as cursor:
                     await cursor.execute(
                         "DELETE FROM afk_users WHERE user_id = ?",
                         (user_id,)
                     )
-                await self.sqlite_conn.commit()
+                await conn.commit()
                 logger.info(f"✅ Estado AFK eliminado para usuario {user_id}")
                 return True
             except Exception as e:
@@ -560,9 +1111,9 @@ class HybridDatabase:
 
     async def get_afk_user(self, user_id: str) -> Optional[Dict[str, Any]]:
         """Obtiene la información AFK de un usuario."""
-        async with self.locks['sqlite']:
+        async with self.user_pool(user_id).reader("afk.get") as conn:
             try:
-                async with self.sqlite_conn.execute(
+                async with conn.execute(
                     "SELECT reason, afk_since FROM afk_users WHERE user_id = ?",
                     (user_id,)
                 ) as cursor:
@@ -577,16 +1128,47 @@ class HybridDatabase:
                 logger.error(f"❌ Error obteniendo estado AFK para {user_id}: {e}")
                 return None
 
-    async def add_blacklist(self, user_id: str, reason: str) -> bool:
+    async def get_many_afk(self, user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Obtiene el estado AFK de varios usuarios; solo incluye a los que están AFK."""
+        user_ids = list(dict.fromkeys(str(user_id) for user_id in user_ids))
+        result: Dict[str, Dict[str, Any]] = {}
+        if not user_ids:
+            return result
+        try:
+            for pool, group in self.sqlite_manager.group_by_pool(user_ids):
+                async with pool.reader("afk.get_many") as conn:
+                    for chunk in _chunks(group):
+                        async with conn.execute(
+                            f"SELECT user_id, reason, afk_since FROM afk_users WHERE user_id IN ({', '.join('?' for _ in chunk)})",
+                            chunk
+                        ) as cursor:
+                            for row in await cursor.fetchall():
+                                result[row["user_id"]] = {"reason": row["reason"], "afk_since": row["afk_since"]}
+        except Exception as e:
+            logger.error(f"❌ Error obteniendo estado AFK de {len(user_ids)} usuarios: {e}")
+        return result
+
+    async def load_blacklist(self) -> int:
+        """Carga toda la lista negra en memoria (el mismo conjunto, para quien lo tenga referenciado)."""
+        async with self.pool.reader("blacklist.load") as conn:
+            async with conn.execute("SELECT user_id FROM blacklist") as cursor:
+                rows = await cursor.fetchall()
+        self.blacklist.clear()
+        self.blacklist.update(int(row[0]) for row in rows if str(row[0]).isdigit())
+        logger.info(f"✅ Lista negra cargada: {len(self.blacklist)} usuarios")
+        return len(self.blacklist)
+
+    async def add_blacklist(self, user_id: str, reason: str = None) -> bool:
         """Añade un usuario a la lista negra en SQLite."""
-        async with self.locks['sqlite']:
+        async with self.pool.writer("blacklist.add") as conn:
             try:
-                async with self.sqlite_conn.cursor() as cursor:
+                async with conn.cursor() as cursor:
                     await cursor.execute(
                         "INSERT OR REPLACE INTO blacklist (user_id, reason, banned_at) VALUES (?, ?, ?)",
                         (user_id, reason, datetime.now())
                     )
-                await self.sqlite_conn.commit()
+                await conn.commit()
+                self.blacklist.add(int(user_id))
                 logger.info(f"✅ Usuario {user_id} añadido a la lista negra: {reason}")
                 return True
             except Exception as e:
@@ -595,131 +1177,59 @@ class HybridDatabase:
 
     async def remove_blacklist(self, user_id: str) -> bool:
         """Elimina un usuario de la lista negra."""
-        async with self.locks['sqlite']:
+        async with self.pool.writer("blacklist.remove") as conn:
             try:
-                async with self.sqlite_conn.cursor() as cursor:
+                async with conn.cursor() as cursor:
                     await cursor.execute(
                         "DELETE FROM blacklist WHERE user_id = ?",
                         (user_id,)
                     )
-                await self.sqlite_conn.commit()
+                await conn.commit()
+                self.blacklist.discard(int(user_id))
                 logger.info(f"✅ Usuario {user_id} eliminado de la lista negra")
                 return True
             except Exception as e:
                 logger.error(f"❌ Error eliminando usuario {user_id} de la lista negra: {e}")
                 return False
 
+    def in_blacklist(self, user_id) -> bool:
+        """Consulta en memoria, sin tocar SQLite (apta para cada mensaje)."""
+        try:
+            return int(user_id) in self.blacklist
+        except (TypeError, ValueError):
+            return False
+
     async def is_blacklisted(self, user_id: str) -> bool:
         """Verifica si un usuario está en la lista negra."""
-        async with self.locks['sqlite']:
-            try:
-                async with self.sqlite_conn.execute(
-                    "SELECT user_id FROM blacklist WHERE user_id = ?",
-                    (user_id,)
-                ) as cursor:
-                    result = await cursor.fetchone()
-                    return bool(result)
-            except Exception as e:
-                logger.error(f"❌ Error verificando lista negra para {user_id}: {e}")
-                return False
+        return self.in_blacklist(user_id)
 
     async def reset_missions(self, user_id: str) -> bool:
-        """Reinicia las misiones de un usuario en MongoDB."""
-        if self.mongo_db is not None:
-            logger.warning(f"⚠️ MongoDB no disponible para reiniciar misiones de {user_id}")
-            return False
+        """Reinicia las misiones activas (diarias y semanales) de un usuario en SQLite."""
         try:
-            async with self.locks['mongo']:
-                collection = self.mongo_db.pets
-                await collection.update_one(
-                    {"user_id": user_id},
-                    {"$set": {"misiones": {}}},
-                    upsert=True
-                )
-                logger.info(f"✅ Misiones reiniciadas para usuario {user_id}")
-                return True
+            await self.missions.reset(user_id)
+            logger.info(f"✅ Misiones reiniciadas para usuario {user_id}")
+            return True
         except Exception as e:
             logger.error(f"❌ Error reiniciando misiones para {user_id}: {e}")
             return False
 
-    async def update_all_pets_periodically(self):
-        """Actualiza periódicamente las estadísticas de todas las mascotas."""
-        try:
-            async with self.locks['sqlite']:
-                async with self.sqlite_conn.execute("SELECT user_id, pet_name, pet_data FROM pets") as cursor:
-                    pets = await cursor.fetchall()
-                    for pet in pets:
-                        user_id = pet["user_id"]
-                        pet_name = pet["pet_name"]
-                        pet_data = json.loads(pet["pet_data"])
-                        last_interaction = datetime.fromisoformat(pet_data.get("última_interacción", str(datetime.now())))
-                        time_diff = (datetime.now() - last_interaction).total_seconds() / 3600  # Horas
-
-                        if time_diff >= 1:
-                            updates = {
-                                "hambre": max(0, pet_data.get("hambre", 50) - int(time_diff * 5)),
-                                "energía": max(0, pet_data.get("energía", 80) - int(time_diff * 3)),
-                                "felicidad": max(0, pet_data.get("felicidad", 70) - int(time_diff * 4)),
-                                "última_interacción": str(datetime.now())
-                            }
-                            pet_data.update(updates)
-                            user_data = await self.get_user_pets(user_id)
-                            user_data["mascotas"][pet_name] = pet_data
-                            await self.save_user_pets(user_id, user_data)
-                            logger.debug(f"✅ Actualizadas estadísticas de {pet_name} para {user_id}")
-            logger.info("✅ Actualización periódica de mascotas completada")
-        except Exception as e:
-            logger.error(f"❌ Error en actualización periódica de mascotas: {e}")
-
-    async def check_mission_resets(self):
-        """Verifica y reinicia misiones diarias si es necesario."""
+    async def collect_expired_missions(self) -> int:
+        """Elimina en bloque los contadores de periodos de misiones ya caducados."""
         try:
-            # Intentar importar DAILY_RESET_HOUR, usar 0 (medianoche) como predeterminado
-            try:
-                from utils.constants import DAILY_RESET_HOUR
-            except ImportError:
-                logger.warning("⚠️ DAILY_RESET_HOUR no encontrado en utils.constants, usando 0 (medianoche)")
-                DAILY_RESET_HOUR = 0
-
-            current_time = datetime.now()
-            reset_key = current_time.strftime("%Y-%m-%d")
-
-            if self.mongo_db is not None and reset_key not in self.mission_resets:
-                async with self.locks['mongo']:
-                    collection = self.mongo_db.pets
-                    cursor = collection.find()
-                    async for user in cursor:
-                        user_id = user["user_id"]
-                        if user.get("misiones", {}).get("diarias"):
-                            await self.reset_missions(user_id)
-                    self.mission_resets[reset_key] = True
-                    logger.info(f"✅ Misiones diarias reiniciadas para {reset_key}")
+            return await self.missions.collect_garbage()
         except Exception as e:
-            logger.error(f"❌ Error en verificación de reinicio de misiones: {e}")
+            logger.error(f"❌ Error eliminando misiones caducadas: {e}")
+            return 0
 
     async def create_guild(self, guild_id: str, guild_data: Dict[str, Any]) -> bool:
-        """Crea un nuevo gremio en SQLite y MongoDB."""
+        """Crea un nuevo gremio en el almacén (en hybrid, replicado a MongoDB vía outbox)."""
         try:
             guild_data["guild_id"] = guild_id
             guild_data["created_at"] = str(datetime.now())
             guild_data["last_updated"] = str(datetime.now())
 
-            if self.mongo_db is not None:
-                async with self.locks['mongo']:
-                    collection = self.mongo_db.guilds
-                    await collection.replace_one(
-                        {"guild_id": guild_id},
-                        guild_data,
-                        upsert=True
-                    )
-
-            async with self.locks['sqlite']:
-                async with self.sqlite_conn.cursor() as cursor:
-                    await cursor.execute(
-                        "INSERT OR REPLACE INTO guilds (guild_id, guild_data, last_updated) VALUES (?, ?, ?)",
-                        (guild_id, json.dumps(guild_data), datetime.now())
-                    )
-                await self.sqlite_conn.commit()
+            await self.storage.save_guild(guild_id, guild_data)
+            self.guild_cache.invalidate(guild_id)
 
             logger.info(f"✅ Gremio {guild_id} creado")
             return True
@@ -728,51 +1238,65 @@ class HybridDatabase:
             return False
 
     async def get_guild(self, guild_id: str) -> Optional[Dict[str, Any]]:
-        """Obtiene los datos de un gremio desde SQLite."""
-        async with self.locks['sqlite']:
-            try:
-                async with self.sqlite_conn.execute(
-                    "SELECT guild_data FROM guilds WHERE guild_id = ?",
-                    (guild_id,)
-                ) as cursor:
-                    result = await cursor.fetchone()
-                    if result:
-                        return json.loads(result["guild_data"])
-                    return None
-            except Exception as e:
-                logger.error(f"❌ Error obteniendo gremio {guild_id}: {e}")
-                return None
+        """Obtiene los datos de un gremio (caché o almacén)."""
+        cached = self.guild_cache.get(guild_id)
+        if cached is not None:
+            return cached
+        version = self.guild_cache.version(guild_id)
+        try:
+            guild_data = (await self.storage.load_guilds([guild_id])).get(guild_id)
+            if guild_data:
+                self.guild_cache.put(guild_id, guild_data, version)
+            return guild_data
+        except Exception as e:
+            logger.error(f"❌ Error obteniendo gremio {guild_id}: {e}")
+            return None
 
-    async def update_guild(self, guild_id: str, updates: Dict[str, Any]) -> bool:
-        """Actualiza los datos de un gremio."""
+    async def get_many_guilds(self, guild_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Obtiene varios gremios (caché y una lectura por bloques para el resto); omite los inexistentes."""
+        guild_ids = list(dict.fromkeys(str(guild_id) for guild_id in guild_ids))
+        result: Dict[str, Dict[str, Any]] = {}
+        missing = []
+        for guild_id in guild_ids:
+            cached = self.guild_cache.get(guild_id)
+            if cached is not None:
+                result[guild_id] = cached
+            else:
+                missing.append(guild_id)
+        if not missing:
+            return result
+
+        versions = {guild_id: self.guild_cache.version(guild_id) for guild_id in missing}
         try:
-            guild_data = await self.get_guild(guild_id)
-            if not guild_data:
-                logger.error(f"❌ Gremio {guild_id} no encontrado")
-                return False
+            loaded = await self.storage.load_guilds(missing)
+        except Exception as e:
+            logger.error(f"❌ Error obteniendo {len(missing)} gremios: {e}")
+            return result
+        for guild_id, guild_data in loaded.items():
+            self.guild_cache.put(guild_id, guild_data, versions[guild_id])
+            result[guild_id] = guild_data
+        return result
 
-            guild_data.update(updates)
-            guild_data["last_updated"] = str(datetime.now())
+    async def update_guild(self, guild_id: str, updates: Dict[str, Any]) -> bool:
+        """Actualiza los datos de un gremio.
 
-            if self.mongo_db is not None:
-                async with self.locks['mongo']:
-                    collection = self.mongo_db.guilds
-                    await collection.replace_one(
-                        {"guild_id": guild_id},
-                        guild_data,
-                        upsert=True
-                    )
+        bank/xp/level solo los mueve el volcado de actividad: un documento leído antes de un volcado no los pisa.
+        """
+        try:
+            async with self.guild_lock(guild_id):
+                guild_data = await self.get_guild(guild_id)
+                if not guild_data:
+                    logger.error(f"❌ Gremio {guild_id} no encontrado")
+                    return False
 
-            async with self.locks['sqlite']:
-                async with self.sqlite_conn.cursor() as cursor:
-                    await cursor.execute(
-                        "INSERT OR REPLACE INTO guilds (guild_id, guild_data, last_updated) VALUES (?, ?, ?)",
-                        (guild_id, json.dumps(guild_data), datetime.now())
-                    )
-                await self.sqlite_conn.commit()
+                guild_data.update(updates)
+                guild_data["last_updated"] = str(datetime.now())
 
-            logger.info(f"✅ Gremio {guild_id} actualizado")
-            return True
+                await self.storage.save_guild(guild_id, guild_data)
+                self.guild_cache.invalidate(guild_id)
+
+                logger.info(f"✅ Gremio {guild_id} actualizado")
+                return True
         except Exception as e:
             logger.error(f"❌ Error actualizando gremio {guild_id}: {e}")
             return False
@@ -780,15 +1304,10 @@ class HybridDatabase:
     async def update_all_guilds_periodically(self):
         """Actualiza periódicamente todos los gremios."""
         try:
-            async with self.locks['sqlite']:
-                async with self.sqlite_conn.execute("SELECT guild_id, guild_data FROM guilds") as cursor:
-                    guilds = await cursor.fetchall()
-                    for guild in guilds:
-                        guild_id = guild["guild_id"]
-                        guild_data = json.loads(guild["guild_data"])
-                        guild_data["last_updated"] = str(datetime.now())
-                        guild_data["activity_points"] = guild_data.get("activity_points", 0) + 1
-                        await self.update_guild(guild_id, guild_data)
+            for guild_id, guild_data in (await self.storage.scan_guilds()).items():
+                guild_data["last_updated"] = str(datetime.now())
+                guild_data["activity_points"] = guild_data.get("activity_points", 0) + 1
+                await self.update_guild(guild_id, guild_data)
             logger.info("✅ Actualización periódica de gremios completada")
         except Exception as e:
             logger.error(f"❌ Error en actualización periódica de gremios: {e}")
@@ -811,6 +1330,17 @@ async def get_user_pets(user_id: str) -> Dict[str, Any]:
         raise ValueError("Database not initialized")
     return await db.get_user_pets(user_id)
 
+def unit_of_work(user_id: str):
+    """`async with unit_of_work(user_id) as uow:` agrupa las escrituras de un comando."""
+    if db is None:
+        raise ValueError("Database not initialized")
+    return db.unit_of_work(user_id)
+
+async def get_many_user_pets(user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    if db is None:
+        raise ValueError("Database not initialized")
+    return await db.get_many_user_pets(user_ids)
+
 async def save_user_pets(user_id: str, user_data: Dict[str, Any]) -> bool:
     if db is None:
         raise ValueError("Database not initialized")
@@ -826,6 +1356,21 @@ async def update_user_coins(user_id: str, amount: int, username: str = None) ->
         raise ValueError("Database not initialized")
     return await db.update_user_coins(user_id, amount, username)
 
+async def get_user_coins(user_id: str) -> int:
+    if db is None:
+        raise ValueError("Database not initialized")
+    return await db.get_user_coins(user_id)
+
+async def add_coins(user_id: str, delta: int, reason: str = None) -> Optional[int]:
+    if db is None:
+        raise ValueError("Database not initialized")
+    return await db.add_coins(user_id, delta, reason)
+
+async def credit_many(credits: List[tuple], reason: str = None) -> bool:
+    if db is None:
+        raise ValueError("Database not initialized")
+    return await db.credit_many(credits, reason)
+
 async def get_user_achievements(user_id: str) -> Dict[str, bool]:
     if db is None:
         raise ValueError("Database not initialized")
@@ -851,6 +1396,16 @@ async def update_mission_progress(user_id: str, mission_key: str, progress: int
         raise ValueError("Database not initialized")
     return await db.update_mission_progress(user_id, mission_key, progress)
 
+async def get_mission_progress(user_id: str) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    if db is None:
+        raise ValueError("Database not initialized")
+    return await db.get_mission_progress(user_id)
+
+async def claim_mission(user_id: str, mission_key: str, goal: int) -> bool:
+    if db is None:
+        raise ValueError("Database not initialized")
+    return await db.claim_mission(user_id, mission_key, goal)
+
 async def set_afk(user_id: str, reason: str) -> bool:
     if db is None:
         raise ValueError("Database not initialized")
@@ -866,7 +1421,12 @@ async def get_afk_user(user_id: str) -> Optional[Dict[str, Any]]:
         raise ValueError("Database not initialized")
     return await db.get_afk_user(user_id)
 
-async def add_blacklist(user_id: str, reason: str) -> bool:
+async def get_many_afk(user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    if db is None:
+        raise ValueError("Database not initialized")
+    return await db.get_many_afk(user_ids)
+
+async def add_blacklist(user_id: str, reason: str = None) -> bool:
     if db is None:
         raise ValueError("Database not initialized")
     return await db.add_blacklist(user_id, reason)
@@ -881,6 +1441,11 @@ async def is_blacklisted(user_id: str) -> bool:
         raise ValueError("Database not initialized")
     return await db.is_blacklisted(user_id)
 
+def in_blacklist(user_id) -> bool:
+    if db is None:
+        raise ValueError("Database not initialized")
+    return db.in_blacklist(user_id)
+
 async def reset_missions(user_id: str) -> bool:
     if db is None:
         raise ValueError("Database not initialized")
@@ -896,6 +1461,16 @@ async def get_guild(guild_id: str) -> Optional[Dict[str, Any]]:
         raise ValueError("Database not initialized")
     return await db.get_guild(guild_id)
 
+async def get_many_guilds(guild_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    if db is None:
+        raise ValueError("Database not initialized")
+    return await db.get_many_guilds(guild_ids)
+
+def record_guild_activity(guild_id: str, bank: int = 0, xp: int = 0, channel=None):
+    if db is None:
+        raise ValueError("Database not initialized")
+    db.guild_activity.record(guild_id, bank, xp, channel)
+
 async def update_guild(guild_id: str, updates: Dict[str, Any]) -> bool:
     if db is None:
         raise ValueError("Database not initialized")
@@ -906,9 +1481,9 @@ async def periodic_tasks(bot):
     while True:
         try:
             if bot.db and bot.db.initialized:
-                await bot.db.sqlite_manager.cleanup_old_cache(7)
-                await bot.db.update_all_pets_periodically()
-                await bot.db.check_mission_resets()
+                await bot.db.cleanup_old_cache(7)
+                await bot.db.compact_coin_ledger(7)
+                await bot.db.collect_expired_missions()
                 await bot.db.update_all_guilds_periodically()
                 logger.info("✅ Tareas periódicas ejecutadas")
             await asyncio.sleep(24 * 60 * 60)  # Cada 24 horas
@@ -0,0 +1,85 @@
+import copy
+from collections import OrderedDict
+from typing import Dict, Any, Hashable, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+class EntityCache:
+    """Caché LRU acotada de documentos (mascotas de usuario, gremios) con versión por entidad.
+
+    Cada escritura llama a `invalidate`, que descarta la entrada y sube la versión de la
+    entidad. Una lectura que falla en caché toma `version(key)` antes de consultar SQLite y
+    pasa ese valor a `put`: si hubo una escritura entre medias, el documento leído ya está
+    obsoleto y no se guarda. `get` y `put` trabajan con copias profundas, así que los
+    handlers pueden modificar lo que reciben sin corromper la caché.
+    """
+
+    def __init__(self, name: str, max_size: int = 1024):
+        self.name = name
+        self.max_size = max_size
+        self.entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self.versions: Dict[Hashable, int] = {}
+        self.clock = 0  # Contador monótono: toda versión nueva es mayor que cualquier anterior
+        self.floor = 0  # Versión de las entidades sin escrituras registradas
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "stale": 0, "invalidations": 0, "evictions": 0}
+
+    def version(self, key: Hashable) -> int:
+        """Versión actual de una entidad (tomarla antes de leer de la base de datos)."""
+        return self.versions.get(key, self.floor)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Copia del documento en caché, o None si no está."""
+        if key not in self.entries:
+            self.stats["misses"] += 1
+            return None
+        self.entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return copy.deepcopy(self.entries[key])
+
+    def put(self, key: Hashable, value: Any, version: int) -> bool:
+        """Guarda una copia si la entidad no cambió desde `version`. Devuelve si se guardó."""
+        if version != self.version(key):
+            self.stats["stale"] += 1
+            return False
+        self.entries[key] = copy.deepcopy(value)
+        self.entries.move_to_end(key)
+        self.stats["stores"] += 1
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.stats["evictions"] += 1
+        return True
+
+    def invalidate(self, key: Hashable):
+        """Descarta la entidad y sube su versión (llamar tras cada escritura)."""
+        self.entries.pop(key, None)
+        self.clock += 1
+        self.versions[key] = self.clock
+        self.stats["invalidations"] += 1
+        if len(self.versions) > self.max_size * 4:
+            self._prune_versions()
+
+    def _prune_versions(self):
+        """Olvida versiones antiguas subiendo el suelo: las lecturas en curso quedan obsoletas."""
+        self.floor = self.clock
+        self.versions = {key: version for key, version in self.versions.items() if key in self.entries}
+
+    def clear(self):
+        """Vacía la caché invalidando todas las lecturas en curso."""
+        self.entries.clear()
+        self.versions = {}
+        self.clock += 1
+        self.floor = self.clock
+
+    def hit_ratio(self) -> float:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups else 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "hit_ratio": round(self.hit_ratio(), 4),
+            **self.stats,
+        }
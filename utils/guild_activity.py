@@ -0,0 +1,127 @@
+import asyncio
+from typing import Dict, Any, List, Tuple
+import logging
+from utils.codec import decode
+
+logger = logging.getLogger(__name__)
+
+# Contadores de gremio guardados en columnas para poder incrementarlos en SQL
+GUILD_COUNTERS = {"bank": 0, "xp": 0, "level": 1}
+XP_PER_LEVEL = 1000  # XP necesaria para subir = nivel actual * XP_PER_LEVEL
+MAX_LEVEL_UPS_PER_FLUSH = 10
+
+def split_guild(guild_data: Dict[str, Any]) -> Tuple[Dict[str, Any], tuple]:
+    """Separa el documento del gremio de sus contadores (bank, xp, level)."""
+    document = {key: value for key, value in guild_data.items() if key not in GUILD_COUNTERS}
+    counters = tuple(guild_data.get(key, default) for key, default in GUILD_COUNTERS.items())
+    return document, counters
+
+def join_guild(document: Dict[str, Any], row) -> Dict[str, Any]:
+    """Reconstruye el documento del gremio con los contadores de sus columnas."""
+    for key in GUILD_COUNTERS:
+        document[key] = row[key]
+    return document
+
+async def backfill(conn, codec) -> int:
+    """Mueve bank/xp/level de documentos antiguos a sus columnas (idempotente)."""
+    async with conn.execute("SELECT guild_id, guild_data FROM guilds") as cursor:
+        rows = await cursor.fetchall()
+    updates = []
+    for row in rows:
+        guild_data = decode(row["guild_data"])
+        if not any(key in guild_data for key in GUILD_COUNTERS):
+            continue
+        document, counters = split_guild(guild_data)
+        updates.append((codec.encode(document),) + counters + (row["guild_id"],))
+    if updates:
+        await conn.executemany(
+            "UPDATE guilds SET guild_data = ?, bank = ?, xp = ?, level = ? WHERE guild_id = ?",
+            updates
+        )
+        logger.info(f"✅ {len(updates)} gremios migrados a contadores en columnas")
+    return len(updates)
+
+class GuildActivity:
+    """Acumula en memoria la actividad (bank/xp) por gremio y la vuelca como incrementos.
+
+    `record` no toca la base de datos; un bucle vuelca cada `flush_interval` segundos todos
+    los deltas con `storage.apply_guild_activity` (en SQLite, una transacción con
+    `bank = bank + ?`), que también resuelve las subidas de nivel.
+    """
+
+    def __init__(self, database, flush_interval: float = 5.0):
+        self.database = database
+        self.flush_interval = flush_interval
+        self.pending: Dict[str, List[int]] = {}  # guild_id -> [bank, xp]
+        self.channels: Dict[str, Any] = {}  # Último canal con actividad, para anunciar subidas de nivel
+        self.flush_task = None
+        self.flush_lock = asyncio.Lock()
+        self.stats = {"recorded": 0, "flushes": 0, "guilds_flushed": 0, "level_ups": 0}
+
+    def record(self, guild_id: str, bank: int = 0, xp: int = 0, channel=None):
+        """Suma actividad a un gremio (solo memoria)."""
+        deltas = self.pending.setdefault(guild_id, [0, 0])
+        deltas[0] += bank
+        deltas[1] += xp
+        if channel is not None:
+            self.channels[guild_id] = channel
+        self.stats["recorded"] += 1
+
+    async def start(self):
+        """Inicia el bucle de volcado."""
+        if self.flush_task is None:
+            self.flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Detiene el bucle y vuelca lo pendiente."""
+        if self.flush_task:
+            self.flush_task.cancel()
+            try:
+                await self.flush_task
+            except asyncio.CancelledError:
+                pass
+            self.flush_task = None
+        await self.flush()
+
+    async def _flush_loop(self):
+        """Bucle de volcado periódico."""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"❌ Error volcando actividad de gremios: {e}")
+
+    async def flush(self) -> int:
+        """Vuelca los deltas acumulados. Devuelve cuántos gremios se actualizaron."""
+        async with self.flush_lock:
+            if not self.pending:
+                return 0
+            batch, self.pending = self.pending, {}
+            try:
+                guilds, level_ups = await self.database.storage.apply_guild_activity(batch)
+            except Exception as e:
+                # Devolver los deltas para el siguiente volcado
+                for guild_id, (bank, xp) in batch.items():
+                    self.record(guild_id, bank, xp)
+                    self.stats["recorded"] -= 1
+                logger.error(f"❌ Error volcando actividad de {len(batch)} gremios: {e}")
+                return 0
+
+            for guild_id in batch:
+                self.database.guild_cache.invalidate(guild_id)
+            self.stats["flushes"] += 1
+            self.stats["guilds_flushed"] += len(guilds)
+            self.stats["level_ups"] += len(level_ups)
+            for guild_id, level in level_ups.items():
+                await self._announce(guild_id, guilds.get(guild_id, {}).get("name", guild_id), level)
+            return len(guilds)
+
+    async def _announce(self, guild_id: str, name: str, level: int):
+        channel = self.channels.get(guild_id)
+        if channel is None:
+            return
+        try:
+            await channel.send(f"🎉 ¡El gremio **{name}** ha subido al nivel {level}!")
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudo anunciar la subida de nivel del gremio {guild_id}: {e}")
@@ -0,0 +1,167 @@
+import random
+from datetime import datetime, timedelta
+from typing import Dict, Any, NamedTuple, Optional, Tuple, Union
+import logging
+from utils.constants import PET_SHOP_ITEMS, RARE_ITEMS, PET_ELEMENTS, PET_NAMES_BY_RARITY, PET_TYPES, PET_CLASSES
+from utils.pet_decay import ANCHOR_KEY
+from utils import pet_schema
+
+logger = logging.getLogger(__name__)
+
+MAX_PETS = 10  # Mismo límite que /pet adopt
+
+# Efectos tipados: se compilan una vez desde el campo "action" de los catálogos
+class StatDelta(NamedTuple):
+    stat: str
+    amount: int
+    cap: Union[str, int, None] = None  # Campo de la mascota ("max_energía") o valor fijo
+
+class CoinGrant(NamedTuple):
+    amount: int
+
+class Reroll(NamedTuple):
+    field: str
+    choices: Tuple[str, ...]
+
+class SpawnPet(NamedTuple):
+    classes: Tuple[str, ...]
+
+class RareTicket(NamedTuple):
+    hours: float
+
+class CompiledItem(NamedTuple):
+    name: str
+    data: Dict[str, Any]
+    effect: Any
+
+# Valores posibles de los campos que admite "reroll"
+REROLL_CHOICES = {"elemento": tuple(PET_ELEMENTS)}
+STAT_FIELDS = {"hambre", "energía", "felicidad", "salud", "experiencia", "nivel"}
+
+def compile_effect(item_name: str, action: Dict[str, Any]):
+    """Valida el "action" de un item y lo convierte en su efecto tipado (ValueError si no es válido)."""
+    kind = action.get("kind")
+    if kind == "stat":
+        if action.get("stat") not in STAT_FIELDS:
+            raise ValueError(f"{item_name}: stat desconocido {action.get('stat')!r}")
+        return StatDelta(action["stat"], int(action["amount"]), action.get("cap"))
+    if kind == "coins":
+        if int(action["amount"]) <= 0:
+            raise ValueError(f"{item_name}: la cantidad de monedas debe ser positiva")
+        return CoinGrant(int(action["amount"]))
+    if kind == "reroll":
+        if action.get("field") not in REROLL_CHOICES:
+            raise ValueError(f"{item_name}: campo no sorteable {action.get('field')!r}")
+        return Reroll(action["field"], REROLL_CHOICES[action["field"]])
+    if kind == "spawn_pet":
+        classes = tuple(action.get("classes", ()))
+        if not classes or any(cls not in PET_NAMES_BY_RARITY for cls in classes):
+            raise ValueError(f"{item_name}: clases de mascota no válidas {classes}")
+        return SpawnPet(classes)
+    if kind == "rare_ticket":
+        return RareTicket(float(action.get("hours", 1)))
+    raise ValueError(f"{item_name}: tipo de efecto desconocido {kind!r}")
+
+def compile_items(*catalogs: Dict[str, Dict[str, Any]]) -> Dict[str, CompiledItem]:
+    """Compila los catálogos de items a {nombre: CompiledItem}."""
+    compiled: Dict[str, CompiledItem] = {}
+    for catalog in catalogs:
+        for item_name, item_data in catalog.items():
+            compiled[item_name] = CompiledItem(item_name, item_data, compile_effect(item_name, item_data["action"]))
+    return compiled
+
+ITEMS = compile_items(PET_SHOP_ITEMS, RARE_ITEMS)
+
+def _take_units(user_data: Dict[str, Any], pet: Dict[str, Any], item_name: str, quantity: int) -> bool:
+    """Quita `quantity` unidades del inventario de la mascota y, si faltan, del global."""
+    inventories = [pet.setdefault("inventario", []), user_data.setdefault("inventario_global", [])]
+    if sum(1 for inventory in inventories for entry in inventory if entry.get("name") == item_name) < quantity:
+        return False
+    remaining = quantity
+    for inventory in inventories:
+        kept = []
+        for entry in inventory:
+            if remaining and entry.get("name") == item_name:
+                remaining -= 1
+            else:
+                kept.append(entry)
+        inventory[:] = kept
+    return True
+
+def _new_rare_pet(pet_class: str, taken: Dict[str, Any], rng: random.Random) -> Tuple[str, Dict[str, Any]]:
+    name = rng.choice(PET_NAMES_BY_RARITY[pet_class])
+    while name in taken:
+        name = f"{name}_{rng.randint(1, 100)}"
+    pet_type = rng.choice([key for key in PET_TYPES if key != "universal"])
+    base_stats = PET_TYPES[pet_type]["base_stats"]
+    multiplier = PET_CLASSES[pet_class]["stat_multiplier"]
+    now = str(datetime.now())
+    return name, {
+        "tipo": pet_type,
+        "clase": pet_class,
+        "elemento": rng.choice(list(PET_ELEMENTS)),
+        "emoji": PET_TYPES[pet_type]["emoji"],
+        "nivel": 1,
+        "experiencia": 0,
+        "hambre": int(base_stats["hambre"] * multiplier),
+        "energía": int(base_stats["energía"] * multiplier),
+        "felicidad": int(base_stats["felicidad"] * multiplier),
+        "salud": int(base_stats["salud"] * multiplier),
+        "estado": "activo",
+        "última_interacción": now,
+        ANCHOR_KEY: now,
+        "max_energía": int(base_stats["energía"] * multiplier),
+        "max_salud": int(base_stats["salud"] * multiplier),
+        "habilidades": [],
+        "inventario": []
+    }
+
+def apply_item(uow, pet_name: str, item_name: str, quantity: int = 1, rng: Optional[random.Random] = None) -> Dict[str, Any]:
+    """Valida y aplica `quantity` unidades de un item sobre una unidad de trabajo.
+
+    Todo se comprueba antes de mutar: si algo falla se devuelve el error sin tocar nada.
+    Las mascotas se marcan para un único guardado y las monedas van en un solo movimiento.
+    """
+    rng = rng or random
+    compiled = ITEMS.get(item_name)
+    if compiled is None:
+        return {"success": False, "error": "Item no encontrado"}
+    if quantity < 1:
+        return {"success": False, "error": "La cantidad debe ser mayor que 0"}
+    pet = uow.pets.get(pet_name)
+    if pet is None:
+        return {"success": False, "error": "Mascota no encontrada"}
+    effect = compiled.effect
+    if isinstance(effect, SpawnPet) and len(uow.pets) + quantity > MAX_PETS:
+        return {"success": False, "error": f"No puedes tener más de {MAX_PETS} mascotas"}
+    if not _take_units(uow.user_data, pet, item_name, quantity):
+        return {"success": False, "error": "Item no encontrado en el inventario"}
+
+    updates: Dict[str, Any] = {}
+    result: Dict[str, Any] = {"success": True, "updates": updates}
+    if isinstance(effect, StatDelta):
+        current = pet.get(effect.stat, 0)
+        cap = pet.get(effect.cap) if isinstance(effect.cap, str) else effect.cap
+        pet[effect.stat] = updates[effect.stat] = pet_schema.clamp_stat(current, current + effect.amount * quantity, cap)
+        result["message"] = f"{effect.stat.capitalize()}: {pet[effect.stat]}"
+    elif isinstance(effect, CoinGrant):
+        uow.add_coins(effect.amount * quantity, f"item:{item_name}")
+        updates["coins"] = uow.coins
+        result["message"] = f"+{effect.amount * quantity} monedas 💰"
+    elif isinstance(effect, Reroll):
+        pet[effect.field] = updates[effect.field] = rng.choice(effect.choices)
+        result["message"] = f"Nuevo {effect.field}: {pet[effect.field]}"
+    elif isinstance(effect, SpawnPet):
+        spawned = []
+        for _ in range(quantity):
+            name, new_pet = _new_rare_pet(rng.choice(effect.classes), uow.pets, rng)
+            uow.pets[name] = new_pet
+            spawned.append(name)
+        updates["mascota_rara"] = spawned[0] if quantity == 1 else spawned
+        result["message"] = f"Nueva mascota: {', '.join(spawned)}"
+    elif isinstance(effect, RareTicket):
+        pet["ticket_raro"] = updates["ticket_raro"] = "activado"
+        result["ticket_until"] = datetime.now() + timedelta(hours=effect.hours * quantity)
+        result["message"] = f"Ticket raro activo durante {effect.hours * quantity:g}h"
+    uow.save_pets()
+    return result
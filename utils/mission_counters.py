@@ -0,0 +1,280 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+import logging
+from utils import mongo_outbox
+
+logger = logging.getLogger(__name__)
+
+try:
+    from utils.constants import DAILY_RESET_HOUR
+except ImportError:
+    DAILY_RESET_HOUR = 0
+
+MISSION_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS mission_progress (
+        user_id TEXT NOT NULL,
+        period TEXT NOT NULL,
+        mission TEXT NOT NULL,
+        progress INTEGER NOT NULL DEFAULT 0,
+        claimed INTEGER NOT NULL DEFAULT 0,
+        updated_at REAL,
+        PRIMARY KEY (user_id, period, mission)
+    )
+"""
+MISSION_COLUMNS = ["user_id", "period", "mission", "progress", "claimed", "updated_at"]
+MISSION_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_mission_progress_period ON mission_progress (period)",
+]
+GENERAL_TYPE = "general"  # Claves sin tipo (p. ej. "play_songs"): contador acumulado sin reinicio
+GENERAL_PERIOD = "total"
+# Periodos anteriores que se conservan antes de recolectarlos (para consultas de "ayer"/"semana pasada")
+RETAINED_PERIODS = {"diarias": timedelta(days=1), "semanales": timedelta(weeks=1)}
+GC_CHUNK_SIZE = 1000
+SELECT_CHUNK_SIZE = 500  # Claves (3 parámetros cada una) por consulta, por debajo del límite de variables de SQLite
+
+def split_key(mission_key: str) -> Tuple[str, str]:
+    """'diarias.play_pet' -> ('diarias', 'play_pet'); sin tipo -> ('general', clave)."""
+    if "." in mission_key:
+        mission_type, mission_name = mission_key.split(".", 1)
+        return mission_type, mission_name
+    return GENERAL_TYPE, mission_key
+
+def period_key(mission_type: str, now: Optional[datetime] = None) -> str:
+    """Periodo activo de un tipo de misión: día para diarias, semana ISO para semanales.
+
+    El reinicio es solo un cambio de clave: al pasar la medianoche local (desplazada
+    DAILY_RESET_HOUR horas), como el reinicio diario original, la clave activa cambia y el
+    progreso anterior deja de leerse, sin tocar ninguna fila.
+    """
+    now = (now or datetime.now()) - timedelta(hours=DAILY_RESET_HOUR)
+    if mission_type == "diarias":
+        return now.strftime("%Y-%m-%d")
+    if mission_type == "semanales":
+        year, week, _ = now.isocalendar()
+        return f"{year}-W{week:02d}"
+    return GENERAL_PERIOD
+
+class MissionCounters:
+    """Contadores de progreso de misiones en SQLite con incrementos acumulados en memoria.
+
+    `increment` solo suma en memoria; un bucle vuelca los deltas en lote con
+    `progress = progress + ?`. Las lecturas combinan lo persistido con lo pendiente.
+    La tabla es por usuario: con SQLITE_SHARDS cada usuario la tiene en su shard, así que
+    una unidad de trabajo escribe progreso y reclamos en la misma transacción que sus monedas.
+    """
+
+    def __init__(self, database, flush_interval: float = 10.0):
+        self.database = database
+        self.flush_interval = flush_interval
+        self.pending: Dict[str, Dict[Tuple[str, str], int]] = {}  # user_id -> {(period, mission): delta}
+        self.inflight: Dict[str, Dict[Tuple[str, str], int]] = {}  # Lote que se está volcando
+        self.flush_task = None
+        self.flush_lock = asyncio.Lock()
+        self.stats = {"increments": 0, "flushes": 0, "rows_flushed": 0}
+
+    def increment(self, user_id: str, mission_key: str, amount: int = 1, now: Optional[datetime] = None):
+        """Suma progreso a una misión en el periodo activo (solo memoria)."""
+        mission_type, mission_name = split_key(mission_key)
+        self.increment_key(user_id, period_key(mission_type, now), f"{mission_type}.{mission_name}", amount)
+        self.stats["increments"] += 1
+
+    def increment_key(self, user_id: str, period: str, mission: str, amount: int):
+        """Suma un delta a una clave (periodo, misión) ya normalizada."""
+        deltas = self.pending.setdefault(user_id, {})
+        deltas[(period, mission)] = deltas.get((period, mission), 0) + amount
+
+    @staticmethod
+    def normalize(mission_key: str, now: Optional[datetime] = None) -> Tuple[str, str]:
+        """'diarias.play_pet' -> (periodo activo, 'diarias.play_pet')."""
+        mission_type, mission_name = split_key(mission_key)
+        return period_key(mission_type, now), f"{mission_type}.{mission_name}"
+
+    def take(self, user_id: str) -> Dict[Tuple[str, str], int]:
+        """Retira los incrementos pendientes de un usuario para escribirlos en otra transacción."""
+        return self.pending.pop(user_id, {})
+
+    def restore(self, user_id: str, deltas: Dict[Tuple[str, str], int]):
+        """Devuelve a memoria incrementos retirados con `take` cuya transacción no confirmó."""
+        for (period, mission), delta in deltas.items():
+            self.increment_key(user_id, period, mission, delta)
+
+    async def write(self, conn, rows: List[Tuple[str, str, str, int]]):
+        """Suma filas (user_id, periodo, misión, delta) en la transacción abierta y las replica."""
+        if not rows:
+            return
+        now = time.time()
+        await conn.executemany(
+            """INSERT INTO mission_progress (user_id, period, mission, progress, updated_at) VALUES (?, ?, ?, ?, ?)
+               ON CONFLICT(user_id, period, mission) DO UPDATE SET
+                   progress = progress + excluded.progress,
+                   updated_at = excluded.updated_at""",
+            [row + (now,) for row in rows]
+        )
+        if self.database.mirror_enabled:
+            persisted = await self._select(conn, [row[:3] for row in rows])
+            await mongo_outbox.enqueue_many(conn, [
+                ("mission_progress", "update",
+                 {"user_id": row["user_id"], "period": row["period"], "mission": row["mission"]},
+                 {"$set": {"progress": row["progress"], "claimed": bool(row["claimed"])}})
+                for row in persisted
+            ])
+
+    async def claim_in(self, conn, user_id: str, mission_key: str, goal: int, now: Optional[datetime] = None) -> bool:
+        """Reclama una misión en la transacción abierta. True solo si estaba completa y sin reclamar."""
+        period, mission = self.normalize(mission_key, now)
+        cursor = await conn.execute(
+            "UPDATE mission_progress SET claimed = 1, updated_at = ? WHERE user_id = ? AND period = ? AND mission = ? AND claimed = 0 AND progress >= ?",
+            (time.time(), user_id, period, mission, goal)
+        )
+        claimed = cursor.rowcount == 1
+        if claimed and self.database.mirror_enabled:
+            await mongo_outbox.enqueue(
+                conn, "mission_progress", "update",
+                {"user_id": user_id, "period": period, "mission": mission},
+                {"$set": {"claimed": True}}
+            )
+        return claimed
+
+    async def start(self):
+        """Inicia el bucle de volcado."""
+        if self.flush_task is None:
+            self.flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Detiene el bucle y vuelca lo pendiente."""
+        if self.flush_task:
+            self.flush_task.cancel()
+            try:
+                await self.flush_task
+            except asyncio.CancelledError:
+                pass
+            self.flush_task = None
+        await self.flush()
+
+    async def _flush_loop(self):
+        """Bucle de volcado periódico."""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"❌ Error volcando progreso de misiones: {e}")
+
+    async def flush(self) -> int:
+        """Vuelca los incrementos pendientes (una transacción por fichero). Devuelve filas afectadas."""
+        async with self.flush_lock:
+            if not self.pending:
+                return 0
+            batch, self.pending = self.pending, {}
+            self.inflight = batch
+            flushed = 0
+            for pool, user_ids in self.database.sqlite_manager.group_by_pool(list(batch)):
+                rows = [(user_id, period, mission, delta) for user_id in user_ids for (period, mission), delta in batch[user_id].items()]
+                try:
+                    async with pool.transaction("missions.flush") as conn:
+                        await self.write(conn, rows)
+                except Exception as e:
+                    # Reencolar sumando a lo acumulado mientras tanto
+                    for user_id, period, mission, delta in rows:
+                        self.increment_key(user_id, period, mission, delta)
+                    logger.error(f"❌ Error volcando {len(rows)} contadores de misiones: {e}")
+                    continue
+                flushed += len(rows)
+
+            self.inflight = {}
+            if flushed:
+                self.stats["flushes"] += 1
+                self.stats["rows_flushed"] += flushed
+            return flushed
+
+    @staticmethod
+    async def _select(conn, keys: List[Tuple[str, str, str]], chunk_size: int = SELECT_CHUNK_SIZE):
+        rows = []
+        for i in range(0, len(keys), chunk_size):
+            chunk = keys[i:i + chunk_size]
+            values = ", ".join("(?, ?, ?)" for _ in chunk)
+            async with conn.execute(
+                f"SELECT user_id, period, mission, progress, claimed FROM mission_progress WHERE (user_id, period, mission) IN (VALUES {values})",
+                [value for key in chunk for value in key]
+            ) as cursor:
+                rows.extend(await cursor.fetchall())
+        return rows
+
+    async def get_progress(self, user_id: str, now: Optional[datetime] = None) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """Progreso del periodo activo: {tipo: {misión: {"progreso": n, "claimed": bool}}}."""
+        periods = {mission_type: period_key(mission_type, now) for mission_type in ("diarias", "semanales", GENERAL_TYPE)}
+        result: Dict[str, Dict[str, Dict[str, Any]]] = {mission_type: {} for mission_type in periods}
+        async with self.database.user_pool(user_id).reader("missions.get") as conn:
+            async with conn.execute(
+                f"SELECT period, mission, progress, claimed FROM mission_progress WHERE user_id = ? AND period IN ({', '.join('?' for _ in periods)})",
+                [user_id] + list(periods.values())
+            ) as cursor:
+                rows = await cursor.fetchall()
+        for row in rows:
+            mission_type, mission_name = split_key(row["mission"])
+            if periods.get(mission_type) == row["period"]:
+                result[mission_type][mission_name] = {"progreso": row["progress"], "claimed": bool(row["claimed"])}
+
+        # Sumar incrementos aún no volcados (pendientes y en vuelo)
+        for deltas in (self.inflight.get(user_id, {}), self.pending.get(user_id, {})):
+            for (period, mission), delta in deltas.items():
+                mission_type, mission_name = split_key(mission)
+                if periods.get(mission_type) == period:
+                    entry = result[mission_type].setdefault(mission_name, {"progreso": 0, "claimed": False})
+                    entry["progreso"] += delta
+        return result
+
+    async def claim(self, user_id: str, mission_key: str, goal: int, now: Optional[datetime] = None) -> bool:
+        """Marca una misión completada como reclamada. Solo devuelve True a la primera llamada."""
+        await self.flush()
+        async with self.database.user_pool(user_id).transaction("missions.claim") as conn:
+            return await self.claim_in(conn, user_id, mission_key, goal, now)
+
+    async def reset(self, user_id: str, now: Optional[datetime] = None) -> int:
+        """Borra el progreso de un usuario en los periodos activos (pendiente incluido)."""
+        self.pending.pop(user_id, None)
+        periods = [period_key(mission_type, now) for mission_type in ("diarias", "semanales")]
+        async with self.database.user_pool(user_id).transaction("missions.reset") as conn:
+            cursor = await conn.execute(
+                "DELETE FROM mission_progress WHERE user_id = ? AND period IN (?, ?)",
+                [user_id] + periods
+            )
+            return cursor.rowcount
+
+    async def collect_garbage(self, now: Optional[datetime] = None, chunk_size: int = GC_CHUNK_SIZE) -> int:
+        """Elimina periodos caducados en bloques de `chunk_size` filas (una transacción por bloque).
+
+        No hay trabajo por usuario: es un DELETE por rango de periodo que libera el
+        escritor entre bloques para no bloquear otras escrituras.
+        """
+        now = now or datetime.now()
+        removed = 0
+        for pool, (mission_type, retained) in ((pool, policy) for pool in self.database.sqlite_manager.user_pools() for policy in RETAINED_PERIODS.items()):
+            cutoff = period_key(mission_type, now - retained)
+            # Rango de claves con prefijo "<tipo>." ('/' es el carácter siguiente a '.')
+            prefix_range = (f"{mission_type}.", f"{mission_type}/")
+            while True:
+                async with pool.transaction("missions.gc") as conn:
+                    cursor = await conn.execute(
+                        """DELETE FROM mission_progress WHERE rowid IN (
+                               SELECT rowid FROM mission_progress
+                               WHERE period < ? AND mission >= ? AND mission < ?
+                               LIMIT ?
+                           )""",
+                        (cutoff,) + prefix_range + (chunk_size,)
+                    )
+                    deleted = cursor.rowcount
+                    if deleted < chunk_size and self.database.mirror_enabled:
+                        await mongo_outbox.enqueue(
+                            conn, "mission_progress", "delete",
+                            {"period": {"$lt": cutoff}, "mission": {"$regex": f"^{mission_type}\\."}}, {}
+                        )
+                removed += deleted
+                if deleted < chunk_size:
+                    break
+                await asyncio.sleep(0)
+        if removed:
+            logger.info(f"🧹 {removed} contadores de misiones caducados eliminados")
+        return removed
@@ -0,0 +1,217 @@
+import asyncio
+import json
+import random
+import time
+from itertools import groupby
+from typing import Dict, Any, List, Optional, Tuple
+from pymongo import ReplaceOne, UpdateOne, DeleteMany
+from pymongo.errors import ConnectionFailure
+import logging
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS mongo_outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        collection TEXT NOT NULL,
+        op TEXT NOT NULL,
+        filter TEXT NOT NULL,
+        doc TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        attempts INTEGER DEFAULT 0
+    )
+"""
+OUTBOX_COLUMNS = ["id", "collection", "op", "filter", "doc", "created_at", "attempts"]
+
+# Operaciones que MongoDB rechazó MAX_ATTEMPTS veces: salen del outbox para no bloquear las siguientes
+OUTBOX_DEAD_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS mongo_outbox_dead (
+        id INTEGER PRIMARY KEY,
+        collection TEXT NOT NULL,
+        op TEXT NOT NULL,
+        filter TEXT NOT NULL,
+        doc TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        attempts INTEGER NOT NULL,
+        error TEXT,
+        failed_at REAL NOT NULL
+    )
+"""
+OUTBOX_DEAD_COLUMNS = ["id", "collection", "op", "filter", "doc", "created_at", "attempts", "error", "failed_at"]
+MAX_ATTEMPTS = 5
+
+async def enqueue(conn, collection: str, op: str, filter_doc: Dict[str, Any], doc: Dict[str, Any]):
+    """Añade una operación al outbox usando la transacción abierta en `conn`.
+
+    `op` es "replace" (ReplaceOne con upsert), "update" (UpdateOne con upsert, `doc` es el update)
+    o "delete" (DeleteMany con `filter_doc`; `doc` se ignora).
+    """
+    await conn.execute(
+        "INSERT INTO mongo_outbox (collection, op, filter, doc, created_at) VALUES (?, ?, ?, ?, ?)",
+        (collection, op, json.dumps(filter_doc), json.dumps(doc, default=str), time.time())
+    )
+
+async def enqueue_many(conn, rows: List[tuple]):
+    """Versión por lotes de `enqueue`: filas (collection, op, filter, doc)."""
+    now = time.time()
+    await conn.executemany(
+        "INSERT INTO mongo_outbox (collection, op, filter, doc, created_at) VALUES (?, ?, ?, ?, ?)",
+        [(collection, op, json.dumps(filter_doc), json.dumps(doc, default=str), now) for collection, op, filter_doc, doc in rows]
+    )
+
+class MongoReplicator:
+    """Vacía el outbox de SQLite hacia MongoDB con bulk_write y reintentos con backoff.
+
+    Los fallos de conexión solo esperan (backoff) sin contar intentos. Si MongoDB rechaza
+    el lote, se parte en mitades para aplicar en orden todo lo anterior a la primera
+    operación que falla; esa suma un intento y, al llegar a `max_attempts`, pasa a
+    `mongo_outbox_dead` para que el resto siga replicándose.
+    """
+
+    def __init__(self, pool, mongo_db, batch_size: int = 500, interval: float = 1.0, max_backoff: float = 60.0,
+                 max_attempts: int = MAX_ATTEMPTS):
+        self.pool = pool
+        self.mongo_db = mongo_db
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.max_attempts = max(1, max_attempts)
+        self.task = None
+        self.failures = 0
+        self.stats = {"replicated": 0, "batches": 0, "errors": 0, "dead_lettered": 0, "last_error": None, "last_success": None}
+
+    @staticmethod
+    def _to_operation(row):
+        filter_doc = json.loads(row["filter"])
+        doc = json.loads(row["doc"])
+        if row["op"] == "replace":
+            return ReplaceOne(filter_doc, doc, upsert=True)
+        if row["op"] == "delete":
+            return DeleteMany(filter_doc)
+        return UpdateOne(filter_doc, doc, upsert=True)
+
+    async def start(self):
+        """Inicia el bucle de replicación."""
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Detiene el bucle y hace un último vaciado (best effort)."""
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        try:
+            while await self.drain_once() == self.batch_size:
+                pass
+        except Exception as e:
+            logger.warning(f"⚠️ Outbox pendiente al apagar: {e}")
+
+    async def _run(self):
+        while True:
+            try:
+                replicated = await self.drain_once()
+                self.failures = 0
+                if replicated < self.batch_size:
+                    await asyncio.sleep(self.interval)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failures += 1
+                self.stats["errors"] += 1
+                self.stats["last_error"] = str(e)
+                delay = min(self.max_backoff, self.interval * 2 ** self.failures) * random.uniform(0.8, 1.2)
+                logger.error(f"❌ Error replicando outbox a MongoDB (intento {self.failures}), reintento en {delay:.1f}s: {e}")
+                await asyncio.sleep(delay)
+
+    async def _write(self, rows):
+        """Un bulk_write ordenado por cada tramo de filas consecutivas de la misma colección.
+
+        Agrupar por colección adelantaría operaciones posteriores de otra colección a otras
+        anteriores; por tramos se respeta el orden del outbox.
+        """
+        for collection, run in groupby(rows, key=lambda row: row["collection"]):
+            ops = [self._to_operation(row) for row in run]
+            async with self.pool.registry.track(f"mongo.{collection}.bulk_write") as sample:
+                sample.rows = len(ops)
+                await self.mongo_db[collection].bulk_write(ops, ordered=True)
+
+    async def _write_prefix(self, rows) -> Tuple[int, Optional[Exception]]:
+        """Replica `rows` en orden partiendo por mitades si MongoDB rechaza el lote.
+
+        Devuelve cuántas filas iniciales quedaron escritas y el error de la primera que falla
+        (None si pasaron todas). Los fallos de conexión se propagan sin partir nada.
+        """
+        try:
+            await self._write(rows)
+            return len(rows), None
+        except ConnectionFailure:
+            raise
+        except Exception as e:
+            if len(rows) == 1:
+                return 0, e
+        middle = len(rows) // 2
+        written, error = await self._write_prefix(rows[:middle])
+        if error is not None:
+            return written, error
+        written, error = await self._write_prefix(rows[middle:])
+        return middle + written, error
+
+    async def drain_once(self) -> int:
+        """Replica un lote del outbox. Devuelve cuántas operaciones salieron del outbox."""
+        async with self.pool.reader("outbox.fetch") as conn:
+            async with conn.execute(
+                "SELECT id, collection, op, filter, doc, attempts FROM mongo_outbox ORDER BY id LIMIT ?",
+                (self.batch_size,)
+            ) as cursor:
+                rows = await cursor.fetchall()
+        if not rows:
+            return 0
+
+        written, error = await self._write_prefix(rows)
+        dead = False
+        async with self.pool.transaction("outbox.ack") as conn:
+            if written:
+                await conn.execute("DELETE FROM mongo_outbox WHERE id <= ?", (rows[written - 1]["id"],))
+            if error is not None:
+                poison = rows[written]
+                dead = poison["attempts"] + 1 >= self.max_attempts
+                if dead:
+                    await conn.execute(
+                        """INSERT OR REPLACE INTO mongo_outbox_dead (id, collection, op, filter, doc, created_at, attempts, error, failed_at)
+                           SELECT id, collection, op, filter, doc, created_at, attempts + 1, ?, ? FROM mongo_outbox WHERE id = ?""",
+                        (str(error), time.time(), poison["id"])
+                    )
+                    await conn.execute("DELETE FROM mongo_outbox WHERE id = ?", (poison["id"],))
+                else:
+                    await conn.execute("UPDATE mongo_outbox SET attempts = attempts + 1 WHERE id = ?", (poison["id"],))
+
+        if written:
+            self.stats["replicated"] += written
+            self.stats["batches"] += 1
+            self.stats["last_success"] = time.time()
+        if error is not None:
+            poison = rows[written]
+            if not dead:
+                raise error
+            self.stats["dead_lettered"] += 1
+            self.stats["last_error"] = str(error)
+            logger.error(
+                f"❌ Operación {poison['id']} del outbox ({poison['collection']}.{poison['op']}) descartada tras "
+                f"{self.max_attempts} intentos, movida a mongo_outbox_dead: {error}"
+            )
+            return written + 1
+        return written
+
+    async def lag(self) -> Dict[str, Any]:
+        """Operaciones pendientes, antigüedad (segundos) de la más vieja y descartadas."""
+        async with self.pool.reader("outbox.lag") as conn:
+            async with conn.execute("SELECT COUNT(*) AS pending, MIN(created_at) AS oldest FROM mongo_outbox") as cursor:
+                row = await cursor.fetchone()
+            async with conn.execute("SELECT COUNT(*) FROM mongo_outbox_dead") as cursor:
+                dead = (await cursor.fetchone())[0]
+        oldest = row["oldest"]
+        return {"pending": row["pending"], "lag_seconds": round(time.time() - oldest, 3) if oldest else 0.0, "dead": dead}
@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+from typing import Dict, Any, NamedTuple, Optional
+
+# Puntos perdidos por cada hora completa desde el ancla de decaimiento
+DECAY_RATES = {"hambre": 5, "energía": 3, "felicidad": 4}
+DECAY_DEFAULTS = {"hambre": 50, "energía": 80, "felicidad": 70}
+SLEEP_RECOVERY_PER_HOUR = 10  # Energía recuperada por hora mientras duerme
+INTERACTION_COOLDOWN = 300  # Segundos entre interacciones con la misma mascota
+ANCHOR_KEY = "ancla_decaimiento"  # Momento en que los stats guardados eran exactos
+
+class PetState(NamedTuple):
+    pet: Dict[str, Any]
+    cooldown_remaining: float
+    woke_up: bool
+
+def _parse(timestamp: Optional[str]) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(timestamp) if timestamp else None
+    except (TypeError, ValueError):
+        return None
+
+def materialize_pet(pet: Dict[str, Any], now: Optional[datetime] = None) -> PetState:
+    """Calcula el estado actual de una mascota a partir de sus stats guardados y su ancla.
+
+    Función pura: no modifica `pet` (copia superficial). El decaimiento se aplica por horas
+    completas y el ancla avanza exactamente esas horas, así que materializar varias veces
+    da el mismo resultado que hacerlo una sola y, si no ha pasado ninguna hora, el
+    documento devuelto es idéntico al guardado (no provoca escrituras).
+    """
+    now = now or datetime.now()
+    result = dict(pet)
+    last_interaction = _parse(pet.get("última_interacción"))
+    anchor = _parse(pet.get(ANCHOR_KEY)) or last_interaction or now
+    hours = int(max(0.0, (now - anchor).total_seconds()) // 3600)
+    woke_up = False
+
+    if hours:
+        for stat in ("hambre", "felicidad"):
+            result[stat] = max(0, pet.get(stat, DECAY_DEFAULTS[stat]) - hours * DECAY_RATES[stat])
+
+        energy = pet.get("energía", DECAY_DEFAULTS["energía"])
+        if pet.get("estado") == "durmiendo":
+            max_energy = pet.get("max_energía", DECAY_DEFAULTS["energía"])
+            hours_to_full = max(0, -(-(max_energy - energy) // SLEEP_RECOVERY_PER_HOUR))
+            if hours >= hours_to_full:
+                energy = max(0, max_energy - (hours - hours_to_full) * DECAY_RATES["energía"])
+                result["estado"] = "activo"
+                woke_up = True
+            else:
+                energy += hours * SLEEP_RECOVERY_PER_HOUR
+        else:
+            energy = max(0, energy - hours * DECAY_RATES["energía"])
+        result["energía"] = energy
+        anchor += timedelta(hours=hours)
+
+    if hours or ANCHOR_KEY not in pet:
+        result[ANCHOR_KEY] = str(anchor)
+
+    cooldown = 0.0
+    if last_interaction:
+        cooldown = max(0.0, INTERACTION_COOLDOWN - (now - last_interaction).total_seconds())
+    return PetState(result, cooldown, woke_up)
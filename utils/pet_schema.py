@@ -0,0 +1,266 @@
+import json
+from typing import Dict, Any, List, Tuple
+import logging
+from utils.codec import DocumentCodec, DEFAULT_CODEC, decode
+
+logger = logging.getLogger(__name__)
+
+# Campos del documento de mascota promovidos a columnas tipadas: clave JSON -> columna
+PROMOTED_FIELDS = {
+    "tipo": "tipo",
+    "clase": "clase",
+    "elemento": "elemento",
+    "nivel": "nivel",
+    "experiencia": "experiencia",
+    "hambre": "hambre",
+    "energía": "energia",
+    "felicidad": "felicidad",
+    "salud": "salud",
+    "última_interacción": "last_interaction",
+    "ancla_decaimiento": "decay_anchor",
+}
+# Columnas numéricas que update_pet_stats puede incrementar en SQL
+NUMERIC_COLUMNS = {"nivel", "experiencia", "hambre", "energia", "felicidad", "salud"}
+# Tope de los stats: valor fijo o campo de la propia mascota
+STAT_CAPS = {"hambre": 100, "felicidad": 100, "energía": "max_energía", "salud": "max_salud"}
+LIST_FIELDS = ("inventario", "habilidades")
+PET_COLUMNS = list(PROMOTED_FIELDS.values())
+
+PETS_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS pets (
+        user_id TEXT NOT NULL,
+        pet_name TEXT NOT NULL,
+        pet_data TEXT NOT NULL DEFAULT '{}',
+        tipo TEXT,
+        clase TEXT,
+        elemento TEXT,
+        nivel INTEGER DEFAULT 1,
+        experiencia INTEGER DEFAULT 0,
+        hambre INTEGER,
+        energia INTEGER,
+        felicidad INTEGER,
+        salud INTEGER,
+        last_interaction TEXT,
+        decay_anchor TEXT,
+        PRIMARY KEY (user_id, pet_name)
+    )
+"""
+PETS_TABLE_COLUMNS = ["user_id", "pet_name", "pet_data"] + PET_COLUMNS
+
+PET_INVENTORY_SQL = """
+    CREATE TABLE IF NOT EXISTS pet_inventory (
+        user_id TEXT NOT NULL,
+        pet_name TEXT NOT NULL,
+        slot INTEGER NOT NULL,
+        item_name TEXT,
+        item_data TEXT NOT NULL,
+        PRIMARY KEY (user_id, pet_name, slot)
+    )
+"""
+PET_INVENTORY_COLUMNS = ["user_id", "pet_name", "slot", "item_name", "item_data"]
+
+PET_SKILLS_SQL = """
+    CREATE TABLE IF NOT EXISTS pet_skills (
+        user_id TEXT NOT NULL,
+        pet_name TEXT NOT NULL,
+        slot INTEGER NOT NULL,
+        skill_data TEXT NOT NULL,
+        PRIMARY KEY (user_id, pet_name, slot)
+    )
+"""
+PET_SKILLS_COLUMNS = ["user_id", "pet_name", "slot", "skill_data"]
+
+# Inventario global del usuario (items comprados sin mascota asignada); vive junto a las monedas
+USER_INVENTORY_SQL = """
+    CREATE TABLE IF NOT EXISTS user_inventory (
+        user_id TEXT NOT NULL,
+        slot INTEGER NOT NULL,
+        item_name TEXT,
+        item_data TEXT NOT NULL,
+        PRIMARY KEY (user_id, slot)
+    )
+"""
+USER_INVENTORY_COLUMNS = ["user_id", "slot", "item_name", "item_data"]
+
+# Solo columnas de baja cardinalidad que se consultan; los stats cambian demasiado para indexarlos
+PET_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_pets_clase ON pets (clase)",
+    "CREATE INDEX IF NOT EXISTS idx_pets_tipo ON pets (tipo)",
+    "CREATE INDEX IF NOT EXISTS idx_pets_elemento ON pets (elemento)",
+    "CREATE INDEX IF NOT EXISTS idx_pets_nivel ON pets (nivel)",
+    "CREATE INDEX IF NOT EXISTS idx_pet_inventory_item ON pet_inventory (item_name)",
+]
+
+SELECT_COLUMNS = ", ".join(["user_id", "pet_name", "pet_data"] + PET_COLUMNS)
+
+# Las funciones JSON1 fallan con BLOB: solo se migran filas cuyo pet_data sigue siendo texto JSON
+LEGACY_DATA = "CASE WHEN typeof(pet_data) = 'text' THEN pet_data END"
+
+def _json_path(key: str) -> str:
+    return f'$."{key}"'
+
+def canonical_json(pet: Dict[str, Any]) -> str:
+    """JSON estable (claves ordenadas) usado para las huellas de write-behind."""
+    return json.dumps(pet, sort_keys=True)
+
+def split_pet(user_id: str, pet_name: str, pet: Dict[str, Any], codec: DocumentCodec = DEFAULT_CODEC) -> Tuple[tuple, List[tuple], List[tuple]]:
+    """Separa un documento de mascota en fila de pets, filas de inventario y filas de habilidades."""
+    extra = {key: value for key, value in pet.items() if key not in PROMOTED_FIELDS and key not in LIST_FIELDS}
+    row = (user_id, pet_name, codec.encode(extra)) + tuple(pet.get(key) for key in PROMOTED_FIELDS)
+    inventory = [
+        (user_id, pet_name, slot, item.get("name") if isinstance(item, dict) else None, json.dumps(item))
+        for slot, item in enumerate(pet.get("inventario", []))
+    ]
+    skills = [(user_id, pet_name, slot, json.dumps(skill)) for slot, skill in enumerate(pet.get("habilidades", []))]
+    return row, inventory, skills
+
+def join_pet(row, inventory: List[Any], skills: List[Any]) -> Dict[str, Any]:
+    """Reconstruye el documento de mascota desde sus columnas y tablas hijas (pet_data en JSON o binario)."""
+    pet = decode(row["pet_data"])
+    for key, column in PROMOTED_FIELDS.items():
+        if row[column] is not None:
+            pet[key] = row[column]
+    pet["inventario"] = inventory
+    pet["habilidades"] = skills
+    return pet
+
+def clamp_stat(current, value, cap=None):
+    """`value` desde 0 hasta `cap`; un valor que ya superaba el tope no sube más pero tampoco se recorta."""
+    value = max(0, value)
+    return min(max(cap, current), value) if cap is not None else value
+
+def stat_cap(pet: Dict[str, Any], key: str):
+    """Tope de un stat para esta mascota (None si no tiene)."""
+    cap = STAT_CAPS.get(key)
+    return pet.get(cap) if isinstance(cap, str) else cap
+
+def apply_updates(pet: Dict[str, Any], updates: Dict[str, Any]) -> Dict[str, Any]:
+    """Aplica `updates` al documento: las columnas numéricas son incrementos, el resto se asigna.
+
+    Los incrementos quedan entre 0 y el tope de STAT_CAPS; un valor que ya lo superaba no sube más pero tampoco se recorta.
+    """
+    for key, value in updates.items():
+        if PROMOTED_FIELDS.get(key) in NUMERIC_COLUMNS:
+            current = pet.get(key, 0)
+            pet[key] = clamp_stat(current, current + value, stat_cap(pet, key))
+        else:
+            pet[key] = value
+    return pet
+
+async def load_pets(conn, user_ids: List[str], chunk_size: int = 500) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """Carga las mascotas de varios usuarios: {user_id: {pet_name: pet}}."""
+    result: Dict[str, Dict[str, Dict[str, Any]]] = {user_id: {} for user_id in user_ids}
+    for i in range(0, len(user_ids), chunk_size):
+        chunk = user_ids[i:i + chunk_size]
+        placeholders = ", ".join("?" for _ in chunk)
+        children: Dict[tuple, Dict[str, list]] = {}
+        async with conn.execute(
+            f"SELECT user_id, pet_name, item_data FROM pet_inventory WHERE user_id IN ({placeholders}) ORDER BY user_id, pet_name, slot",
+            chunk
+        ) as cursor:
+            for row in await cursor.fetchall():
+                children.setdefault((row["user_id"], row["pet_name"]), {"inventario": [], "habilidades": []})["inventario"].append(json.loads(row["item_data"]))
+        async with conn.execute(
+            f"SELECT user_id, pet_name, skill_data FROM pet_skills WHERE user_id IN ({placeholders}) ORDER BY user_id, pet_name, slot",
+            chunk
+        ) as cursor:
+            for row in await cursor.fetchall():
+                children.setdefault((row["user_id"], row["pet_name"]), {"inventario": [], "habilidades": []})["habilidades"].append(json.loads(row["skill_data"]))
+        async with conn.execute(
+            f"SELECT {SELECT_COLUMNS} FROM pets WHERE user_id IN ({placeholders})",
+            chunk
+        ) as cursor:
+            for row in await cursor.fetchall():
+                lists = children.get((row["user_id"], row["pet_name"]), {"inventario": [], "habilidades": []})
+                result[row["user_id"]][row["pet_name"]] = join_pet(row, lists["inventario"], lists["habilidades"])
+    return result
+
+async def write_pets(conn, upserts: List[Tuple[str, str, Dict[str, Any]]], codec: DocumentCodec = DEFAULT_CODEC) -> int:
+    """Inserta/actualiza mascotas completas (fila + inventario + habilidades). Devuelve bytes escritos."""
+    if not upserts:
+        return 0
+    rows, inventory, skills = [], [], []
+    for user_id, pet_name, pet in upserts:
+        row, pet_inventory, pet_skills = split_pet(user_id, pet_name, pet, codec)
+        rows.append(row)
+        inventory.extend(pet_inventory)
+        skills.extend(pet_skills)
+
+    columns = ", ".join(PETS_TABLE_COLUMNS)
+    placeholders = ", ".join("?" for _ in PETS_TABLE_COLUMNS)
+    assignments = ", ".join(f"{column} = excluded.{column}" for column in PETS_TABLE_COLUMNS[2:])
+    await conn.executemany(
+        f"INSERT INTO pets ({columns}) VALUES ({placeholders}) ON CONFLICT(user_id, pet_name) DO UPDATE SET {assignments}",
+        rows
+    )
+    keys = [(user_id, pet_name) for user_id, pet_name, _ in upserts]
+    await conn.executemany("DELETE FROM pet_inventory WHERE user_id = ? AND pet_name = ?", keys)
+    await conn.executemany("DELETE FROM pet_skills WHERE user_id = ? AND pet_name = ?", keys)
+    if inventory:
+        await conn.executemany(
+            "INSERT INTO pet_inventory (user_id, pet_name, slot, item_name, item_data) VALUES (?, ?, ?, ?, ?)",
+            inventory
+        )
+    if skills:
+        await conn.executemany(
+            "INSERT INTO pet_skills (user_id, pet_name, slot, skill_data) VALUES (?, ?, ?, ?)",
+            skills
+        )
+    return sum(len(row[2]) for row in rows) + sum(len(item[4]) for item in inventory) + sum(len(skill[3]) for skill in skills)
+
+async def delete_pets(conn, deletes: List[Tuple[str, str]]):
+    """Elimina mascotas junto con su inventario y habilidades."""
+    if not deletes:
+        return
+    await conn.executemany("DELETE FROM pets WHERE user_id = ? AND pet_name = ?", deletes)
+    await conn.executemany("DELETE FROM pet_inventory WHERE user_id = ? AND pet_name = ?", deletes)
+    await conn.executemany("DELETE FROM pet_skills WHERE user_id = ? AND pet_name = ?", deletes)
+
+async def load_global_inventory(conn, user_id: str) -> List[Dict[str, Any]]:
+    """Items del inventario global de un usuario, en orden."""
+    async with conn.execute("SELECT item_data FROM user_inventory WHERE user_id = ? ORDER BY slot", (user_id,)) as cursor:
+        return [json.loads(row["item_data"]) for row in await cursor.fetchall()]
+
+async def write_global_inventory(conn, user_id: str, items: List[Any]):
+    """Sustituye el inventario global de un usuario dentro de la transacción abierta."""
+    await conn.execute("DELETE FROM user_inventory WHERE user_id = ?", (user_id,))
+    if items:
+        await conn.executemany(
+            "INSERT INTO user_inventory (user_id, slot, item_name, item_data) VALUES (?, ?, ?, ?)",
+            [(user_id, slot, item.get("name") if isinstance(item, dict) else None, json.dumps(item)) for slot, item in enumerate(items)]
+        )
+
+async def backfill(conn) -> int:
+    """Mueve los campos promovidos del blob pet_data a columnas y tablas hijas (idempotente)."""
+    pending = " OR ".join(
+        f"json_type({LEGACY_DATA}, '{_json_path(key)}') IS NOT NULL" for key in list(PROMOTED_FIELDS) + list(LIST_FIELDS)
+    )
+    async with conn.execute(f"SELECT COUNT(*) FROM pets WHERE {pending}") as cursor:
+        count = (await cursor.fetchone())[0]
+    if not count:
+        return 0
+
+    assignments = ", ".join(
+        f"{column} = COALESCE(json_extract({LEGACY_DATA}, '{_json_path(key)}'), {column})"
+        for key, column in PROMOTED_FIELDS.items()
+    )
+    await conn.execute(f"UPDATE pets SET {assignments} WHERE {pending}")
+    await conn.execute(f"""
+        INSERT OR REPLACE INTO pet_inventory (user_id, pet_name, slot, item_name, item_data)
+        SELECT pets.user_id, pets.pet_name, item.key,
+               CASE WHEN item.type = 'object' THEN json_extract(item.value, '$.name') END,
+               CASE WHEN item.type IN ('object', 'array') THEN item.value ELSE json_quote(item.value) END
+        FROM pets, json_each({LEGACY_DATA}, '$.inventario') AS item
+        WHERE json_type({LEGACY_DATA}, '$.inventario') = 'array'
+    """)
+    await conn.execute(f"""
+        INSERT OR REPLACE INTO pet_skills (user_id, pet_name, slot, skill_data)
+        SELECT pets.user_id, pets.pet_name, skill.key,
+               CASE WHEN skill.type IN ('object', 'array') THEN skill.value ELSE json_quote(skill.value) END
+        FROM pets, json_each({LEGACY_DATA}, '$.habilidades') AS skill
+        WHERE json_type({LEGACY_DATA}, '$.habilidades') = 'array'
+    """)
+    removed = ", ".join(f"'{_json_path(key)}'" for key in list(PROMOTED_FIELDS) + list(LIST_FIELDS))
+    await conn.execute(f"UPDATE pets SET pet_data = json_remove(pet_data, {removed}) WHERE {pending}")
+    logger.info(f"✅ {count} mascotas migradas a columnas tipadas")
+    return count
@@ -0,0 +1,137 @@
+import time
+from bisect import bisect_left
+from contextlib import asynccontextmanager
+from typing import Dict, Any, List
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Límites de los buckets en ms: crecimiento geométrico ×1.25 de 1µs a ~60s (error relativo < 12.5%)
+BUCKET_GROWTH = 1.25
+BUCKET_BOUNDS: List[float] = []
+_bound = 0.001
+while _bound < 60_000:
+    BUCKET_BOUNDS.append(_bound)
+    _bound *= BUCKET_GROWTH
+BUCKET_BOUNDS.append(float("inf"))
+
+class LatencyHistogram:
+    """Histograma de latencias con buckets logarítmicos fijos (registro O(log n), memoria constante)."""
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKET_BOUNDS)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, value_ms: float):
+        self.counts[bisect_left(BUCKET_BOUNDS, value_ms)] += 1
+        self.count += 1
+        self.total += value_ms
+        if value_ms > self.max:
+            self.max = value_ms
+
+    def percentile(self, pct: float) -> float:
+        """Límite superior del bucket que contiene el percentil `pct` (0-100)."""
+        if not self.count:
+            return 0.0
+        target = self.count * pct / 100
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= target:
+                return min(BUCKET_BOUNDS[index], self.max)
+        return self.max
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total / self.count, 3) if self.count else 0.0,
+            "p50_ms": round(self.percentile(50), 3),
+            "p95_ms": round(self.percentile(95), 3),
+            "p99_ms": round(self.percentile(99), 3),
+            "max_ms": round(self.max, 3),
+        }
+
+class QueryStats:
+    """Métricas de una sentencia con nombre: espera de lock, ejecución y filas."""
+
+    __slots__ = ("wait", "execution", "rows", "errors")
+
+    def __init__(self):
+        self.wait = LatencyHistogram()
+        self.execution = LatencyHistogram()
+        self.rows = 0
+        self.errors = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.execution.count,
+            "errors": self.errors,
+            "rows": self.rows,
+            "wait": self.wait.as_dict(),
+            "exec": self.execution.as_dict(),
+        }
+
+class QuerySample:
+    """Medición en curso devuelta por `QueryRegistry.track`."""
+
+    __slots__ = ("started", "acquired_at", "rows")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.acquired_at = None
+        self.rows = 0
+
+    def acquired(self):
+        """Marca el fin de la espera (lock o conexión obtenidos)."""
+        self.acquired_at = time.perf_counter()
+
+class QueryRegistry:
+    """Registro de sentencias SQLite/MongoDB con histogramas p50/p95/p99 por nombre."""
+
+    def __init__(self):
+        self.queries: Dict[str, QueryStats] = {}
+        self.started_at = time.time()
+
+    def get(self, name: str) -> QueryStats:
+        stats = self.queries.get(name)
+        if stats is None:
+            stats = self.queries[name] = QueryStats()
+        return stats
+
+    def record(self, name: str, wait_ms: float, exec_ms: float, rows: int = 0, error: bool = False):
+        stats = self.get(name)
+        stats.wait.record(wait_ms)
+        stats.execution.record(exec_ms)
+        stats.rows += rows
+        if error:
+            stats.errors += 1
+
+    @asynccontextmanager
+    async def track(self, name: str):
+        """Mide un bloque; llama a `sample.acquired()` al obtener el lock y fija `sample.rows`."""
+        sample = QuerySample()
+        error = False
+        try:
+            yield sample
+        except BaseException:
+            error = True
+            raise
+        finally:
+            finished = time.perf_counter()
+            acquired_at = sample.acquired_at or sample.started
+            self.record(name, (acquired_at - sample.started) * 1000, (finished - acquired_at) * 1000, sample.rows, error)
+
+    def snapshot(self, sort_by: str = "p95_ms") -> Dict[str, Any]:
+        """Métricas de todas las sentencias, ordenadas de más lenta a más rápida."""
+        queries = {name: stats.as_dict() for name, stats in list(self.queries.items())}
+        ordered = sorted(queries.items(), key=lambda item: item[1]["exec"].get(sort_by, 0), reverse=True)
+        return {"since": self.started_at, "queries": dict(ordered)}
+
+    def reset(self):
+        """Descarta las métricas acumuladas (p. ej. tras un deploy)."""
+        self.queries = {}
+        self.started_at = time.time()
@@ -0,0 +1,58 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import Dict, Any, Callable, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Política de retención por tabla: columna de fecha y días a conservar (None = los de la llamada)
+RETENTION_POLICIES: Dict[str, Dict[str, Any]] = {
+    "achievements": {"column": "unlocked_at", "days": None},
+    "afk_users": {"column": "afk_since", "days": None},
+    "blacklist": {"column": "banned_at", "days": None},
+}
+RETENTION_INDEXES = [
+    f"CREATE INDEX IF NOT EXISTS idx_{table}_{policy['column']} ON {table} ({policy['column']})"
+    for table, policy in RETENTION_POLICIES.items()
+]
+RETENTION_CHUNK_SIZE = 500  # Filas por transacción
+RETENTION_PAUSE = 0.01  # Pausa entre bloques para dejar pasar otras escrituras (segundos)
+
+async def purge_table(pool, table: str, column: str, cutoff: datetime, chunk_size: int = RETENTION_CHUNK_SIZE,
+                      pause: float = RETENTION_PAUSE, progress: Optional[Callable[[str, int], None]] = None) -> int:
+    """Borra las filas de `table` con `column` < `cutoff` en bloques de `chunk_size` filas.
+
+    Cada bloque es una transacción corta que localiza los rowid por el índice de fecha;
+    entre bloques se libera el escritor. Devuelve el total de filas borradas.
+    """
+    removed = 0
+    while True:
+        async with pool.transaction(f"retention.{table}") as conn:
+            cursor = await conn.execute(
+                f"DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {table} WHERE {column} < ? LIMIT ?)",
+                (str(cutoff), chunk_size)
+            )
+            deleted = cursor.rowcount
+        removed += deleted
+        if deleted and progress:
+            progress(table, removed)
+        if deleted < chunk_size:
+            return removed
+        await asyncio.sleep(pause)
+
+async def run_retention(pool, days: int, policies: Dict[str, Dict[str, Any]] = RETENTION_POLICIES,
+                        chunk_size: int = RETENTION_CHUNK_SIZE, pause: float = RETENTION_PAUSE,
+                        progress: Optional[Callable[[str, int], None]] = None) -> Dict[str, int]:
+    """Aplica las políticas de retención. Devuelve filas borradas por tabla (las que fallan no se incluyen)."""
+    now = datetime.now()
+    counts: Dict[str, int] = {}
+    for table, policy in policies.items():
+        keep_days = policy["days"] if policy.get("days") is not None else days
+        try:
+            counts[table] = await purge_table(pool, table, policy["column"], now - timedelta(days=keep_days), chunk_size, pause, progress)
+        except Exception as e:
+            logger.error(f"❌ Error aplicando retención en {table}: {e}")
+            continue
+        if counts[table]:
+            logger.info(f"🧹 Retención {table}: {counts[table]} filas anteriores a {keep_days} días eliminadas")
+    return counts
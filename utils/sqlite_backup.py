@@ -0,0 +1,289 @@
+"""Copias de seguridad en caliente de SQLite con la API de backup.
+
+Uso desde línea de comandos:
+    python -m utils.sqlite_backup backup  [--db RUTA] [--dir DIR] [--keep N] [--pages N] [--shards K]
+    python -m utils.sqlite_backup verify  SNAPSHOT
+    python -m utils.sqlite_backup restore SNAPSHOT [--db RUTA]   (con el bot detenido)
+    python -m utils.sqlite_backup list    [--dir DIR]
+"""
+import argparse
+import asyncio
+import gzip
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+import logging
+from utils.sqlite_pool import shard_path
+from config.database_config import db_config
+
+logger = logging.getLogger(__name__)
+
+BACKUP_DIR = "./data/backup"
+SNAPSHOT_SUFFIX = ".db.gz"
+PAGES_PER_STEP = 256  # Páginas copiadas por paso: el lock de lectura se suelta entre pasos
+STEP_SLEEP = 0.005  # Pausa entre pasos (segundos)
+MAX_RESTARTS = 3  # Reinicios por escrituras concurrentes antes de copiar en un solo paso
+
+class _BackupRestarted(Exception):
+    """La copia incremental se reinició demasiadas veces por escrituras concurrentes."""
+
+def _copy_database(source_path: str, target_path: str, pages: int = PAGES_PER_STEP, sleep: float = STEP_SLEEP) -> Dict[str, Any]:
+    """Copia `source_path` en `target_path` con la API de backup (bloqueante, para un hilo).
+
+    Si otra conexión escribe durante la copia, SQLite la reinicia desde el principio. Tras
+    MAX_RESTARTS se hace la copia en un único paso, que en modo WAL es una sola transacción
+    de lectura y tampoco bloquea al escritor.
+    """
+    progress = {"steps": 0, "restarts": 0, "remaining": None}
+
+    def on_progress(status, remaining, total):
+        progress["steps"] += 1
+        if progress["remaining"] is not None and remaining > progress["remaining"]:
+            progress["restarts"] += 1
+            if progress["restarts"] > MAX_RESTARTS:
+                raise _BackupRestarted()
+        progress["remaining"] = remaining
+
+    source = sqlite3.connect(f"file:{source_path}?mode=ro", uri=True)
+    try:
+        target = sqlite3.connect(target_path)
+        try:
+            try:
+                source.backup(target, pages=pages, progress=on_progress, sleep=sleep)
+            except _BackupRestarted:
+                logger.warning("⚠️ Backup reiniciado demasiadas veces; copiando en un solo paso")
+                source.backup(target, pages=-1)
+            page_count = target.execute("PRAGMA page_count").fetchone()[0]
+        finally:
+            target.close()
+    finally:
+        source.close()
+    return {"pages": page_count, "steps": progress["steps"], "restarts": progress["restarts"]}
+
+def _integrity_check(path: str) -> str:
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        return conn.execute("PRAGMA integrity_check").fetchone()[0]
+    finally:
+        conn.close()
+
+def _table_counts(path: str) -> Dict[str, int]:
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")]
+        return {table: conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0] for table in tables}
+    finally:
+        conn.close()
+
+def list_snapshots(directory: str = BACKUP_DIR, name: Optional[str] = None) -> List[str]:
+    """Snapshots del directorio (solo los de la base `name` si se indica), del más antiguo al más reciente."""
+    if not os.path.isdir(directory):
+        return []
+    return sorted(
+        os.path.join(directory, entry) for entry in os.listdir(directory)
+        if entry.endswith(SNAPSHOT_SUFFIX) and (name is None or entry.startswith(f"{name}_"))
+    )
+
+def rotate(directory: str = BACKUP_DIR, keep: int = 7, name: Optional[str] = None) -> List[str]:
+    """Elimina los snapshots más antiguos dejando `keep` (por base si se indica `name`). Devuelve los eliminados."""
+    snapshots = list_snapshots(directory, name)
+    removed = snapshots[:-keep] if keep > 0 else snapshots
+    for path in removed:
+        os.remove(path)
+    return removed
+
+def create_snapshot(database_path: str, directory: str = BACKUP_DIR, keep: int = 7, pages: int = PAGES_PER_STEP) -> Dict[str, Any]:
+    """Copia la base en caliente, la verifica, la comprime con gzip y rota los antiguos."""
+    os.makedirs(directory, exist_ok=True)
+    name = os.path.splitext(os.path.basename(database_path))[0]
+    snapshot_path = os.path.join(directory, f"{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}{SNAPSHOT_SUFFIX}")
+    started = time.perf_counter()
+    fd, raw_path = tempfile.mkstemp(suffix=".db", dir=directory)
+    os.close(fd)
+    try:
+        copy_stats = _copy_database(database_path, raw_path, pages)
+        copied = time.perf_counter()
+        integrity = _integrity_check(raw_path)
+        if integrity != "ok":
+            raise sqlite3.DatabaseError(f"integrity_check del snapshot: {integrity}")
+        with open(raw_path, "rb") as raw, gzip.open(snapshot_path + ".tmp", "wb", compresslevel=6) as compressed:
+            shutil.copyfileobj(raw, compressed, 1024 * 1024)
+        os.replace(snapshot_path + ".tmp", snapshot_path)
+        raw_size = os.path.getsize(raw_path)
+    finally:
+        for path in (raw_path, snapshot_path + ".tmp"):
+            if os.path.exists(path):
+                os.remove(path)
+    finished = time.perf_counter()
+
+    removed = rotate(directory, keep, name)
+    return {
+        "path": snapshot_path,
+        "raw_bytes": raw_size,
+        "compressed_bytes": os.path.getsize(snapshot_path),
+        "copy_seconds": round(copied - started, 3),
+        "total_seconds": round(finished - started, 3),
+        "rotated": len(removed),
+        **copy_stats,
+    }
+
+def _decompress(snapshot_path: str, directory: str) -> str:
+    fd, raw_path = tempfile.mkstemp(suffix=".db", dir=directory)
+    with os.fdopen(fd, "wb") as raw, gzip.open(snapshot_path, "rb") as compressed:
+        shutil.copyfileobj(compressed, raw, 1024 * 1024)
+    return raw_path
+
+def verify_snapshot(snapshot_path: str) -> Dict[str, Any]:
+    """Descomprime un snapshot en un temporal y comprueba su integridad y contenido."""
+    started = time.perf_counter()
+    raw_path = _decompress(snapshot_path, os.path.dirname(os.path.abspath(snapshot_path)))
+    try:
+        integrity = _integrity_check(raw_path)
+        counts = _table_counts(raw_path)
+        raw_size = os.path.getsize(raw_path)
+    finally:
+        os.remove(raw_path)
+    return {
+        "path": snapshot_path,
+        "ok": integrity == "ok",
+        "integrity": integrity,
+        "raw_bytes": raw_size,
+        "tables": counts,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+def restore_snapshot(snapshot_path: str, database_path: str) -> Dict[str, Any]:
+    """Restaura un snapshot sobre `database_path` (ejecutar con el bot detenido).
+
+    Se verifica antes de tocar el destino y se copia con la API de backup, que escribe
+    la base completa en una transacción y deja el WAL del destino coherente.
+    """
+    started = time.perf_counter()
+    raw_path = _decompress(snapshot_path, os.path.dirname(os.path.abspath(database_path)) or ".")
+    try:
+        integrity = _integrity_check(raw_path)
+        if integrity != "ok":
+            raise sqlite3.DatabaseError(f"snapshot corrupto ({integrity}); no se restaura")
+        source = sqlite3.connect(raw_path)
+        target = sqlite3.connect(database_path)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+    finally:
+        os.remove(raw_path)
+    return {
+        "path": database_path,
+        "integrity": _integrity_check(database_path),
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+class BackupService:
+    """Programa snapshots periódicos en un hilo aparte para no bloquear el bucle de eventos.
+
+    `extra_paths` son los ficheros de los shards: se copian tras el principal, cada uno con
+    su propia rotación. Cada copia es coherente por fichero, y todos los datos de un usuario
+    viven en un único shard.
+    """
+
+    def __init__(self, database_path: str, directory: str = BACKUP_DIR, interval: float = 6 * 3600, keep: int = 7,
+                 pages: int = PAGES_PER_STEP, extra_paths: Optional[List[str]] = None):
+        self.database_path = database_path
+        self.extra_paths = list(extra_paths or [])
+        self.directory = directory
+        self.interval = interval
+        self.keep = keep
+        self.pages = pages
+        self.task = None
+        self.lock = asyncio.Lock()
+        self.last: Optional[Dict[str, Any]] = None
+        self.stats = {"snapshots": 0, "errors": 0}
+
+    async def start(self):
+        """Inicia el bucle de copias."""
+        if self.task is None and self.interval > 0:
+            self.task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        """Detiene el bucle (una copia en curso termina en su hilo)."""
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.run()
+
+    async def run(self) -> Optional[Dict[str, Any]]:
+        """Crea un snapshot ahora. Devuelve sus métricas (las de los shards en "shards") o None si falla."""
+        async with self.lock:
+            try:
+                result = await asyncio.to_thread(create_snapshot, self.database_path, self.directory, self.keep, self.pages)
+                result["shards"] = [
+                    await asyncio.to_thread(create_snapshot, path, self.directory, self.keep, self.pages)
+                    for path in self.extra_paths
+                ]
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"❌ Error creando backup de SQLite: {e}")
+                return None
+            self.last = result
+            self.stats["snapshots"] += 1
+            logger.info(
+                f"✅ Backup SQLite {os.path.basename(result['path'])}: "
+                f"{result['raw_bytes'] // 1024} KiB -> {result['compressed_bytes'] // 1024} KiB en {result['total_seconds']}s"
+                + (f" (+{len(result['shards'])} shards)" if result["shards"] else "")
+            )
+            return result
+
+def _print(result: Dict[str, Any]):
+    for key, value in result.items():
+        if isinstance(value, dict):
+            print(f"{key}:")
+            for sub_key, sub_value in value.items():
+                print(f"  {sub_key}: {sub_value}")
+        else:
+            print(f"{key}: {value}")
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Backups en caliente de la base SQLite del bot")
+    parser.add_argument("command", choices=["backup", "verify", "restore", "list"])
+    parser.add_argument("snapshot", nargs="?", help="Snapshot .db.gz (verify/restore)")
+    parser.add_argument("--db", default=db_config.SQLITE_PATH)
+    parser.add_argument("--dir", default=db_config.BACKUP_DIR)
+    parser.add_argument("--keep", type=int, default=db_config.BACKUP_KEEP)
+    parser.add_argument("--pages", type=int, default=PAGES_PER_STEP)
+    parser.add_argument("--shards", type=int, default=db_config.SQLITE_SHARDS, help="Copiar también los K shards")
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        for path in list_snapshots(args.dir):
+            print(f"{path}  {os.path.getsize(path) // 1024} KiB")
+        return 0
+    if args.command == "backup":
+        paths = [args.db] + ([shard_path(args.db, index) for index in range(args.shards)] if args.shards > 1 else [])
+        for path in paths:
+            _print(create_snapshot(path, args.dir, args.keep, args.pages))
+        return 0
+    if not args.snapshot:
+        parser.error(f"{args.command} necesita la ruta del snapshot")
+    if args.command == "verify":
+        result = verify_snapshot(args.snapshot)
+        _print(result)
+        return 0 if result["ok"] else 1
+    _print(restore_snapshot(args.snapshot, args.db))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import Dict, Any, List
+import aiosqlite
+import logging
+from utils.query_stats import QueryRegistry
+from config.database_config import db_config
+
+logger = logging.getLogger(__name__)
+
+# Perfil de PRAGMAs aplicado a todas las conexiones del pool
+SQLITE_PROFILE = {
+    "synchronous": db_config.SQLITE_SYNCHRONOUS,
+    "mmap_size": db_config.SQLITE_MMAP_SIZE,
+    "cache_size": db_config.SQLITE_CACHE_SIZE,
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,  # ms
+}
+
+def shard_path(sqlite_path: str, index: int) -> str:
+    """Ruta del fichero de un shard: ./data/beethoven_bot.db -> ./data/beethoven_bot.shard0.db"""
+    base, extension = os.path.splitext(sqlite_path)
+    return f"{base}.shard{index}{extension or '.db'}"
+
+class PoolStats:
+    """Métricas de espera para obtener una conexión del pool."""
+
+    def __init__(self):
+        self.acquired = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, waited: float):
+        self.acquired += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "acquired": self.acquired,
+            "avg_wait_ms": round(self.total_wait / self.acquired * 1000, 3) if self.acquired else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 3),
+        }
+
+class SQLitePool:
+    """Pool SQLite en modo WAL: una conexión de escritura y varias de solo lectura.
+
+    Las lecturas usan su propia cola de conexiones y nunca esperan el lock del escritor.
+    Cada préstamo se registra con un nombre en `registry` (espera, ejecución y filas escritas).
+    """
+
+    def __init__(self, sqlite_path: str, readers: int = 4, profile: Dict[str, Any] = None, registry: QueryRegistry = None):
+        self.sqlite_path = sqlite_path
+        self.registry = registry or QueryRegistry()
+        self.reader_count = max(1, readers)
+        self.profile = profile or SQLITE_PROFILE
+        self.writer_conn = None
+        self.reader_conns: List[aiosqlite.Connection] = []
+        self.readers: asyncio.Queue = asyncio.Queue()
+        self.write_lock = asyncio.Lock()
+        self.reader_stats = PoolStats()
+        self.writer_stats = PoolStats()
+
+    async def _apply_profile(self, conn: aiosqlite.Connection):
+        for pragma, value in self.profile.items():
+            await conn.execute(f"PRAGMA {pragma} = {value}")
+
+    async def open(self):
+        """Abre la conexión de escritura (activa WAL) y las de lectura."""
+        self.writer_conn = await aiosqlite.connect(self.sqlite_path, isolation_level=None)  # Autocommit
+        self.writer_conn.row_factory = aiosqlite.Row
+        async with self.writer_conn.execute("PRAGMA journal_mode = WAL") as cursor:
+            journal_mode = (await cursor.fetchone())[0]
+        await self._apply_profile(self.writer_conn)
+
+        for _ in range(self.reader_count):
+            conn = await aiosqlite.connect(f"file:{self.sqlite_path}?mode=ro", uri=True, isolation_level=None)
+            conn.row_factory = aiosqlite.Row
+            await self._apply_profile(conn)
+            await conn.execute("PRAGMA query_only = ON")
+            self.reader_conns.append(conn)
+            self.readers.put_nowait(conn)
+
+        logger.info(f"✅ Pool SQLite abierto (journal={journal_mode}, lectores={self.reader_count})")
+
+    @asynccontextmanager
+    async def reader(self, name: str = "sqlite.read"):
+        """Presta una conexión de solo lectura."""
+        async with self.registry.track(name) as sample:
+            conn = await self.readers.get()
+            sample.acquired()
+            self.reader_stats.record(sample.acquired_at - sample.started)
+            try:
+                yield conn
+            finally:
+                self.readers.put_nowait(conn)
+
+    @asynccontextmanager
+    async def _exclusive(self, name: str):
+        async with self.registry.track(name) as sample:
+            async with self.write_lock:
+                sample.acquired()
+                self.writer_stats.record(sample.acquired_at - sample.started)
+                changes = self.writer_conn.total_changes
+                try:
+                    yield self.writer_conn
+                finally:
+                    sample.rows = self.writer_conn.total_changes - changes
+
+    @asynccontextmanager
+    async def writer(self, name: str = "sqlite.write"):
+        """Presta la conexión de escritura en exclusiva."""
+        async with self._exclusive(name) as conn:
+            yield conn
+
+    @asynccontextmanager
+    async def transaction(self, name: str = "sqlite.transaction"):
+        """Presta la conexión de escritura dentro de una transacción (commit o rollback al salir)."""
+        async with self._exclusive(name) as conn:
+            await conn.execute("BEGIN TRANSACTION")
+            try:
+                yield conn
+            except BaseException:
+                await conn.rollback()
+                raise
+            await conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Métricas de espera del pool."""
+        return {
+            "readers": self.reader_count,
+            "readers_idle": self.readers.qsize(),
+            "read": self.reader_stats.as_dict(),
+            "write": self.writer_stats.as_dict(),
+        }
+
+    async def close(self):
+        """Cierra todas las conexiones del pool."""
+        for conn in self.reader_conns:
+            await conn.close()
+        self.reader_conns.clear()
+        if self.writer_conn:
+            await self.writer_conn.close()
+            self.writer_conn = None
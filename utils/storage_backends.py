@@ -0,0 +1,529 @@
+import copy
+import json
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+import logging
+from pymongo import ReplaceOne, ReturnDocument
+from utils import mongo_outbox
+from utils import pet_schema
+from utils import guild_activity
+from utils.guild_activity import XP_PER_LEVEL, MAX_LEVEL_UPS_PER_FLUSH
+
+try:
+    from sqlalchemy import MetaData, Table, Column, String, Text, Integer, select, delete, insert, update, tuple_
+    from sqlalchemy.ext.asyncio import create_async_engine
+except ImportError:  # Dependencia opcional: solo la necesita STORAGE_STRATEGY=sqlalchemy
+    create_async_engine = None
+
+logger = logging.getLogger(__name__)
+
+# hybrid: SQLite + réplica MongoDB vía outbox | sql_only: solo SQLite | mongo_only: documentos en MongoDB
+# sqlalchemy: documentos en cualquier base SQLAlchemy async (Postgres, SQLite) | memory: en memoria (pruebas, benchmarks)
+STORAGE_STRATEGIES = ("hybrid", "sql_only", "mongo_only", "sqlalchemy", "memory")
+CHUNK_SIZE = 500
+
+PetUpserts = List[Tuple[str, str, Dict[str, Any]]]
+PetDeletes = List[Tuple[str, str]]
+ActivityBatch = Dict[str, List[int]]
+
+def _chunks(ids: List[str], size: int = CHUNK_SIZE):
+    for i in range(0, len(ids), size):
+        yield ids[i:i + size]
+
+class StorageBackend:
+    """Almacén de los documentos de entidad: mascotas por usuario y gremios.
+
+    Los datos relacionales (monedas, misiones, logros, AFK, outbox) siguen en SQLite en
+    todas las estrategias; el backend decide dónde viven mascotas y gremios.
+    """
+
+    name = "base"
+    transactional = False  # True si las mascotas viven en el SQLite del usuario (se escriben con sus monedas)
+
+    async def open(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def load_pets(self, user_ids: List[str]) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """{user_id: {pet_name: pet}} con una entrada (posiblemente vacía) por usuario pedido."""
+        raise NotImplementedError
+
+    async def write_pets(self, batch: Dict[str, Dict[str, Any]], upserts: PetUpserts, deletes: PetDeletes) -> int:
+        """Persiste un lote del write-behind (documentos completos y diff por mascota). Devuelve bytes escritos."""
+        raise NotImplementedError
+
+    async def update_pet_fields(self, user_id: str, pet_name: str, updates: Dict[str, Any]) -> bool:
+        """Actualización directa de campos promovidos; False si el backend no la soporta o no aplica."""
+        return False
+
+    async def load_guilds(self, guild_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """{guild_id: guild_data}; omite los que no existen."""
+        raise NotImplementedError
+
+    async def scan_guilds(self) -> Dict[str, Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def save_guild(self, guild_id: str, guild_data: Dict[str, Any]):
+        """Guarda el documento del gremio; bank/xp/level solo se fijan al crearlo.
+
+        Después solo los mueve `apply_guild_activity`: un documento leído antes de un volcado no los pisa.
+        """
+        raise NotImplementedError
+
+    async def apply_guild_activity(self, batch: ActivityBatch) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, int]]:
+        """Suma los deltas [bank, xp] y aplica subidas de nivel. Devuelve (gremios actualizados, nuevos niveles)."""
+        raise NotImplementedError
+
+def _apply_activity(guild_data: Dict[str, Any], bank: int, xp: int, now: datetime) -> Optional[int]:
+    """Aplica deltas y subidas de nivel a un documento en memoria. Devuelve el nuevo nivel si subió."""
+    for key, default in guild_activity.GUILD_COUNTERS.items():
+        guild_data.setdefault(key, default)
+    guild_data["bank"] += bank
+    guild_data["xp"] += xp
+    guild_data["last_updated"] = str(now)
+    leveled = False
+    for _ in range(MAX_LEVEL_UPS_PER_FLUSH):
+        if guild_data["xp"] < guild_data["level"] * XP_PER_LEVEL:
+            break
+        guild_data["xp"] -= guild_data["level"] * XP_PER_LEVEL
+        guild_data["level"] += 1
+        leveled = True
+    return guild_data["level"] if leveled else None
+
+class SQLiteBackend(StorageBackend):
+    """Mascotas normalizadas y gremios en el SQLite local; replica a MongoDB si hay réplica activa.
+
+    Con SQLITE_SHARDS las mascotas van al shard de cada usuario (una transacción por shard)
+    y los gremios se quedan en el fichero principal.
+    """
+
+    name = "sqlite"
+    transactional = True
+
+    def __init__(self, database):
+        self.database = database
+
+    @property
+    def pool(self):
+        return self.database.pool
+
+    async def load_pets(self, user_ids: List[str]) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        result: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for pool, group in self.database.sqlite_manager.group_by_pool(user_ids):
+            async with pool.reader("pets.load") as conn:
+                result.update(await pet_schema.load_pets(conn, group, CHUNK_SIZE))
+        return result
+
+    async def write_pets(self, batch: Dict[str, Dict[str, Any]], upserts: PetUpserts, deletes: PetDeletes) -> int:
+        bytes_written = 0
+        for pool, user_ids in self.database.sqlite_manager.group_by_pool(list(batch)):
+            members = set(user_ids)
+            async with pool.transaction("pets.flush") as conn:
+                bytes_written += await self.write_pets_in(
+                    conn, {user_id: batch[user_id] for user_id in user_ids},
+                    [row for row in upserts if row[0] in members], [key for key in deletes if key[0] in members]
+                )
+        return bytes_written
+
+    async def write_pets_in(self, conn, batch: Dict[str, Dict[str, Any]], upserts: PetUpserts, deletes: PetDeletes) -> int:
+        """Escribe el diff de usuarios de un mismo fichero en la transacción abierta. Devuelve bytes escritos."""
+        await pet_schema.delete_pets(conn, deletes)
+        bytes_written = await pet_schema.write_pets(conn, upserts, self.database.sqlite_manager.codec)
+        if self.database.mirror_enabled:
+            # $set sin el inventario global, que tiene su propia tabla y se replica aparte
+            await mongo_outbox.enqueue_many(conn, [
+                ("user_pets", "update", {"user_id": user_id},
+                 {"$set": {key: value for key, value in user_data.items() if key != "inventario_global"}})
+                for user_id, user_data in batch.items()
+            ])
+        return bytes_written
+
+    async def update_pet_fields(self, user_id: str, pet_name: str, updates: Dict[str, Any]) -> bool:
+        """Un solo UPDATE sobre las columnas tipadas si el ancla de decaimiento tiene menos de una hora."""
+        if any(key not in pet_schema.PROMOTED_FIELDS for key in updates):
+            return False
+
+        # Misma semántica que pet_schema.apply_updates: entre 0 y el tope, sin recortar lo que ya lo superaba
+        assignments, params, conditions = [], [], []
+        for key, value in updates.items():
+            column = pet_schema.PROMOTED_FIELDS[key]
+            if column in pet_schema.NUMERIC_COLUMNS:
+                incremented = f"MAX(0, COALESCE({column}, 0) + ?)"
+                cap = pet_schema.STAT_CAPS.get(key)
+                if isinstance(cap, str):
+                    # Tope guardado en pet_data: solo legible si la fila está en JSON texto; si no, camino de documento
+                    cap = f"COALESCE(json_extract({pet_schema.LEGACY_DATA}, '{pet_schema._json_path(cap)}'), {column}, 0)"
+                    conditions.append("typeof(pet_data) = 'text'")
+                assignments.append(f"{column} = MIN(MAX({cap}, COALESCE({column}, 0)), {incremented})" if cap is not None else f"{column} = {incremented}")
+            else:
+                assignments.append(f"{column} = ?")
+            params.append(value)
+        fresh_since = str(datetime.now() - timedelta(hours=1))
+
+        async with self.database.user_pool(user_id).transaction("pets.update_stats") as conn:
+            cursor = await conn.execute(
+                f"UPDATE pets SET {', '.join(assignments)} WHERE user_id = ? AND pet_name = ? AND decay_anchor > ?"
+                + "".join(f" AND {condition}" for condition in dict.fromkeys(conditions)),
+                params + [user_id, pet_name, fresh_since]
+            )
+            if cursor.rowcount != 1:
+                return False
+            if self.database.mirror_enabled:
+                await mongo_outbox.enqueue(conn, "user_pets", "update", {"user_id": user_id}, await self._pet_mirror_update(conn, user_id, pet_name, updates))
+        return True
+
+    @staticmethod
+    async def _pet_mirror_update(conn, user_id: str, pet_name: str, updates: Dict[str, Any]) -> Dict[str, Any]:
+        """$set de los campos cambiados; si el nombre no sirve como ruta de MongoDB ('.', '$'), de todo `mascotas`."""
+        if "." in pet_name or pet_name.startswith("$"):
+            pets = (await pet_schema.load_pets(conn, [user_id]))[user_id]
+            return {"$set": {"mascotas": pets}}
+        columns = [pet_schema.PROMOTED_FIELDS[key] for key in updates]
+        async with conn.execute(
+            f"SELECT {', '.join(columns)} FROM pets WHERE user_id = ? AND pet_name = ?",
+            (user_id, pet_name)
+        ) as cursor:
+            row = await cursor.fetchone()
+        return {"$set": {f"mascotas.{pet_name}.{key}": row[column] for key, column in zip(updates, columns)}}
+
+    def _join(self, row) -> Dict[str, Any]:
+        return guild_activity.join_guild(self.database.sqlite_manager.decode_document(row["guild_data"]), row)
+
+    async def load_guilds(self, guild_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        result: Dict[str, Dict[str, Any]] = {}
+        async with self.pool.reader("guilds.get") as conn:
+            for chunk in _chunks(guild_ids):
+                async with conn.execute(
+                    f"SELECT guild_id, guild_data, bank, xp, level FROM guilds WHERE guild_id IN ({', '.join('?' for _ in chunk)})",
+                    chunk
+                ) as cursor:
+                    for row in await cursor.fetchall():
+                        result[row["guild_id"]] = self._join(row)
+        return result
+
+    async def scan_guilds(self) -> Dict[str, Dict[str, Any]]:
+        async with self.pool.reader("guilds.scan") as conn:
+            async with conn.execute("SELECT guild_id, guild_data, bank, xp, level FROM guilds") as cursor:
+                return {row["guild_id"]: self._join(row) for row in await cursor.fetchall()}
+
+    async def save_guild(self, guild_id: str, guild_data: Dict[str, Any]):
+        document, counters = guild_activity.split_guild(guild_data)
+        async with self.pool.transaction("guilds.save") as conn:
+            await conn.execute(
+                """INSERT INTO guilds (guild_id, guild_data, bank, xp, level, last_updated) VALUES (?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(guild_id) DO UPDATE SET guild_data = excluded.guild_data, last_updated = excluded.last_updated""",
+                (guild_id, self.database.sqlite_manager.encode_document(document)) + counters + (datetime.now(),)
+            )
+            if self.database.mirror_enabled:
+                async with conn.execute("SELECT bank, xp, level FROM guilds WHERE guild_id = ?", (guild_id,)) as cursor:
+                    row = await cursor.fetchone()
+                await mongo_outbox.enqueue(conn, "guilds", "replace", {"guild_id": guild_id}, guild_activity.join_guild(document, row))
+
+    async def apply_guild_activity(self, batch: ActivityBatch) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, int]]:
+        """Incrementos `bank = bank + ?` y subidas de nivel resueltas en SQL dentro de una transacción."""
+        guild_ids = list(batch)
+        placeholders = ", ".join("?" for _ in guild_ids)
+        now = datetime.now()
+        level_ups: Dict[str, int] = {}
+        async with self.pool.transaction("guilds.activity_flush") as conn:
+            await conn.executemany(
+                "UPDATE guilds SET bank = bank + ?, xp = xp + ?, last_updated = ? WHERE guild_id = ?",
+                [(bank, xp, now, guild_id) for guild_id, (bank, xp) in batch.items()]
+            )
+            for _ in range(MAX_LEVEL_UPS_PER_FLUSH):
+                async with conn.execute(
+                    f"SELECT guild_id, level FROM guilds WHERE guild_id IN ({placeholders}) AND xp >= level * ?",
+                    guild_ids + [XP_PER_LEVEL]
+                ) as cursor:
+                    leveled = await cursor.fetchall()
+                if not leveled:
+                    break
+                await conn.executemany(
+                    "UPDATE guilds SET xp = xp - level * ?, level = level + 1 WHERE guild_id = ?",
+                    [(XP_PER_LEVEL, row["guild_id"]) for row in leveled]
+                )
+                for row in leveled:
+                    level_ups[row["guild_id"]] = row["level"] + 1
+
+            async with conn.execute(
+                f"SELECT guild_id, guild_data, bank, xp, level FROM guilds WHERE guild_id IN ({placeholders})",
+                guild_ids
+            ) as cursor:
+                rows = await cursor.fetchall()
+            if self.database.mirror_enabled:
+                await mongo_outbox.enqueue_many(conn, [
+                    ("guilds", "update", {"guild_id": row["guild_id"]},
+                     {"$set": {"bank": row["bank"], "xp": row["xp"], "level": row["level"], "last_updated": str(now)}})
+                    for row in rows
+                ])
+        return {row["guild_id"]: self._join(row) for row in rows}, level_ups
+
+class MongoBackend(StorageBackend):
+    """Documentos de mascotas y gremios directamente en MongoDB (sin copia en SQLite)."""
+
+    name = "mongo"
+
+    def __init__(self, mongo_db, registry):
+        self.mongo_db = mongo_db
+        self.registry = registry
+
+    @staticmethod
+    def _strip(document: Dict[str, Any]) -> Dict[str, Any]:
+        document.pop("_id", None)
+        return document
+
+    async def load_pets(self, user_ids: List[str]) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        result: Dict[str, Dict[str, Dict[str, Any]]] = {user_id: {} for user_id in user_ids}
+        async with self.registry.track("mongo.user_pets.find") as sample:
+            sample.acquired()
+            async for document in self.mongo_db.user_pets.find({"user_id": {"$in": user_ids}}, {"user_id": 1, "mascotas": 1}):
+                result[document["user_id"]] = document.get("mascotas", {})
+                sample.rows += 1
+        return result
+
+    async def write_pets(self, batch: Dict[str, Dict[str, Any]], upserts: PetUpserts, deletes: PetDeletes) -> int:
+        if not upserts and not deletes:
+            return 0
+        changed = {user_id for user_id, _, _ in upserts} | {user_id for user_id, _ in deletes}
+        operations = [ReplaceOne({"user_id": user_id}, batch[user_id], upsert=True) for user_id in changed]
+        async with self.registry.track("mongo.user_pets.bulk_write") as sample:
+            sample.acquired()
+            await self.mongo_db.user_pets.bulk_write(operations, ordered=False)
+            sample.rows = len(operations)
+        return sum(len(json.dumps(batch[user_id], ensure_ascii=False, default=str)) for user_id in changed)
+
+    async def load_guilds(self, guild_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        async with self.registry.track("mongo.guilds.find") as sample:
+            sample.acquired()
+            return {document["guild_id"]: self._strip(document)
+                    async for document in self.mongo_db.guilds.find({"guild_id": {"$in": guild_ids}})}
+
+    async def scan_guilds(self) -> Dict[str, Dict[str, Any]]:
+        async with self.registry.track("mongo.guilds.scan") as sample:
+            sample.acquired()
+            return {document["guild_id"]: self._strip(document) async for document in self.mongo_db.guilds.find({})}
+
+    async def save_guild(self, guild_id: str, guild_data: Dict[str, Any]):
+        document, counters = guild_activity.split_guild(guild_data)
+        async with self.registry.track("mongo.guilds.update_one") as sample:
+            sample.acquired()
+            await self.mongo_db.guilds.update_one(
+                {"guild_id": guild_id},
+                {"$set": document, "$setOnInsert": dict(zip(guild_activity.GUILD_COUNTERS, counters))},
+                upsert=True
+            )
+
+    async def apply_guild_activity(self, batch: ActivityBatch) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, int]]:
+        """`$inc` por gremio y subidas de nivel condicionales (`xp >= level * XP_PER_LEVEL`), ambas atómicas."""
+        now = str(datetime.now())
+        guilds, level_ups = {}, {}
+        async with self.registry.track("mongo.guilds.activity_flush") as sample:
+            sample.acquired()
+            for guild_id, (bank, xp) in batch.items():
+                document = await self.mongo_db.guilds.find_one_and_update(
+                    {"guild_id": guild_id},
+                    {"$inc": {"bank": bank, "xp": xp}, "$set": {"last_updated": now}},
+                    return_document=ReturnDocument.AFTER
+                )
+                if document is None:
+                    continue
+                for _ in range(MAX_LEVEL_UPS_PER_FLUSH):
+                    level = document.get("level", 1)
+                    leveled = await self.mongo_db.guilds.find_one_and_update(
+                        {"guild_id": guild_id, "level": level, "xp": {"$gte": level * XP_PER_LEVEL}},
+                        {"$inc": {"xp": -level * XP_PER_LEVEL, "level": 1}},
+                        return_document=ReturnDocument.AFTER
+                    )
+                    if leveled is None:
+                        break
+                    document = leveled
+                    level_ups[guild_id] = document["level"]
+                guilds[guild_id] = self._strip(document)
+            sample.rows = len(guilds)
+        return guilds, level_ups
+
+class SQLAlchemyBackend(StorageBackend):
+    """Documentos JSON en cualquier base con driver async de SQLAlchemy (postgresql+asyncpg, sqlite+aiosqlite)."""
+
+    name = "sqlalchemy"
+
+    def __init__(self, url: str, registry):
+        if create_async_engine is None:
+            raise RuntimeError("STORAGE_STRATEGY=sqlalchemy requiere el paquete SQLAlchemy")
+        self.url = url
+        self.registry = registry
+        self.engine = None
+        self.metadata = MetaData()
+        self.pets = Table(
+            "entity_pets", self.metadata,
+            Column("user_id", String(32), primary_key=True),
+            Column("pet_name", String(100), primary_key=True),
+            Column("pet_data", Text, nullable=False),
+        )
+        self.guilds = Table(
+            "entity_guilds", self.metadata,
+            Column("guild_id", String(32), primary_key=True),
+            Column("guild_data", Text, nullable=False),
+            Column("bank", Integer, nullable=False, default=0),
+            Column("xp", Integer, nullable=False, default=0),
+            Column("level", Integer, nullable=False, default=1),
+        )
+
+    async def open(self):
+        self.engine = create_async_engine(self.url, pool_pre_ping=True)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(self.metadata.create_all)
+        logger.info(f"✅ Backend SQLAlchemy abierto ({self.engine.dialect.name})")
+
+    async def close(self):
+        if self.engine is not None:
+            await self.engine.dispose()
+            self.engine = None
+
+    @staticmethod
+    def _dumps(document: Dict[str, Any]) -> str:
+        return json.dumps(document, ensure_ascii=False, default=str)
+
+    async def load_pets(self, user_ids: List[str]) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        result: Dict[str, Dict[str, Dict[str, Any]]] = {user_id: {} for user_id in user_ids}
+        async with self.registry.track("sqlalchemy.pets.load") as sample:
+            async with self.engine.connect() as conn:
+                sample.acquired()
+                for chunk in _chunks(user_ids):
+                    rows = await conn.execute(select(self.pets).where(self.pets.c.user_id.in_(chunk)))
+                    for row in rows:
+                        result[row.user_id][row.pet_name] = json.loads(row.pet_data)
+                        sample.rows += 1
+        return result
+
+    async def write_pets(self, batch: Dict[str, Dict[str, Any]], upserts: PetUpserts, deletes: PetDeletes) -> int:
+        if not upserts and not deletes:
+            return 0
+        rows = [{"user_id": user_id, "pet_name": pet_name, "pet_data": self._dumps(pet)} for user_id, pet_name, pet in upserts]
+        keys = deletes + [(user_id, pet_name) for user_id, pet_name, _ in upserts]
+        async with self.registry.track("sqlalchemy.pets.flush") as sample:
+            async with self.engine.begin() as conn:
+                sample.acquired()
+                # Borrar + insertar: upsert portable entre dialectos
+                for i in range(0, len(keys), CHUNK_SIZE):
+                    await conn.execute(delete(self.pets).where(tuple_(self.pets.c.user_id, self.pets.c.pet_name).in_(keys[i:i + CHUNK_SIZE])))
+                if rows:
+                    await conn.execute(insert(self.pets), rows)
+            sample.rows = len(keys)
+        return sum(len(row["pet_data"]) for row in rows)
+
+    def _join(self, row) -> Dict[str, Any]:
+        return guild_activity.join_guild(json.loads(row.guild_data), row._mapping)
+
+    async def load_guilds(self, guild_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        result: Dict[str, Dict[str, Any]] = {}
+        async with self.registry.track("sqlalchemy.guilds.get") as sample:
+            async with self.engine.connect() as conn:
+                sample.acquired()
+                for chunk in _chunks(guild_ids):
+                    for row in await conn.execute(select(self.guilds).where(self.guilds.c.guild_id.in_(chunk))):
+                        result[row.guild_id] = self._join(row)
+        return result
+
+    async def scan_guilds(self) -> Dict[str, Dict[str, Any]]:
+        async with self.registry.track("sqlalchemy.guilds.scan") as sample:
+            async with self.engine.connect() as conn:
+                sample.acquired()
+                return {row.guild_id: self._join(row) for row in await conn.execute(select(self.guilds))}
+
+    async def save_guild(self, guild_id: str, guild_data: Dict[str, Any]):
+        document, (bank, xp, level) = guild_activity.split_guild(guild_data)
+        async with self.registry.track("sqlalchemy.guilds.save") as sample:
+            async with self.engine.begin() as conn:
+                sample.acquired()
+                result = await conn.execute(
+                    update(self.guilds).where(self.guilds.c.guild_id == guild_id).values(guild_data=self._dumps(document))
+                )
+                if result.rowcount == 0:
+                    await conn.execute(insert(self.guilds).values(
+                        guild_id=guild_id, guild_data=self._dumps(document), bank=bank, xp=xp, level=level
+                    ))
+
+    async def apply_guild_activity(self, batch: ActivityBatch) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, int]]:
+        now = datetime.now()
+        guilds, level_ups = {}, {}
+        async with self.registry.track("sqlalchemy.guilds.activity_flush") as sample:
+            async with self.engine.begin() as conn:
+                sample.acquired()
+                rows = await conn.execute(
+                    select(self.guilds).where(self.guilds.c.guild_id.in_(list(batch))).with_for_update()
+                )
+                for row in rows.all():
+                    guild_data = self._join(row)
+                    bank, xp = batch[row.guild_id]
+                    level = _apply_activity(guild_data, bank, xp, now)
+                    if level is not None:
+                        level_ups[row.guild_id] = level
+                    document, (bank, xp, level) = guild_activity.split_guild(guild_data)
+                    await conn.execute(
+                        update(self.guilds).where(self.guilds.c.guild_id == row.guild_id)
+                        .values(guild_data=self._dumps(document), bank=bank, xp=xp, level=level)
+                    )
+                    guilds[row.guild_id] = guild_data
+            sample.rows = len(guilds)
+        return guilds, level_ups
+
+class MemoryBackend(StorageBackend):
+    """Documentos en diccionarios del proceso: sin persistencia, para pruebas y como línea base de benchmarks."""
+
+    name = "memory"
+
+    def __init__(self):
+        self.pets: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.guilds: Dict[str, Dict[str, Any]] = {}
+
+    async def load_pets(self, user_ids: List[str]) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        return {user_id: copy.deepcopy(self.pets.get(user_id, {})) for user_id in user_ids}
+
+    async def write_pets(self, batch: Dict[str, Dict[str, Any]], upserts: PetUpserts, deletes: PetDeletes) -> int:
+        for user_id, pet_name in deletes:
+            self.pets.get(user_id, {}).pop(pet_name, None)
+        for user_id, pet_name, pet in upserts:
+            self.pets.setdefault(user_id, {})[pet_name] = copy.deepcopy(pet)
+        return 0
+
+    async def load_guilds(self, guild_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        return {guild_id: copy.deepcopy(self.guilds[guild_id]) for guild_id in guild_ids if guild_id in self.guilds}
+
+    async def scan_guilds(self) -> Dict[str, Dict[str, Any]]:
+        return copy.deepcopy(self.guilds)
+
+    async def save_guild(self, guild_id: str, guild_data: Dict[str, Any]):
+        guild_data = copy.deepcopy(guild_data)
+        existing = self.guilds.get(guild_id)
+        if existing is not None:
+            guild_data.update({key: existing[key] for key in guild_activity.GUILD_COUNTERS if key in existing})
+        self.guilds[guild_id] = guild_data
+
+    async def apply_guild_activity(self, batch: ActivityBatch) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, int]]:
+        now = datetime.now()
+        guilds, level_ups = {}, {}
+        for guild_id, (bank, xp) in batch.items():
+            if guild_id not in self.guilds:
+                continue
+            level = _apply_activity(self.guilds[guild_id], bank, xp, now)
+            if level is not None:
+                level_ups[guild_id] = level
+            guilds[guild_id] = copy.deepcopy(self.guilds[guild_id])
+        return guilds, level_ups
+
+def create_backend(strategy: str, database, sqlalchemy_url: Optional[str] = None) -> StorageBackend:
+    """Backend de documentos para una estrategia de STORAGE_STRATEGY."""
+    if strategy in ("hybrid", "sql_only"):
+        return SQLiteBackend(database)
+    if strategy == "mongo_only":
+        if database.mongo_db is None:
+            raise RuntimeError("STORAGE_STRATEGY=mongo_only requiere conexión a MongoDB")
+        return MongoBackend(database.mongo_db, database.queries)
+    if strategy == "sqlalchemy":
+        return SQLAlchemyBackend(sqlalchemy_url, database.queries)
+    if strategy == "memory":
+        return MemoryBackend()
+    raise ValueError(f"STORAGE_STRATEGY desconocida: {strategy} (opciones: {', '.join(STORAGE_STRATEGIES)})")
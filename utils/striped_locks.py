@@ -0,0 +1,68 @@
+import asyncio
+import zlib
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Hashable, List
+import logging
+
+logger = logging.getLogger(__name__)
+
+class StripedLocks:
+    """Tabla fija de locks indexada por hash estable de la clave ("user:123", "guild:456").
+
+    Dos claves solo compiten si caen en la misma franja, así que usuarios distintos avanzan
+    en paralelo con memoria acotada. Varias claves se adquieren en orden de franja, sin
+    riesgo de interbloqueo. Una tarea que ya retiene una franja puede tomar otra clave que
+    caiga en ella, pero volver a pedir una clave que ya retiene es un error: la operación
+    interna escribiría por su cuenta y la externa la pisaría al confirmar con lo que leyó antes.
+    """
+
+    def __init__(self, stripes: int = 256):
+        self.stripes = [asyncio.Lock() for _ in range(max(1, stripes))]
+        self.owners: Dict[int, List[Any]] = {}  # franja -> [tarea, claves retenidas]
+        self.stats = {"acquired": 0, "contended": 0, "shared": 0}
+
+    def stripe(self, key: Hashable) -> int:
+        return zlib.crc32(str(key).encode()) % len(self.stripes)
+
+    @asynccontextmanager
+    async def hold(self, *keys: Hashable):
+        """Retiene las franjas de `keys` durante el bloque.
+
+        Lanza RuntimeError si la tarea ya retiene alguna de las claves (p. ej. `use_item`
+        dentro de una unidad de trabajo del mismo usuario: hay que usar `uow.use_item`).
+        """
+        task = asyncio.current_task()
+        by_stripe: Dict[int, List[str]] = {}
+        for key in dict.fromkeys(str(key) for key in keys):
+            by_stripe.setdefault(self.stripe(key), []).append(key)
+        for index, stripe_keys in by_stripe.items():
+            owner = self.owners.get(index)
+            if owner is not None and owner[0] is task and owner[1].intersection(stripe_keys):
+                raise RuntimeError(f"Lock anidado sobre {', '.join(sorted(owner[1].intersection(stripe_keys)))}: usa la operación ya abierta")
+
+        acquired = []
+        try:
+            for index in sorted(by_stripe):
+                owner = self.owners.get(index)
+                if owner is not None and owner[0] is task:
+                    self.stats["shared"] += 1
+                else:
+                    lock = self.stripes[index]
+                    if lock.locked():
+                        self.stats["contended"] += 1
+                    await lock.acquire()
+                    owner = self.owners[index] = [task, set()]
+                    self.stats["acquired"] += 1
+                owner[1].update(by_stripe[index])
+                acquired.append(index)
+            yield
+        finally:
+            for index in reversed(acquired):
+                owner = self.owners[index]
+                owner[1].difference_update(by_stripe[index])
+                if not owner[1]:
+                    del self.owners[index]
+                    self.stripes[index].release()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"stripes": len(self.stripes), "held": len(self.owners), **self.stats}
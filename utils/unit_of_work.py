@@ -0,0 +1,180 @@
+import json
+from contextlib import AsyncExitStack
+from datetime import datetime
+from typing import Callable, Dict, Any, List, Optional, Tuple
+import logging
+from utils import mongo_outbox
+from utils import pet_schema
+
+logger = logging.getLogger(__name__)
+
+class UnitOfWork:
+    """Mutaciones de un comando sobre un usuario, confirmadas juntas al salir del bloque.
+
+    `async with db.unit_of_work(user_id) as uow:` carga una vez las mascotas, el inventario
+    global, el saldo y los logros. Dentro del bloque los handlers modifican `uow.user_data` y
+    registran monedas, logros, misiones y reclamos en memoria. Al salir todo se escribe en una
+    sola transacción sobre el fichero del usuario: progreso de misiones (incluido lo pendiente
+    del contador), reclamos, monedas, logros, inventario global y, si el almacén de mascotas es
+    ese SQLite, las filas de mascotas. Solo tras confirmar se actualizan huellas y caché del
+    write-behind. Si el bloque o la transacción fallan no se aplica nada.
+
+    Los efectos en memoria que dependen de la escritura (cooldowns, tickets) se registran
+    con `on_commit` y solo se aplican si la confirmación termina bien.
+    """
+
+    def __init__(self, database, user_id: str):
+        self.database = database
+        self.user_id = str(user_id)
+        self.user_data: Dict[str, Any] = {"mascotas": {}}
+        self.balance = 0  # Saldo persistido al cargar
+        self.achievements: Dict[str, bool] = {}
+        self.inventory_snapshot = "[]"  # Inventario global persistido al cargar (JSON canónico)
+        self.coin_deltas: List[Tuple[int, Optional[str]]] = []
+        self.unlocked: List[str] = []
+        self.mission_deltas: Dict[str, int] = {}
+        self.claims: List[Tuple[str, int]] = []
+        self.pets_changed = False
+        self.after_commit: List[Callable[[], Any]] = []
+
+    async def load(self):
+        """Lee el estado del usuario (mascotas, inventario global, saldo y logros)."""
+        self.user_data = await self.database.get_user_pets(self.user_id)
+        self.user_data["inventario_global"] = await self.database.get_global_inventory(self.user_id)
+        self.inventory_snapshot = json.dumps(self.user_data["inventario_global"], sort_keys=True)
+        self.balance = self.user_data["coins"]
+        self.achievements = await self.database.get_user_achievements(self.user_id)
+
+    @property
+    def pets(self) -> Dict[str, Dict[str, Any]]:
+        return self.user_data["mascotas"]
+
+    @property
+    def coins(self) -> int:
+        """Saldo contando los movimientos aún sin confirmar."""
+        return self.balance + sum(delta for delta, _ in self.coin_deltas)
+
+    def save_pets(self):
+        """Marca el documento de mascotas para guardarlo al confirmar."""
+        self.pets_changed = True
+
+    def update_pet(self, pet_name: str, updates: Dict[str, Any]) -> bool:
+        """Aplica `updates` a una mascota con la semántica de `update_pet_stats`."""
+        if pet_name not in self.pets:
+            return False
+        pet_schema.apply_updates(self.pets[pet_name], updates)
+        self.pets_changed = True
+        return True
+
+    def add_coins(self, delta: int, reason: str = None) -> bool:
+        """Registra un movimiento de monedas. Un cargo sin saldo suficiente se rechaza (False)."""
+        if self.coins + delta < 0:
+            return False
+        self.coin_deltas.append((delta, reason))
+        self.user_data["coins"] = self.coins
+        return True
+
+    def unlock_achievement(self, achievement_key: str) -> bool:
+        """Registra un logro. False si el usuario ya lo tenía."""
+        if self.achievements.get(achievement_key):
+            return False
+        self.achievements[achievement_key] = True
+        self.unlocked.append(achievement_key)
+        return True
+
+    def use_item(self, pet_name: str, item_name: str, quantity: int = 1) -> Dict[str, Any]:
+        """Aplica un item con el motor de items; se escribe junto con el resto al confirmar."""
+        return self.database.apply_item(self, pet_name, item_name, quantity)
+
+    def mission(self, mission_key: str, amount: int = 1):
+        """Registra progreso de una misión ("diarias.play_pet")."""
+        self.mission_deltas[mission_key] = self.mission_deltas.get(mission_key, 0) + amount
+
+    def on_commit(self, callback: Callable[[], Any]):
+        """Ejecuta `callback` solo si la unidad de trabajo confirma."""
+        self.after_commit.append(callback)
+
+    def claim_mission(self, mission_key: str, goal: int):
+        """Registra el reclamo de una misión completada; se confirma con su recompensa o no se aplica."""
+        self.claims.append((mission_key, goal))
+
+    @property
+    def inventory_changed(self) -> bool:
+        return json.dumps(self.user_data.get("inventario_global", []), sort_keys=True) != self.inventory_snapshot
+
+    async def commit(self):
+        """Confirma todas las escrituras en una transacción sobre el fichero del usuario."""
+        database = self.database
+        inventory_changed = self.inventory_changed
+        # Con un almacén externo (Mongo, SQLAlchemy) las mascotas siguen por el write-behind
+        write_pets = self.pets_changed and database.storage.transactional
+        if not (self.mission_deltas or self.claims or self.coin_deltas or self.unlocked or inventory_changed or write_pets):
+            if self.pets_changed:
+                await database.save_user_pets(self.user_id, self.user_data)
+            self._run_after_commit()
+            return
+
+        async with AsyncExitStack() as locks:
+            if write_pets:
+                await locks.enter_async_context(database.write_behind.flush_lock)
+            if self.claims:
+                # Que no haya progreso de este usuario a medio volcar mientras se comprueba la meta
+                await locks.enter_async_context(database.missions.flush_lock)
+
+            # Lo pendiente del contador se escribe aquí: un reclamo lo ve y una misión no se pierde
+            pending = database.missions.take(self.user_id)
+            deltas = dict(pending)
+            for mission_key, amount in self.mission_deltas.items():
+                key = database.missions.normalize(mission_key)
+                deltas[key] = deltas.get(key, 0) + amount
+            rows = [(self.user_id, period, mission, delta) for (period, mission), delta in deltas.items()]
+
+            fingerprints = None
+            try:
+                async with database.user_pool(self.user_id).transaction("uow.commit") as conn:
+                    await database.missions.write(conn, rows)
+                    for mission_key, goal in self.claims:
+                        if not await database.missions.claim_in(conn, self.user_id, mission_key, goal):
+                            raise ValueError(f"Misión {mission_key} ya reclamada o incompleta para {self.user_id}")
+                    for delta, reason in self.coin_deltas:
+                        balance = await database._apply_coin_delta(conn, self.user_id, delta, reason)
+                        if balance is None:
+                            # Otro comando gastó el saldo entre la carga y la confirmación: se deshace todo
+                            raise ValueError(f"Saldo insuficiente para {self.user_id} (delta {delta})")
+                        self.user_data["coins"] = balance
+                    for achievement_key in self.unlocked:
+                        await database._record_achievement(conn, self.user_id, achievement_key)
+                    if inventory_changed:
+                        inventory = self.user_data["inventario_global"]
+                        await pet_schema.write_global_inventory(conn, self.user_id, inventory)
+                        if database.mirror_enabled:
+                            await mongo_outbox.enqueue(
+                                conn, "user_pets", "update", {"user_id": self.user_id},
+                                {"$set": {"inventario_global": inventory}}
+                            )
+                    if write_pets:
+                        self.user_data["user_id"] = self.user_id
+                        self.user_data["last_update"] = str(datetime.now())
+                        fingerprints = await database.write_behind.write_in(conn, self.user_id, self.user_data)
+            except Exception:
+                database.missions.restore(self.user_id, pending)
+                raise
+
+            if write_pets:
+                database.write_behind.committed(self.user_id, fingerprints)
+                database.pet_cache.invalidate(self.user_id)
+
+        if self.pets_changed and not write_pets:
+            await database.save_user_pets(self.user_id, self.user_data)
+        self.inventory_snapshot = json.dumps(self.user_data.get("inventario_global", []), sort_keys=True)
+        self._run_after_commit()
+        logger.debug(
+            f"✅ Unidad de trabajo de {self.user_id}: {len(self.coin_deltas)} movimientos, {len(self.unlocked)} logros, "
+            f"mascotas={'sí' if self.pets_changed else 'no'}, inventario={'sí' if inventory_changed else 'no'}, "
+            f"{len(rows)} misiones, {len(self.claims)} reclamos"
+        )
+
+    def _run_after_commit(self):
+        callbacks, self.after_commit = self.after_commit, []
+        for callback in callbacks:
+            callback()